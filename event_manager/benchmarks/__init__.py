@@ -0,0 +1,17 @@
+"""
+Benchmarks for the event manager.
+
+Run them as modules from within the deeper ``event_manager`` folder, e.g.
+``python -m benchmarks.indexes``. They work on their own database file and
+never touch ``db.sqlite3``.
+"""
+import os
+
+import django
+
+
+def setup_django(database_name):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'event_manager.settings')
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = database_name
+    django.setup()
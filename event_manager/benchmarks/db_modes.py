@@ -0,0 +1,170 @@
+"""
+Compare a mixed workload of event page reads and registrations across the
+database profiles of settings.py, each run by a separate process.
+
+    python -m benchmarks.db_modes --threads 16 --duration 20 [--postgres]
+
+Every operation is wrapped like a request, closing or keeping its connection
+according to CONN_MAX_AGE. ``--postgres`` adds a PostgreSQL run on the
+database given by the DB_NAME, DB_USER, DB_PASSWORD, DB_HOST and DB_PORT
+environment variables (requires psycopg2), whose tables are flushed.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+MODES = {
+    'sqlite rollback journal, reconnecting': {'DB_ENGINE': 'sqlite', 'DB_SQLITE_WAL': '0', 'DB_CONN_MAX_AGE': '0'},
+    'sqlite wal, reconnecting': {'DB_ENGINE': 'sqlite', 'DB_SQLITE_WAL': '1', 'DB_CONN_MAX_AGE': '0'},
+    'sqlite wal, persistent': {'DB_ENGINE': 'sqlite', 'DB_SQLITE_WAL': '1', 'DB_CONN_MAX_AGE': '60'},
+}
+POSTGRES_MODES = {
+    'postgresql, reconnecting': {'DB_ENGINE': 'postgresql', 'DB_CONN_MAX_AGE': '0'},
+    'postgresql, persistent': {'DB_ENGINE': 'postgresql', 'DB_CONN_MAX_AGE': '60'},
+}
+
+
+def seed(events, users):
+    from django.contrib.auth.models import User
+    from django.db import transaction
+    from events.models import Event
+
+    today = date.today()
+    with transaction.atomic():
+        User.objects.bulk_create([User(username=f'user{i}') for i in range(users)])
+        user_ids = list(User.objects.values_list('pk', flat=True))
+        Event.objects.bulk_create([
+            Event(
+                name=f'Event {i}',
+                venue='London',
+                organizer_id=random.choice(user_ids),
+                date=today + timedelta(days=random.randint(1, 365)),
+                capacity=100,
+            ) for i in range(events)
+        ])
+    return list(Event.objects.values_list('pk', flat=True)), user_ids
+
+
+def read(event_ids, user):
+    from events.models import Event
+
+    list(Event.objects.for_user(user).filter(date__gte=date.today()).order_by('date', 'pk')[:21])
+    Event.objects.for_user(user).get(pk=random.choice(event_ids))
+
+
+def register(event_ids, user):
+    from events.models import Event
+    from events.services import register_attendee, unregister_attendee
+
+    event = Event.objects.get(pk=random.choice(event_ids))
+    # leave sometimes, so that events do not all end up fully booked
+    if random.random() < 0.3:
+        unregister_attendee(event, user)
+    else:
+        register_attendee(event, user)
+
+
+def run_workload(threads, duration, write_ratio, events):
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.db import close_old_connections, connection
+
+    call_command('migrate', verbosity=0)
+    call_command('flush', interactive=False, verbosity=0)
+    event_ids, user_ids = seed(events, users=threads * 20)
+    users = list(User.objects.filter(pk__in=user_ids))
+    connection.close()
+
+    latencies = {'read': [], 'register': []}
+    errors = []
+    deadline = time.monotonic() + duration
+
+    def worker():
+        while time.monotonic() < deadline:
+            kind = 'register' if random.random() < write_ratio else 'read'
+            start = time.perf_counter()
+            # what request_started and request_finished do
+            close_old_connections()
+            try:
+                (register if kind == 'register' else read)(event_ids, random.choice(users))
+            except Exception as e:
+                errors.append(str(e))
+            finally:
+                close_old_connections()
+            latencies[kind].append(time.perf_counter() - start)
+        connection.close()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.monotonic()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    def p99(values):
+        values = sorted(values)
+        return values[min(len(values) - 1, int(len(values) * 0.99))] * 1000 if values else float('nan')
+
+    return {
+        'ops': sum(len(values) for values in latencies.values()) / elapsed,
+        'read_p99': p99(latencies['read']),
+        'register_p99': p99(latencies['register']),
+        'errors': len(errors),
+        'first_error': errors[0] if errors else '',
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--write-ratio', type=float, default=0.2, help='Share of registrations in the workload.')
+    parser.add_argument('--events', type=int, default=200)
+    parser.add_argument('--postgres', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    if args.worker:
+        import django
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'event_manager.settings')
+        django.setup()
+        print(json.dumps(run_workload(args.threads, args.duration, args.write_ratio, args.events)))
+        return
+
+    modes = dict(MODES, **(POSTGRES_MODES if args.postgres else {}))
+    print(f'{args.threads} threads for {args.duration:.0f}s, {args.write_ratio:.0%} registrations')
+    for name, env in modes.items():
+        directory = tempfile.mkdtemp()
+        env = dict(os.environ, **env)
+        if env['DB_ENGINE'] == 'sqlite':
+            env['DB_NAME'] = os.path.join(directory, 'bench_db_modes.sqlite3')
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.db_modes', '--worker', '--threads', str(args.threads),
+             '--duration', str(args.duration), '--write-ratio', str(args.write_ratio),
+             '--events', str(args.events), '--seed', str(args.seed)],
+            env=env, capture_output=True, text=True,
+        )
+        shutil.rmtree(directory)
+        if output.returncode:
+            print(f'{name}: failed\n{output.stderr}')
+            continue
+        result = json.loads(output.stdout.splitlines()[-1])
+        print(
+            f'{name:>38}: {result["ops"]:8.1f} ops/s, read p99 {result["read_p99"]:7.1f} ms, '
+            f'register p99 {result["register_p99"]:7.1f} ms, {result["errors"]} errors {result["first_error"]}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Compare query plans and timings of the main access paths before and after the
+indexes and constraints added by events migration 0005.
+
+    python -m benchmarks.indexes --attendances 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from . import setup_django
+
+BEFORE, AFTER = '0004_event_attendee_count', '0005_attendance'
+
+
+def seed(connection, attendances, per_event):
+    events = max(1, attendances // per_event)
+    users = max(per_event, attendances // per_event)
+    today = date.today()
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            'INSERT INTO auth_user (id, password, is_superuser, username, first_name, last_name, email,'
+            ' is_staff, is_active, date_joined) VALUES (%s, \'\', 0, %s, \'\', \'\', \'\', 0, 1, %s)',
+            [(i, f'user{i}', today) for i in range(1, users + 1)]
+        )
+        cursor.executemany(
+            'INSERT INTO events_event (id, name, description, date, venue, organizer_id, capacity, attendee_count)'
+            ' VALUES (%s, %s, \'\', %s, \'London\', %s, 100, %s)',
+            [
+                (i, f'Event {i}', today + timedelta(days=random.randint(-365, 365)), random.randint(1, users), per_event)
+                for i in range(1, events + 1)
+            ]
+        )
+        for event_id in range(1, events + 1):
+            cursor.executemany(
+                'INSERT INTO events_event_attendees (event_id, user_id) VALUES (%s, %s)',
+                [(event_id, user_id) for user_id in random.sample(range(1, users + 1), per_event)]
+            )
+    return users, events
+
+
+def access_paths(connection, users, events):
+    """
+    The queries of the main access paths, through the models as they are at BEFORE: the current
+    ones have columns that the later migrations add.
+    """
+    from django.db.migrations.executor import MigrationExecutor
+
+    apps = MigrationExecutor(connection).loader.project_state(('events', BEFORE)).apps
+    Event = apps.get_model('events', 'Event')
+    Attendance = Event.attendees.through
+
+    today = date.today()
+    user_id = random.randint(1, users)
+    event_id = random.randint(1, events)
+    deep = Event.objects.filter(date__gte=today).order_by('date', 'pk')[events // 4:events // 4 + 1].get()
+    return {
+        'event list, first page': Event.objects.filter(date__gte=today).order_by('date', 'pk')[:21],
+        'event list, deep page': Event.objects.filter(date__gt=deep.date).order_by('date', 'pk')[:21],
+        'organizer events': Event.objects.filter(organizer_id=user_id).order_by('date'),
+        'is attending': Attendance.objects.filter(event_id=event_id, user_id=user_id),
+        'events of attendee': Event.objects.filter(attendees=user_id).order_by('date'),
+    }
+
+
+def measure(queries, repeat):
+    results = {}
+    for name, queryset in queries.items():
+        plan = queryset.explain()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            list(queryset.all())
+        results[name] = (plan, (time.perf_counter() - start) / repeat * 1000)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--attendances', type=int, default=1000000)
+    parser.add_argument('--per-event', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    database = os.path.join(tempfile.mkdtemp(), 'bench_indexes.sqlite3')
+    setup_django(database)
+    from django.core.management import call_command
+    from django.db import connection, transaction
+
+    call_command('migrate', verbosity=0)
+    call_command('migrate', 'events', BEFORE, verbosity=0)
+    start = time.perf_counter()
+    with transaction.atomic():
+        users, events = seed(connection, args.attendances, args.per_event)
+    print(f'Seeded {users} users, {events} events, {events * args.per_event} attendances '
+          f'in {time.perf_counter() - start:.1f}s ({database})')
+    queries = access_paths(connection, users, events)
+
+    before = measure(queries, args.repeat)
+    start = time.perf_counter()
+    call_command('migrate', 'events', AFTER, verbosity=0)
+    print(f'Migrated to {AFTER} in {time.perf_counter() - start:.1f}s')
+    after = measure(queries, args.repeat)
+
+    for name in queries:
+        (plan_before, ms_before), (plan_after, ms_after) = before[name], after[name]
+        print(f'\n== {name}: {ms_before:.3f} ms -> {ms_after:.3f} ms ({ms_before / ms_after:.1f}x)')
+        print(f'-- before\n{plan_before}\n-- after\n{plan_after}')
+    os.remove(database)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Measure what idle Server-Sent Events connections to the live seat stream cost
+a uvicorn process, and how long a seat change takes to reach all of them.
+
+    python -m benchmarks.live_seats --connections 5000 --changes 20
+
+Every connection follows the same event. Once they all got the initial counts,
+the resident memory of the server is compared with its memory before, then the
+event's seats change ``--changes`` times through the batch registration API
+and the time for each change to reach every connection is recorded. Requires
+the uvicorn package.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from . import setup_django
+from .wsgi_asgi import percentile, wait_for_port
+
+
+def serve(database, port):
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'event_manager.settings_asgi'
+    setup_django(database)
+    import uvicorn
+    from event_manager.asgi import application
+
+    uvicorn.run(application, host='127.0.0.1', port=port, log_level='warning', backlog=4096)
+
+
+def seed(capacity, changes):
+    """
+    Create the event, the users registered by the changes and a logged in staff
+    user allowed to register them, returning the event id and the cookies.
+    """
+    from django.contrib.auth.models import Permission, User
+    from django.contrib.sessions.backends.db import SessionStore
+    from django.middleware.csrf import _get_new_csrf_token
+    from events.models import Event
+
+    admin = User.objects.create(username='admin')
+    admin.user_permissions.add(Permission.objects.get(codename='add_attendance'))
+    User.objects.bulk_create([User(username=f'user{i}') for i in range(changes)])
+    event = Event.objects.create(
+        name='Hot event', venue='London', organizer=admin, date=date.today() + timedelta(days=10), capacity=capacity,
+    )
+    session = SessionStore()
+    session['_auth_user_id'] = str(admin.pk)
+    session['_auth_user_backend'] = 'django.contrib.auth.backends.ModelBackend'
+    session['_auth_user_hash'] = admin.get_session_auth_hash()
+    session.create()
+    return event.pk, session.session_key, _get_new_csrf_token()
+
+
+def rss_kb(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return None
+
+
+class Connection:
+    def __init__(self):
+        self.reader = self.writer = None
+        self.buffer = b''
+
+    async def open(self, port, event_id):
+        self.reader, self.writer = await asyncio.open_connection('127.0.0.1', port)
+        self.writer.write(f'GET /event/live/?events={event_id} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode())
+        await self.reader.readuntil(b'\r\n\r\n')
+
+    async def wait_for(self, remaining):
+        marker = f'"remaining": {remaining}}}'.encode()
+        while marker not in self.buffer:
+            data = await self.reader.read(65536)
+            if not data:
+                raise ConnectionError('Stream closed')
+            # keep enough to find a marker split between two reads
+            self.buffer = self.buffer[-len(marker):] + data
+        self.buffer = self.buffer[self.buffer.index(marker) + len(marker):]
+        return time.perf_counter()
+
+
+async def register(port, event_id, username, session_key, csrf_token):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = json.dumps({'event': event_id, 'users': [username]}).encode()
+    writer.write(
+        f'POST /api/registrations/ HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n'
+        f'Content-Length: {len(body)}\r\nCookie: sessionid={session_key}; csrftoken={csrf_token}\r\n'
+        f'X-CSRFToken: {csrf_token}\r\nConnection: close\r\n\r\n'.encode() + body
+    )
+    response = await reader.read()
+    writer.close()
+    if b'"registered": 1' not in response:
+        raise RuntimeError(f'Registration failed: {response[:500]!r}')
+
+
+async def run(port, pid, event_id, capacity, args, session_key, csrf_token):
+    before = rss_kb(pid)
+    connections = [Connection() for _ in range(args.connections)]
+    start = time.perf_counter()
+    for i in range(0, len(connections), 500):
+        await asyncio.gather(*(c.open(port, event_id) for c in connections[i:i + 500]))
+    await asyncio.gather(*(c.wait_for(capacity) for c in connections))
+    connected = time.perf_counter() - start
+    # let the server settle
+    await asyncio.sleep(1)
+    after = rss_kb(pid)
+
+    latencies = []
+    for change in range(args.changes):
+        waiting = [asyncio.ensure_future(c.wait_for(capacity - change - 1)) for c in connections]
+        sent = time.perf_counter()
+        await register(port, event_id, f'user{change}', session_key, csrf_token)
+        received = await asyncio.gather(*waiting)
+        latencies.append(max(received) - sent)
+    for c in connections:
+        c.writer.close()
+    return before, after, connected, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connections', type=int, default=5000)
+    parser.add_argument('--changes', type=int, default=20)
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--database', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        return serve(args.database, args.port)
+
+    database = os.path.join(tempfile.mkdtemp(), 'bench_live_seats.sqlite3')
+    setup_django(database)
+    from django.core.management import call_command
+
+    call_command('migrate', verbosity=0)
+    capacity = args.changes + 1000
+    event_id, session_key, csrf_token = seed(capacity, args.changes)
+
+    server = subprocess.Popen([
+        sys.executable, '-m', 'benchmarks.live_seats', '--serve', '--database', database, '--port', str(args.port),
+    ])
+    try:
+        wait_for_port(args.port)
+        before, after, connected, latencies = asyncio.run(
+            run(args.port, server.pid, event_id, capacity, args, session_key, csrf_token)
+        )
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f'{args.connections} connections opened in {connected:.2f}s')
+    print(
+        f'server memory: {before / 1024:.1f} MB idle, {after / 1024:.1f} MB with the connections, '
+        f'{(after - before) / args.connections:.1f} KB per connection'
+    )
+    print(
+        f'seat change to all connections: p50 {percentile(latencies, 0.5) * 1000:.1f} ms, '
+        f'max {max(latencies) * 1000:.1f} ms over {len(latencies)} changes'
+    )
+
+
+if __name__ == '__main__':
+    main()
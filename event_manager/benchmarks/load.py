@@ -0,0 +1,212 @@
+"""
+Drive the main pages and API of the event manager with concurrent logged-in
+clients, in process, and report per scenario the throughput, p50/p95/p99
+latency and queries per request as JSON.
+
+    python -m benchmarks.load --events 100000 --attendances 10000000 --output after.json
+    python -m benchmarks.load --database seeded.sqlite3 --output after.json
+    python -m benchmarks.load --compare before.json after.json
+
+Without ``--database``, a temporary database is filled by ``seed_data`` with the
+given sizes and seed, so two runs with the same arguments measure the same
+data. Pass the file of an earlier run (or a copy made with ``--keep``) to skip
+seeding, which takes a few minutes at the sizes above. Scenarios run one after
+the other, each for ``--duration`` seconds.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+from . import setup_django
+
+
+def scenarios(event_ids):
+    """
+    name: (method, function returning a path), over the events of the database.
+    """
+    def event_path(suffix=''):
+        return lambda: f'/event/{random.choice(event_ids)}/{suffix}'
+
+    return {
+        'event list': ('GET', lambda: '/'),
+        'event list, 50 per page': ('GET', lambda: '/?page_size=50'),
+        'event search': ('GET', lambda: f'/?q={random.choice(["python", "rust meetup", "london", "chess"])}'),
+        'event detail': ('GET', event_path()),
+        'attend event': ('POST', event_path('attend/')),
+        'api event list': ('GET', lambda: '/api/events/'),
+        'api event detail': ('GET', lambda: f'/api/events/{random.choice(event_ids)}/'),
+    }
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else None
+
+
+def run_scenario(method, make_path, users, concurrency, duration):
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    latencies, queries, errors = [], [], []
+    deadline = time.monotonic() + duration
+
+    def client_thread(user):
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(user)
+        request = client.post if method == 'POST' else client.get
+        while time.monotonic() < deadline:
+            path = make_path()
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = request(path)
+                latencies.append(time.perf_counter() - start)
+            queries.append(len(captured))
+            # registering redirects, a full event shows the page again
+            if response.status_code not in (200, 302):
+                errors.append(response.status_code)
+        connection.close()
+
+    threads = [threading.Thread(target=client_thread, args=(user,)) for user in users[:concurrency]]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    def ms(value):
+        return round(value * 1000, 2) if value is not None else None
+
+    return {
+        'requests': len(latencies),
+        'throughput': round(len(latencies) / elapsed, 1),
+        'p50_ms': ms(percentile(latencies, 0.5)),
+        'p95_ms': ms(percentile(latencies, 0.95)),
+        'p99_ms': ms(percentile(latencies, 0.99)),
+        'queries_mean': round(sum(queries) / len(queries), 2) if queries else None,
+        'queries_max': max(queries, default=None),
+        'errors': len(errors),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f'{before["commit"]} -> {after["commit"]}')
+    for name, new in after['results'].items():
+        old = before['results'].get(name)
+        if old is None:
+            print(f'{name:>24}: new')
+            continue
+
+        def change(key):
+            if not old[key] or new[key] is None:
+                return '     n/a'
+            return f'{(new[key] / old[key] - 1) * 100:+7.1f}%'
+
+        print(
+            f'{name:>24}: throughput {new["throughput"]:8.1f} req/s {change("throughput")}, '
+            f'p95 {new["p95_ms"]:7.1f} ms {change("p95_ms")}, '
+            f'queries {old["queries_mean"]} -> {new["queries_mean"]}'
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', help='A database seeded earlier, used as is.')
+    parser.add_argument('--keep', help='Copy the seeded database there, for later runs.')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--attendances', type=int, default=500000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--concurrency', type=int, default=4, help='Clients, each in its own thread.')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per scenario.')
+    parser.add_argument('--scenario', action='append', help='Only run these scenarios (repeatable).')
+    parser.add_argument('--output', help='Write the JSON report there instead of the standard output.')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='Compare two JSON reports.')
+    args = parser.parse_args()
+    if args.compare:
+        return compare(*args.compare)
+    random.seed(args.seed)
+
+    directory = None
+    if args.database:
+        database = args.database
+    else:
+        directory = tempfile.mkdtemp()
+        database = os.path.join(directory, 'bench_load.sqlite3')
+    setup_django(database)
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.db import connection
+    from events.models import Attendance, Event
+
+    if directory:
+        call_command('migrate', verbosity=0)
+        call_command(
+            'seed_data', users=args.users, events=args.events, attendances=args.attendances, seed=args.seed,
+            stdout=sys.stderr,
+        )
+        if args.keep:
+            connection.close()
+            shutil.copy(database, args.keep)
+
+    event_ids = list(Event.objects.filter(date__gte=date.today()).values_list('pk', flat=True))
+    users = list(User.objects.order_by('?')[:args.concurrency])
+    data = {
+        'users': User.objects.count(),
+        'events': Event.objects.count(),
+        'attendances': Attendance.objects.count(),
+    }
+    connection.close()
+
+    selected = scenarios(event_ids)
+    if args.scenario:
+        selected = {name: selected[name] for name in args.scenario}
+    results = {}
+    for name, (method, make_path) in selected.items():
+        print(f'{name}...', file=sys.stderr)
+        results[name] = run_scenario(method, make_path, users, args.concurrency, args.duration)
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'database': connection.vendor,
+        'data': data,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if directory:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Measure the overhead of the metrics middleware on the event list, detail and
+API views, served in process by the test client with and without it.
+
+    python -m benchmarks.metrics_overhead --requests 2000
+
+Rounds alternate between the two, so that drift in the machine's speed affects
+both alike. Once enabled, the hooks stay in place for the client without the
+middleware, which goes through them as no-ops: the comparison is with the
+middleware's own work. ``--slow-query-ms`` also enables the slow query log.
+"""
+import argparse
+import logging
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from . import setup_django
+
+
+def seed(events, users):
+    from django.contrib.auth.models import User
+    from django.db import transaction
+    from events.models import Event
+
+    today = date.today()
+    with transaction.atomic():
+        User.objects.bulk_create([User(username=f'user{i}') for i in range(users)])
+        organizers = list(User.objects.values_list('pk', flat=True))
+        Event.objects.bulk_create([
+            Event(
+                name=f'Event {i}',
+                venue='London',
+                organizer_id=random.choice(organizers),
+                date=today + timedelta(days=random.randint(1, 365)),
+                capacity=100,
+            ) for i in range(events)
+        ])
+    return list(Event.objects.values_list('pk', flat=True))
+
+
+def run(client, paths, requests):
+    start = time.perf_counter()
+    for i in range(requests):
+        response = client.get(paths[i % len(paths)])
+        assert response.status_code == 200, response.status_code
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per round.')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--events', type=int, default=1000)
+    parser.add_argument('--slow-query-ms', type=float)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    database = os.path.join(tempfile.mkdtemp(), 'bench_metrics.sqlite3')
+    setup_django(database)
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.test import Client
+
+    call_command('migrate', verbosity=0)
+    event_ids = seed(args.events, users=args.events // 10 or 1)
+    paths = ['/', '/api/events/'] + [f'/event/{pk}/' for pk in random.sample(event_ids, min(100, len(event_ids)))]
+    # the log itself is not what is measured
+    logging.getLogger('metrics.slow_queries').disabled = True
+
+    # a client loads the middleware on its first request, with the settings of then
+    clients = {}
+    for enabled in (False, True):
+        settings.METRICS_ENABLED = enabled
+        settings.METRICS_SLOW_QUERY_MS = args.slow_query_ms
+        clients[enabled] = Client(HTTP_HOST='localhost')
+        run(clients[enabled], paths, len(paths))
+
+    elapsed = {False: 0.0, True: 0.0}
+    for _ in range(args.rounds):
+        for enabled, client in clients.items():
+            elapsed[enabled] += run(client, paths, args.requests)
+    total = args.requests * args.rounds
+    for enabled in (False, True):
+        print(f'metrics {"on " if enabled else "off"}: {total / elapsed[enabled]:8.1f} req/s, '
+              f'{elapsed[enabled] / total * 1e6:7.0f} us/request')
+    print(f'overhead: {(elapsed[True] / elapsed[False] - 1) * 100:+.1f}%')
+    os.remove(database)
+
+
+if __name__ == '__main__':
+    main()
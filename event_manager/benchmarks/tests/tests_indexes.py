@@ -0,0 +1,18 @@
+import subprocess
+import sys
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+
+class TestIndexesBenchmark(SimpleTestCase):
+    # in its own process: the benchmark sets Django up on its own database and migrates it back and forth
+
+    def test_runs(self):
+        result = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.indexes', '--attendances', '20', '--per-event', '2', '--repeat', '1'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn('Migrated to 0005_attendance', result.stdout)
+        self.assertIn('== events of attendee', result.stdout)
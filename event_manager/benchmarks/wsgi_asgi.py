@@ -0,0 +1,219 @@
+"""
+Compare the throughput and latency of the event list and detail pages served
+over WSGI (gunicorn, threaded worker) and ASGI (uvicorn, async views) under
+many concurrent keep-alive clients.
+
+    python -m benchmarks.wsgi_asgi --clients 500 --duration 30
+
+Every server runs in one process with the same number of threads serving the
+database, so the difference is in how requests wait for it. ``asgi-sync``
+serves the synchronous views over ASGI, as before the async views existed.
+Requires the gunicorn and uvicorn packages.
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from . import setup_django
+
+SETTINGS = {
+    'wsgi': 'event_manager.settings',
+    # ASGI with the synchronous views, all run in Django's single sync thread
+    'asgi-sync': 'event_manager.settings',
+    'asgi': 'event_manager.settings_asgi',
+}
+
+
+def seed(events, users):
+    from django.contrib.auth.models import User
+    from django.db import transaction
+    from events.models import Event
+
+    today = date.today()
+    with transaction.atomic():
+        User.objects.bulk_create([User(username=f'user{i}') for i in range(users)])
+        organizers = list(User.objects.values_list('pk', flat=True))
+        Event.objects.bulk_create([
+            Event(
+                name=f'Event {i}',
+                venue='London',
+                organizer_id=random.choice(organizers),
+                date=today + timedelta(days=random.randint(1, 365)),
+                capacity=100,
+            ) for i in range(events)
+        ])
+    return list(Event.objects.values_list('pk', flat=True))
+
+
+def serve(kind, database, port, threads, db_latency):
+    """
+    Run the server in this process, with the benchmark database.
+    """
+    os.environ['DJANGO_SETTINGS_MODULE'] = SETTINGS[kind]
+    setup_django(database)
+    if db_latency:
+        from django.db.backends.signals import connection_created
+
+        def slow_execute(execute, sql, params, many, context):
+            time.sleep(db_latency / 1000)
+            return execute(sql, params, many, context)
+
+        def add_latency(sender, connection, **kwargs):
+            # sent on every reconnection of the same wrapper
+            if slow_execute not in connection.execute_wrappers:
+                connection.execute_wrappers.append(slow_execute)
+
+        connection_created.connect(add_latency, weak=False)
+    if kind.startswith('asgi'):
+        import uvicorn
+        from django.conf import settings
+        from django.core.asgi import get_asgi_application
+
+        settings.EVENTS_ASYNC_DB_THREADS = threads
+        uvicorn.run(get_asgi_application(), host='127.0.0.1', port=port, log_level='warning', backlog=4096)
+        return
+
+    from django.core.wsgi import get_wsgi_application
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f'127.0.0.1:{port}')
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('workers', 1)
+            self.cfg.set('threads', threads)
+            self.cfg.set('worker_connections', 4096)
+            self.cfg.set('backlog', 4096)
+            self.cfg.set('loglevel', 'warning')
+
+        def load(self):
+            return get_wsgi_application()
+
+    Server().run()
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Server on port {port} did not start')
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    headers = {}
+    for line in head.split(b'\r\n')[1:]:
+        if b':' in line:
+            name, value = line.split(b':', 1)
+            headers[name.strip().lower()] = value.strip().lower()
+    if b'content-length' in headers:
+        await reader.readexactly(int(headers[b'content-length']))
+    elif headers.get(b'transfer-encoding') == b'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).strip(), 16)
+            await reader.readexactly(size + 2)
+            if not size:
+                break
+    else:
+        await reader.read()
+    return status, headers.get(b'connection') != b'close'
+
+
+async def client(port, paths, deadline, latencies, errors):
+    reader = writer = None
+    while time.monotonic() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            path = random.choice(paths)
+            start = time.perf_counter()
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode())
+            status, keep_alive = await read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+            if not keep_alive:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+            errors.append(type(e).__name__)
+            if writer is not None:
+                writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def load(port, paths, clients, duration):
+    latencies, errors = [], []
+    deadline = time.monotonic() + duration
+    start = time.monotonic()
+    await asyncio.gather(*(client(port, paths, deadline, latencies, errors) for _ in range(clients)))
+    return latencies, errors, time.monotonic() - start
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--threads', type=int, default=16, help='Threads serving the database in each server.')
+    parser.add_argument('--db-latency', type=float, default=0, help='Milliseconds added to every query, '
+                        'to emulate a database over the network.')
+    parser.add_argument('--events', type=int, default=1000)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--serve', choices=SETTINGS, help=argparse.SUPPRESS)
+    parser.add_argument('--database', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        return serve(args.serve, args.database, args.port, args.threads, args.db_latency)
+    random.seed(args.seed)
+
+    database = os.path.join(tempfile.mkdtemp(), 'bench_wsgi_asgi.sqlite3')
+    setup_django(database)
+    from django.core.management import call_command
+
+    call_command('migrate', verbosity=0)
+    event_ids = seed(args.events, users=args.events // 10 or 1)
+    paths = ['/', '/?page_size=50'] + [f'/event/{pk}/' for pk in random.sample(event_ids, min(100, len(event_ids)))]
+    print(f'Seeded {len(event_ids)} events ({database}), {args.clients} clients for {args.duration:.0f}s')
+
+    for kind in SETTINGS:
+        server = subprocess.Popen([
+            sys.executable, '-m', 'benchmarks.wsgi_asgi', '--serve', kind, '--database', database,
+            '--port', str(args.port), '--threads', str(args.threads), '--db-latency', str(args.db_latency),
+        ])
+        try:
+            wait_for_port(args.port)
+            asyncio.run(load(args.port, paths, min(args.clients, 20), args.warmup))
+            latencies, errors, elapsed = asyncio.run(load(args.port, paths, args.clients, args.duration))
+        finally:
+            server.terminate()
+            server.wait()
+        print(
+            f'{kind:>9}: {len(latencies) / elapsed:8.1f} req/s, p50 {percentile(latencies, 0.5) * 1000:7.1f} ms, '
+            f'p99 {percentile(latencies, 0.99) * 1000:7.1f} ms, {len(errors)} errors of {len(latencies)} requests'
+        )
+    os.remove(database)
+
+
+if __name__ == '__main__':
+    main()
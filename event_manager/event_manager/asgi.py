@@ -2,6 +2,9 @@
 ASGI config for event_manager project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Unless DJANGO_SETTINGS_MODULE says otherwise it uses the settings_asgi profile,
+which serves the read-heavy event views asynchronously, and the live seat
+counts of events at EVENTS_LIVE_SEATS_URL.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
@@ -11,6 +14,10 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'event_manager.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'event_manager.settings_asgi')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from events.live import LiveSeatsMiddleware  # noqa: E402 (needs the apps loaded)
+
+application = LiveSeatsMiddleware(django_application)
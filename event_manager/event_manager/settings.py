@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -39,10 +42,16 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'events.apps.EventsConfig',
     'users.apps.UsersConfig',
+    'jobs.apps.JobsConfig',
+    'metrics.apps.MetricsConfig',
     'crispy_forms',
 ]
 
 MIDDLEWARE = [
+    # first, to time the whole stack; removes itself unless METRICS_ENABLED
+    'metrics.middleware.MetricsMiddleware',
+    # removes itself unless EVENTS_READ_REPLICAS
+    'events.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,7 +65,8 @@ ROOT_URLCONF = 'event_manager.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, timing the templates of the requests when METRICS_ENABLED
+        'BACKEND': 'metrics.backends.DjangoTemplates',
         'DIRS': ['event_manager/templates/'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -75,14 +85,92 @@ WSGI_APPLICATION = 'event_manager.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
-
-DATABASES = {
+# Chosen by the DB_* environment variables described in readme.md.
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+# seconds a connection is reused across requests, 0 to reconnect on every request
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'event_manager'),
+            'USER': os.environ.get('DB_USER', ''),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', ''),
+            'PORT': os.environ.get('DB_PORT', ''),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            # PgBouncer in transaction pooling mode cannot keep the server-side
+            # cursors of QuerySet.iterator() open across transactions
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DB_PGBOUNCER') == '1',
+            'OPTIONS': {'connect_timeout': 5},
+        }
+    }
+elif DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            # file-backed so that tests can exercise concurrent connections
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        }
+    }
+    if os.environ.get('DB_SQLITE_WAL', '1') == '1':
+        # set on each new connection by events.db: readers no longer block the
+        # writer, and writers wait for the lock instead of failing at once
+        DATABASES['default']['PRAGMAS'] = {
+            'journal_mode': 'wal',
+            'synchronous': 'normal',
+            'busy_timeout': 5000,
+        }
+else:
+    raise ImproperlyConfigured(f'Unsupported DB_ENGINE {DB_ENGINE!r}, use sqlite or postgresql')
+
+# read replicas of the default database: comma-separated SQLite files or PostgreSQL hosts,
+# the event pages read from them through events.replicas
+EVENTS_READ_REPLICAS = []
+for number, name in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(',')), 1):
+    replica = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+    replica['HOST' if DB_ENGINE == 'postgresql' else 'NAME'] = name.strip()
+    DATABASES[f'replica{number}'] = replica
+    EVENTS_READ_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['events.replicas.ReplicaRouter']
+# seconds the requests of a user keep reading from the primary after they wrote to it
+EVENTS_REPLICA_PIN_SECONDS = int(os.environ.get('DB_REPLICA_PIN_SECONDS', 10))
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+# Any backend works for the event fragments, e.g. FileBasedCache to share them between processes.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
     }
 }
 
+EVENTS_FRAGMENT_CACHE_TIMEOUT = 60 * 60
+
+
+# Metrics
+# Per-view request metrics, scraped by staff users at /metrics/.
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED') == '1'
+# milliseconds above which queries are logged with their stack, unset to log none
+METRICS_SLOW_QUERY_MS = float(os.environ['METRICS_SLOW_QUERY_MS']) if os.environ.get('METRICS_SLOW_QUERY_MS') else None
+
+
+# Email
+# https://docs.djangoproject.com/en/3.1/topics/email/
+# Sent by the background jobs of the run_jobs worker.
+
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'events@localhost')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -0,0 +1,16 @@
+"""
+Settings of the ASGI deployment, served e.g. by ``uvicorn event_manager.asgi:application``.
+
+The event list, detail and attend views are routed to their async versions,
+which run database work in a pool of EVENTS_ASYNC_DB_THREADS threads. Their
+pages follow the seats left at the event from the stream at EVENTS_LIVE_SEATS_URL.
+"""
+from .settings import *  # noqa: F401,F403
+
+ROOT_URLCONF = 'event_manager.urls_asgi'
+
+# also the number of database connections held by the pool
+EVENTS_ASYNC_DB_THREADS = 16
+
+# served by events.live.LiveSeatsMiddleware in asgi.py
+EVENTS_LIVE_SEATS_URL = '/event/live/'
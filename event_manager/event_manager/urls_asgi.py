@@ -0,0 +1,11 @@
+from django.urls import path
+
+from events import async_views
+from .urls import urlpatterns as sync_urlpatterns
+
+# matched before the synchronous views of the same paths
+urlpatterns = [
+    path('', async_views.event_list, name='home'),
+    path('event/<int:pk>/', async_views.event_detail, name='event-detail'),
+    path('event/<int:pk>/attend/', async_views.attend_event, name='event-attend'),
+] + sync_urlpatterns
@@ -1,4 +1,47 @@
 from django.contrib import admin
-from .models import Event
+from .models import Attendance, Event, EventSeries
+from .series import apply_end, start_series
 
-admin.site.register(Event)
+
+class AttendanceInline(admin.TabularInline):
+    model = Attendance
+    raw_id_fields = ['user']
+    extra = 0
+
+
+class EventAdmin(admin.ModelAdmin):
+    inlines = [AttendanceInline]
+    readonly_fields = ['attendee_count']
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # inline attendances are saved one by one, without m2m_changed
+        Event.objects.filter(pk=form.instance.pk).refresh_attendee_count()
+
+
+admin.site.register(Event, EventAdmin)
+
+
+class EventSeriesAdmin(admin.ModelAdmin):
+    list_display = ['name', 'organizer', 'frequency', 'start_date', 'next_date']
+    readonly_fields = ['materialized_count', 'next_date']
+    # the dates of the created occurrences follow from them
+    schedule_fields = ['frequency', 'interval', 'start_date']
+    raw_id_fields = ['organizer']
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is not None and obj.materialized_count:
+            return [*self.readonly_fields, *self.schedule_fields]
+        return self.readonly_fields
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            start_series(obj)
+            return
+        # not the counters: materialize() may have moved them since the form was read
+        obj.save(update_fields=form.changed_data)
+        # materialize() does not check the end of the next occurrence again
+        apply_end(obj)
+
+
+admin.site.register(EventSeries, EventSeriesAdmin)
@@ -0,0 +1,201 @@
+"""
+JSON API over events, read-only but for batch registrations.
+
+Rows are serialized straight from ``values()`` without building model
+instances. Every response carries a strong ETag derived from Event.updated_at,
+and the event detail a Last-Modified date, which are checked before fetching
+any row so that polling clients get a 304 for the price of one aggregate query.
+Lists have no Last-Modified: their latest updated_at does not move when an
+event is deleted or leaves the filters, their ETag also covers the row count.
+"""
+import hashlib
+import json
+
+from django.contrib.auth.models import User
+from django.core.paginator import InvalidPage
+from django.db.models import Count, F, Max
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_GET, require_POST
+
+from .forms import EventFilterForm
+from .models import Event
+from .pagination import KeysetPaginator, get_page_size
+from .services import RegistrationResult, register_attendees
+
+EVENT_FIELDS = ('id', 'name', 'description', 'date', 'venue', 'capacity', 'attendee_count', 'updated_at')
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MAX_BATCH_SIZE = 500
+
+
+def event_values(events):
+    ranked = ['search_rank'] if 'search_rank' in events.query.annotations else []
+    return events.values(*EVENT_FIELDS, *ranked, organizer_username=F('organizer__username'))
+
+
+def conditional_json(request, version, last_modified, get_data):
+    """
+    Answer 304 if the client holds this version, else the JSON of get_data().
+    """
+    etag = quote_etag(hashlib.md5(repr(version).encode()).hexdigest())
+    last_modified = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        data = get_data()
+        if isinstance(data, JsonResponse):
+            return data
+        response = JsonResponse(data)
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def paginated_events(request, events, keys=('date', 'id')):
+    state = events.aggregate(count=Count('pk'), last_modified=Max('updated_at'))
+    paginator = KeysetPaginator(
+        event_values(events), get_page_size(request, PAGE_SIZE, MAX_PAGE_SIZE), keys
+    )
+
+    def page_url(**cursor):
+        query = request.GET.copy()
+        query.pop('after', None)
+        query.pop('before', None)
+        query.update(cursor)
+        return f'{request.path}?{query.urlencode()}'
+
+    def get_page():
+        try:
+            page = paginator.page(after=request.GET.get('after'), before=request.GET.get('before'))
+        except InvalidPage as e:
+            return JsonResponse({'detail': str(e)}, status=400)
+        return {
+            'results': list(page),
+            'next': page_url(after=page.next_cursor) if page.next_cursor else None,
+            'previous': page_url(before=page.previous_cursor) if page.previous_cursor else None,
+        }
+
+    version = (request.get_full_path(), state['count'], state['last_modified'])
+    return conditional_json(request, version, None, get_page)
+
+
+@require_GET
+def event_list(request):
+    form = EventFilterForm(request.GET)
+    events = form.filter_queryset(Event.objects.all())
+    return paginated_events(request, events, form.keyset)
+
+
+@require_GET
+def event_detail(request, pk):
+    event = event_values(Event.objects.filter(pk=pk)).first()
+    if event is None:
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+    return conditional_json(request, (event['id'], event['updated_at']), event['updated_at'], lambda: event)
+
+
+@require_GET
+def my_registrations(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({'detail': 'Authentication required.'}, status=403)
+    events = Event.objects.filter(attendance__user=request.user)
+    form = EventFilterForm(request.GET)
+    return paginated_events(request, form.filter_queryset(events), form.keyset)
+
+
+def parse_registrations(data, username):
+    """
+    The (event id, username) items of a batch request, None for invalid items,
+    and whether the batch is all or nothing.
+
+    A group booking ``{"event": 1, "users": ["alice", "bob"]}`` is all or nothing
+    unless it says otherwise, a list ``{"registrations": [{"event": 1, "user":
+    "alice"}, {"event": 2}]}`` is not. Items without a user register the caller.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Expected a JSON object')
+    if 'registrations' in data:
+        items = data['registrations']
+        all_or_nothing = data.get('all_or_nothing', False)
+        if not isinstance(items, list):
+            raise ValueError('"registrations" must be a list')
+        items = [
+            (item.get('event'), item.get('user', username)) if isinstance(item, dict) else (None, None)
+            for item in items
+        ]
+    elif 'event' in data:
+        users = data.get('users', [username])
+        all_or_nothing = data.get('all_or_nothing', True)
+        if not isinstance(users, list):
+            raise ValueError('"users" must be a list')
+        items = [(data['event'], user) for user in users]
+    else:
+        raise ValueError('Expected "registrations" or "event"')
+    if not isinstance(all_or_nothing, bool):
+        raise ValueError('"all_or_nothing" must be a boolean')
+    if not items or len(items) > MAX_BATCH_SIZE:
+        raise ValueError(f'Expected between 1 and {MAX_BATCH_SIZE} registrations')
+    return [
+        (event, user) if type(event) is int and isinstance(user, str) else None for event, user in items
+    ], all_or_nothing
+
+
+@require_POST
+def registrations(request):
+    """
+    Register many users to events, or a group to one event, in a few queries whatever their number.
+
+    Users register themselves. Organizers may also register anyone to their
+    own events, and holders of the ``events.add_attendance`` permission anyone
+    to any event. The response has a result per item, in the order of the request.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'detail': 'Authentication required.'}, status=403)
+    try:
+        items, all_or_nothing = parse_registrations(json.loads(request.body), request.user.username)
+    except ValueError as e:
+        return JsonResponse({'detail': str(e)}, status=400)
+
+    valid = [item for item in items if item is not None]
+    user_ids = dict(User.objects.filter(username__in={user for _, user in valid}).values_list('username', 'pk'))
+    others = {event for event, user in valid if user != request.user.username}
+    organizers = None
+    if others and not request.user.has_perm('events.add_attendance'):
+        organizers = dict(Event.objects.filter(pk__in=others).values_list('pk', 'organizer_id'))
+
+    results = []
+    pairs = []
+    for item in items:
+        if item is None:
+            results.append(RegistrationResult.INVALID)
+            continue
+        event, user = item
+        if user not in user_ids:
+            results.append(RegistrationResult.UNKNOWN_USER)
+        elif user != request.user.username and organizers is not None and organizers.get(event) != request.user.pk:
+            results.append(
+                RegistrationResult.FORBIDDEN if event in organizers else RegistrationResult.UNKNOWN_EVENT
+            )
+        else:
+            results.append(None)
+            pairs.append((event, user_ids[user]))
+
+    if all_or_nothing and len(pairs) < len(items):
+        registered = [RegistrationResult.ROLLED_BACK] * len(pairs)
+    else:
+        registered = register_attendees(pairs, all_or_nothing)
+    registered = iter(registered)
+    results = [result if result is not None else next(registered) for result in results]
+    return JsonResponse({
+        'results': [
+            {
+                'event': item[0] if item else None,
+                'user': item[1] if item else None,
+                'result': result.value,
+            } for item, result in zip(items, results)
+        ],
+        'registered': results.count(RegistrationResult.REGISTERED),
+    })
+
@@ -0,0 +1,68 @@
+"""
+Async versions of the read-heavy event views, routed by the ASGI deployment.
+
+Under ASGI, Django 3.1 runs every synchronous view in one shared thread, so a
+slow query blocks all the other requests. These views run the synchronous ones,
+with their database access and template rendering, in a bounded pool of
+``EVENTS_ASYNC_DB_THREADS`` threads instead, leaving the event loop free. The
+bound also caps the database connections, one per pool thread.
+"""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import views
+
+DB_THREADS = getattr(settings, 'EVENTS_ASYNC_DB_THREADS', 8)
+
+db_executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix='events-db')
+
+
+def _call_with_connection(func, *args, **kwargs):
+    # pool threads live across requests: apply CONN_MAX_AGE and drop broken
+    # connections like request_started and request_finished do for WSGI threads
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_in_db_thread(func, *args, **kwargs):
+    """
+    Await func(*args, **kwargs) run in the database thread pool.
+
+    Equivalent to ``sync_to_async(func, thread_sensitive=False)``, whose asgiref
+    version cannot be given an executor.
+    """
+    loop = asyncio.get_event_loop()
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, _call_with_connection, func, *args, **kwargs)
+    return await loop.run_in_executor(db_executor, call)
+
+
+def db_thread_view(view):
+    """
+    Turn a synchronous view into an async one running it, and rendering its response, in the pool.
+    """
+    def get_response(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response.render()
+        return response
+
+    async def async_view(request, *args, **kwargs):
+        return await run_in_db_thread(get_response, request, *args, **kwargs)
+
+    async_view.__name__ = getattr(view, '__name__', 'async_view')
+    async_view.view_class = getattr(view, 'view_class', None)
+    return async_view
+
+
+event_list = db_thread_view(views.EventListView.as_view())
+event_detail = db_thread_view(views.EventDetailView.as_view())
+attend_event = db_thread_view(views.attend_event)
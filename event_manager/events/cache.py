@@ -0,0 +1,127 @@
+"""
+Version-keyed cache of the event HTML fragments shared by all users, and of
+the registrations of each user.
+
+Each event has a version token in the cache which signal receivers replace
+whenever the event or its attendees change, so stale fragments are never
+deleted but simply stop being looked up. Each user has one too, replaced when
+their own attendances change. Only get_many, set_many and add are used, so any
+cache backend works, including the local-memory and file-based ones.
+"""
+import threading
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.dispatch import Signal
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+FRAGMENT_TIMEOUT = getattr(settings, 'EVENTS_FRAGMENT_CACHE_TIMEOUT', 60 * 60)
+
+
+class CacheStats:
+    """
+    Thread-safe hit and miss counters of the fragment cache in this process.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hits, misses):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+stats = CacheStats()
+
+# sent by render_fragments with the hits and misses of each lookup, e.g. for the metrics of the request
+fragments_looked_up = Signal()
+
+
+def version_key(event_id):
+    return f'events:version:{event_id}'
+
+
+def registrations_version_key(user_id):
+    return f'events:registrations:version:{user_id}'
+
+
+def replace_versions(keys):
+    cache.set_many({key: uuid4().hex for key in keys}, None)
+    # a concurrent request may cache the state before this transaction commits
+    if not transaction.get_autocommit():
+        transaction.on_commit(lambda: cache.set_many({key: uuid4().hex for key in keys}, None))
+
+
+def invalidate_event(event_id):
+    replace_versions([version_key(event_id)])
+
+
+def invalidate_events(event_ids):
+    keys = [version_key(event_id) for event_id in set(event_ids)]
+    if keys:
+        replace_versions(keys)
+
+
+def invalidate_registrations(user_ids):
+    """
+    Drop the cached registrations of the users, whose attendances changed.
+    """
+    keys = [registrations_version_key(user_id) for user_id in set(user_ids)]
+    if keys:
+        replace_versions(keys)
+
+
+def get_registrations_version(user_id):
+    return get_versions([user_id], registrations_version_key)[user_id]
+
+
+def get_versions(ids, make_key=version_key):
+    keys = {pk: make_key(pk) for pk in ids}
+    versions = cache.get_many(keys.values())
+    missing = [key for key in keys.values() if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, uuid4().hex, None)
+        versions.update(cache.get_many(missing))
+    return {pk: versions.get(key) for pk, key in keys.items()}
+
+
+def render_fragments(events, template_name):
+    """
+    Return {event pk: HTML} of template_name rendered for each event, taking
+    what it can from the cache and storing the fragments it had to render.
+    """
+    versions = get_versions([event.pk for event in events])
+    # updated_at too, so that a lagging read replica cannot cache an old event under the new version
+    keys = {
+        event.pk: f'events:fragment:{template_name}:{event.pk}:{versions[event.pk]}:{event.updated_at.timestamp()}'
+        for event in events
+    }
+    fragments = cache.get_many(keys.values())
+
+    rendered = {}
+    for event in events:
+        if keys[event.pk] not in fragments:
+            rendered[keys[event.pk]] = render_to_string(template_name, {'event': event})
+    if rendered:
+        cache.set_many(rendered, FRAGMENT_TIMEOUT)
+        fragments.update(rendered)
+    stats.record(len(events) - len(rendered), len(rendered))
+    fragments_looked_up.send(sender=None, hits=len(events) - len(rendered), misses=len(rendered))
+
+    return {event.pk: mark_safe(fragments[keys[event.pk]]) for event in events}
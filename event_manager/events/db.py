@@ -0,0 +1,44 @@
+from django.db import DatabaseError, connections, router
+from django.db.backends.signals import connection_created
+from django.db.models import Max
+from django.db.transaction import TransactionManagementError
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """
+    Run the ``PRAGMAS`` of the database settings on every new SQLite connection.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = connection.settings_dict.get('PRAGMAS', {})
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def bulk_create_with_pks(model, objs):
+    """
+    Insert the objects with bulk_create and set their pks, also on the backends
+    which cannot return them (SQLite).
+
+    There, the new rows are read back as those above the highest pk before the
+    insert. That only holds while the transaction holds the write lock, so it
+    must run in a transaction which already wrote, and finding another number of
+    new rows raises instead of handing out the wrong pks.
+    """
+    objs = list(objs)
+    connection = connections[router.db_for_write(model)]
+    if not objs or connection.features.can_return_rows_from_bulk_insert:
+        return model.objects.bulk_create(objs)
+    if not connection.in_atomic_block:
+        raise TransactionManagementError('bulk_create_with_pks() must run in a transaction holding the write lock')
+    last_pk = model.objects.aggregate(last_pk=Max('pk'))['last_pk'] or 0
+    model.objects.bulk_create(objs)
+    pks = list(model.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True))
+    if len(pks) != len(objs):
+        raise DatabaseError(f'Inserted {len(objs)} {model._meta.verbose_name_plural} but found {len(pks)} new rows')
+    for obj, pk in zip(objs, pks):
+        obj.pk = pk
+    return objs
@@ -0,0 +1,237 @@
+"""
+iCalendar feeds of the events of an organizer and of the events a user attends.
+
+Feeds are streamed from ``values().iterator()`` and answered with a 304 when the
+client's ETag is current. Every response carries an ``X-Sync-Token``: passed back
+as ``?since=<token>``, it makes the next response incremental, holding only the
+events whose ``Event.change_seq`` is greater (and the deleted ones, as cancelled
+events) with ``X-Sync-Mode: incremental``. When the token cannot be honoured the
+whole calendar is sent again with ``X-Sync-Mode: full``, which the client must
+treat as replacing what it holds.
+"""
+import hashlib
+
+from django.contrib.auth.models import User
+from django.core import signing
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_GET
+
+from .models import Event, EventTombstone
+
+CONTENT_TYPE = 'text/calendar; charset=utf-8'
+PRODID = '-//Event Manager//Events//EN'
+# calendar clients poll, the ETag makes most of their requests a 304
+MAX_AGE = 15 * 60
+CHUNK_SIZE = 2000
+EVENT_FIELDS = ('id', 'name', 'description', 'date', 'venue', 'change_seq', 'updated_at')
+
+signer = signing.Signer(salt='events.calendar')
+
+
+def calendar_key(user):
+    """
+    The secret part of the URL of the user's attending feed.
+    """
+    return signer.sign(str(user.pk))
+
+
+def escape(text):
+    return (
+        text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n').replace('\r', '\\n')
+    )
+
+
+def fold(line):
+    """
+    The content line ended by CRLF, folded into lines of at most 75 octets
+    without splitting UTF-8 sequences.
+    """
+    data = line.encode()
+    parts = []
+    start, limit = 0, 75
+    while len(data) - start > limit:
+        end = start + limit
+        while data[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(data[start:end].decode())
+        # continuation lines start with a space
+        start, limit = end, 74
+    parts.append(data[start:].decode())
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def format_datetime(value):
+    return value.strftime('%Y%m%dT%H%M%SZ')
+
+
+def format_date(value):
+    return value.strftime('%Y%m%d')
+
+
+def vevent(event, uid_host, url):
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:event-{event["id"]}@{uid_host}',
+        f'DTSTAMP:{format_datetime(event["updated_at"])}',
+        f'DTSTART;VALUE=DATE:{format_date(event["date"])}',
+        f'SUMMARY:{escape(event["name"])}',
+        f'LOCATION:{escape(event["venue"])}',
+        f'SEQUENCE:{event["change_seq"]}',
+        f'URL:{url}',
+    ]
+    if event['description']:
+        lines.append(f'DESCRIPTION:{escape(event["description"])}')
+    lines.append('END:VEVENT')
+    return ''.join(map(fold, lines))
+
+
+def cancelled_vevent(tombstone, uid_host):
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:event-{tombstone["event_id"]}@{uid_host}',
+        f'DTSTAMP:{format_datetime(tombstone["deleted_at"])}',
+        f'SEQUENCE:{tombstone["change_seq"]}',
+        'STATUS:CANCELLED',
+        'END:VEVENT',
+    ]
+    return ''.join(map(fold, lines))
+
+
+def calendar_response(request, name, events, tombstones=()):
+    """
+    Stream the calendar of the events, then of the tombstones, both querysets of values.
+    """
+    uid_host = request.get_host().split(':')[0]
+    # a URL to fill rather than a reverse() per event
+    url = request.build_absolute_uri(reverse('event-detail', args=[0])).replace('/0/', '/{}/')
+
+    def lines():
+        yield ''.join(map(fold, [
+            'BEGIN:VCALENDAR', 'VERSION:2.0', f'PRODID:{PRODID}', 'CALSCALE:GREGORIAN',
+            f'X-WR-CALNAME:{escape(name)}',
+        ]))
+        for event in events.iterator(chunk_size=CHUNK_SIZE):
+            yield vevent(event, uid_host, url.format(event['id']))
+        for tombstone in tombstones:
+            yield cancelled_vevent(tombstone, uid_host)
+        yield fold('END:VCALENDAR')
+
+    return StreamingHttpResponse(lines(), content_type=CONTENT_TYPE)
+
+
+def conditional_calendar(request, version, token, since, get_response):
+    """
+    Answer 304 if the client holds this version of the response, else get_response().
+    """
+    etag = quote_etag(hashlib.md5(repr((version, since)).encode()).hexdigest())
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = get_response()
+    response['ETag'] = etag
+    response['X-Sync-Token'] = token
+    return response
+
+
+def parse_since(request):
+    """
+    The ?since= token as a (change_seq, digest) pair, None without one.
+    """
+    since = request.GET.get('since')
+    if not since:
+        return None
+    seq, _, digest = since.partition('.')
+    if not seq.isdigit():
+        raise ValueError(f'Invalid sync token {since!r}')
+    return int(seq), digest
+
+
+def event_values(events):
+    return events.order_by('date', 'id').values(*EVENT_FIELDS)
+
+
+@require_GET
+def organizer_calendar(request, pk):
+    """
+    The events of an organizer. Its sync token is the greatest change_seq of
+    their events and tombstones.
+    """
+    try:
+        since = parse_since(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    last_change = Event.objects.filter(organizer=OuterRef('pk')).order_by('-change_seq').values('change_seq')[:1]
+    last_deletion = (
+        EventTombstone.objects.filter(organizer_id=OuterRef('pk')).order_by('-change_seq').values('change_seq')[:1]
+    )
+    # both read on the (organizer, change_seq) indexes
+    organizer = get_object_or_404(
+        User.objects.annotate(last_change=Subquery(last_change), last_deletion=Subquery(last_deletion)), pk=pk
+    )
+    seq = max(organizer.last_change or 0, organizer.last_deletion or 0)
+    events = Event.objects.filter(organizer=organizer)
+    # a token from the future comes from another database
+    incremental = since is not None and not since[1] and since[0] <= seq
+    name = f'Events by {organizer.username}'
+
+    def get_response():
+        if incremental:
+            tombstones = EventTombstone.objects.filter(organizer_id=organizer.pk, change_seq__gt=since[0])
+            response = calendar_response(
+                request, name, event_values(events.filter(change_seq__gt=since[0])),
+                tombstones.order_by('change_seq').values('event_id', 'change_seq', 'deleted_at').iterator(),
+            )
+        else:
+            response = calendar_response(request, name, event_values(events))
+        response['X-Sync-Mode'] = 'incremental' if incremental else 'full'
+        patch_cache_control(response, public=True, max_age=MAX_AGE)
+        return response
+
+    return conditional_calendar(request, seq, str(seq), since, get_response)
+
+
+@require_GET
+def attending_calendar(request, key):
+    """
+    The events a user attends, at a URL signed for them so calendar clients need no login.
+
+    Its sync token is the greatest change_seq of these events followed by a
+    digest of the user's attendances, whose change (attending or leaving an
+    event, or an event being deleted) makes the next response a full one.
+    """
+    try:
+        user_id = int(signer.unsign(key))
+    except (signing.BadSignature, ValueError):
+        raise Http404('Unknown calendar')
+    try:
+        since = parse_since(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    # read on the (user, event_date, event) index, attendance ids are never reused
+    state = User.objects.filter(pk=user_id).annotate(
+        count=Count('attendance'), last_attendance=Coalesce(Max('attendance'), 0),
+        seq=Coalesce(Max('attendance__event__change_seq'), 0),
+    ).values('username', 'count', 'last_attendance', 'seq').first()
+    if state is None:
+        raise Http404('Unknown calendar')
+    seq = state['seq']
+    digest = hashlib.md5(f'{state["count"]}:{state["last_attendance"]}'.encode()).hexdigest()[:12]
+    incremental = since is not None and since[1] == digest and since[0] <= seq
+    events = Event.objects.filter(attendance__user_id=user_id)
+
+    def get_response():
+        response = calendar_response(
+            request, f'Events attended by {state["username"]}',
+            event_values(events.filter(change_seq__gt=since[0]) if incremental else events),
+        )
+        response['X-Sync-Mode'] = 'incremental' if incremental else 'full'
+        patch_cache_control(response, private=True, max_age=MAX_AGE)
+        return response
+
+    return conditional_calendar(request, (seq, digest), f'{seq}.{digest}', since, get_response)
@@ -0,0 +1,102 @@
+from datetime import date
+
+from django import forms
+
+from .models import Event, EventSeries
+from .search import search_events
+
+EVENT_FIELDS = ['name', 'description', 'date', 'venue', 'capacity']
+
+
+class EventFilterForm(forms.Form):
+    """
+    Query string filters of the event list.
+    """
+    upcoming = forms.NullBooleanField(required=False)
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+    q = forms.CharField(required=False, max_length=100)
+
+    def filter_queryset(self, events):
+        """
+        Apply the valid filters to the events, ignoring the invalid ones.
+        """
+        self.is_valid()
+        filters = self.cleaned_data
+        # past events are only listed on request
+        if filters.get('upcoming') is not False:
+            events = events.filter(date__gte=date.today())
+        if filters.get('start'):
+            events = events.filter(date__gte=filters['start'])
+        if filters.get('end'):
+            events = events.filter(date__lte=filters['end'])
+        if filters.get('q'):
+            events = search_events(events, filters['q'])
+        return events
+
+    @property
+    def keyset(self):
+        """
+        Pagination key of the filtered events: by relevance when searching, else by date.
+        """
+        if self.is_valid() and self.cleaned_data.get('q'):
+            return ('search_rank', 'id')
+        return ('date', 'id')
+
+
+class EventCreateForm(forms.ModelForm):
+    """
+    An event, optionally repeated as a series starting on its date.
+    """
+    repeat = forms.ChoiceField(choices=[('', 'Does not repeat'), *EventSeries.FREQUENCIES], required=False)
+    interval = forms.IntegerField(
+        min_value=1, max_value=12, initial=1, required=False, help_text='Repeat every this many weeks or months.'
+    )
+    until = forms.DateField(required=False, help_text='Date of the last event of the series.')
+    count = forms.IntegerField(min_value=1, required=False, help_text='Or number of events of the series.')
+
+    class Meta:
+        model = Event
+        fields = EVENT_FIELDS
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('repeat'):
+            return cleaned_data
+        if cleaned_data.get('until') and cleaned_data.get('count'):
+            raise forms.ValidationError('End the series on a date or after a number of events, not both.')
+        if cleaned_data.get('until') and cleaned_data.get('date') and cleaned_data['until'] < cleaned_data['date']:
+            self.add_error('until', 'The series cannot end before it starts.')
+        return cleaned_data
+
+    def build_series(self, organizer):
+        """
+        The unsaved series repeating the event, if requested.
+        """
+        data = self.cleaned_data
+        if not data.get('repeat'):
+            return None
+        return EventSeries(
+            name=data['name'], description=data['description'], venue=data['venue'], capacity=data['capacity'],
+            organizer=organizer, frequency=data['repeat'], interval=data.get('interval') or 1,
+            start_date=data['date'], until=data.get('until'), count=data.get('count'),
+        )
+
+
+class EventUpdateForm(forms.ModelForm):
+    """
+    An event, whose changes can also apply to the later events of its series.
+    """
+    apply_to_series = forms.BooleanField(
+        required=False, label='Apply to the later events of the series',
+        help_text='All the changes but the date.',
+    )
+
+    class Meta:
+        model = Event
+        fields = EVENT_FIELDS
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.series_id is None:
+            del self.fields['apply_to_series']
@@ -0,0 +1,225 @@
+"""
+Live seat availability of events, pushed to browsers over Server-Sent Events.
+
+``LiveSeatsMiddleware`` wraps the ASGI application and answers
+``EVENTS_LIVE_SEATS_URL?events=1,2`` itself with a stream of ``seats`` events:
+the seats left at each event when it connects, then whenever they change. An
+idle connection is a coroutine waiting on an asyncio.Event, without a thread or
+a database connection, so one process holds thousands of them.
+
+Signal receivers call publish_seats() for the events whose attendances or
+capacity changed. Once the transaction commits, the new counts are read in one
+query, only if a client of this process follows one of the events, and handed
+to the event loop. Each event has a single topic: a change is read once and
+then handed to every subscriber of the event, each of which keeps only the
+latest counts until it is written to its client.
+
+Only the clients of the process that made the change are notified, so run the
+ASGI application in a single process or give each client a process of its own.
+"""
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .models import Event
+
+# seconds between the comments keeping idle connections open through proxies
+HEARTBEAT_SECONDS = 15
+# the browser reconnects after this many milliseconds
+RETRY_MS = 5000
+MAX_EVENTS = 100
+
+
+class Subscriber:
+    """
+    A client following events, holding the counts not yet written to it.
+    """
+    __slots__ = ('event_ids', 'pending', 'sent', 'wake', 'closed')
+
+    def __init__(self, event_ids):
+        self.event_ids = event_ids
+        self.pending = {}
+        # event id: updated_at of the counts written last, to never write older ones
+        self.sent = {}
+        self.wake = asyncio.Event()
+        self.closed = False
+
+    def push(self, seats):
+        self.pending[seats['event']] = seats
+        self.wake.set()
+
+    def close(self):
+        self.closed = True
+        self.wake.set()
+
+    def take(self):
+        """
+        The pending counts newer than those written, marked as written.
+        """
+        pending, self.pending = self.pending, {}
+        self.wake.clear()
+        fresh = [
+            seats for seats in pending.values()
+            if seats['event'] not in self.sent or seats['updated_at'] > self.sent[seats['event']]
+        ]
+        for seats in fresh:
+            self.sent[seats['event']] = seats['updated_at']
+        return fresh
+
+
+class Broker:
+    """
+    The subscribers of each event, only changed from the event loop.
+    """
+    def __init__(self):
+        self.topics = {}
+        self.loop = None
+
+    def subscribe(self, event_ids):
+        self.loop = asyncio.get_running_loop()
+        subscriber = Subscriber(event_ids)
+        for event_id in event_ids:
+            self.topics.setdefault(event_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        for event_id in subscriber.event_ids:
+            topic = self.topics.get(event_id)
+            if topic is not None:
+                topic.discard(subscriber)
+                if not topic:
+                    del self.topics[event_id]
+
+    def is_followed(self, event_id):
+        # a single dict lookup, safe from any thread
+        return event_id in self.topics
+
+    def publish(self, rows):
+        """
+        Hand the counts to the event loop, from any thread.
+        """
+        if self.loop is None or not rows:
+            return
+        try:
+            self.loop.call_soon_threadsafe(self.fan_out, rows)
+        except RuntimeError:
+            # the loop is closed
+            pass
+
+    def fan_out(self, rows):
+        for seats in rows:
+            for subscriber in self.topics.get(seats['event'], ()):
+                subscriber.push(seats)
+
+
+broker = Broker()
+
+
+def read_seats(event_ids, using=DEFAULT_DB_ALIAS):
+    return [
+        {
+            'event': pk,
+            'capacity': capacity,
+            'attendees': attendee_count,
+            'remaining': max(0, capacity - attendee_count),
+            'updated_at': updated_at,
+        } for pk, capacity, attendee_count, updated_at in Event.objects.using(using).filter(
+            pk__in=event_ids
+        ).values_list('pk', 'capacity', 'attendee_count', 'updated_at')
+    ]
+
+
+def publish_seats(event_ids, using=DEFAULT_DB_ALIAS):
+    """
+    Push the seats left at the events to the clients following them, once the transaction commits.
+    """
+    followed = [event_id for event_id in set(event_ids) if broker.is_followed(event_id)]
+    if followed:
+        transaction.on_commit(lambda: broker.publish(read_seats(followed, using)), using=using)
+
+
+def format_events(rows):
+    return ''.join(
+        f'event: seats\ndata: {json.dumps({k: v for k, v in seats.items() if k != "updated_at"})}\n\n'
+        for seats in rows
+    ).encode()
+
+
+def parse_event_ids(query_string):
+    values = parse_qs(query_string.decode('latin-1')).get('events', [])
+    try:
+        event_ids = {int(value) for param in values for value in param.split(',') if value}
+    except ValueError:
+        raise ValueError('events must be a comma-separated list of event ids')
+    if not event_ids or len(event_ids) > MAX_EVENTS:
+        raise ValueError(f'Follow between 1 and {MAX_EVENTS} events')
+    return event_ids
+
+
+async def send_error(send, status, message):
+    await send({'type': 'http.response.start', 'status': status, 'headers': [(b'content-type', b'text/plain')]})
+    await send({'type': 'http.response.body', 'body': message.encode()})
+
+
+async def wait_for_disconnect(receive, subscriber):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+    subscriber.close()
+
+
+async def stream_seats(scope, receive, send):
+    # the views behind async_views publish seats
+    from .async_views import run_in_db_thread
+
+    if scope['method'] != 'GET':
+        return await send_error(send, 405, 'Method not allowed')
+    try:
+        event_ids = parse_event_ids(scope['query_string'])
+    except ValueError as e:
+        return await send_error(send, 400, str(e))
+
+    # subscribed first so that no change is missed while reading the current counts
+    subscriber = broker.subscribe(event_ids)
+    disconnect = asyncio.ensure_future(wait_for_disconnect(receive, subscriber))
+    try:
+        for seats in await run_in_db_thread(read_seats, event_ids):
+            subscriber.push(seats)
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                # no buffering by nginx
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': f'retry: {RETRY_MS}\n\n'.encode(), 'more_body': True})
+        while not subscriber.closed:
+            rows = subscriber.take()
+            if rows:
+                await send({'type': 'http.response.body', 'body': format_events(rows), 'more_body': True})
+            try:
+                await asyncio.wait_for(subscriber.wake.wait(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                await send({'type': 'http.response.body', 'body': b':\n\n', 'more_body': True})
+    finally:
+        disconnect.cancel()
+        broker.unsubscribe(subscriber)
+
+
+class LiveSeatsMiddleware:
+    """
+    ASGI middleware serving the seat stream at EVENTS_LIVE_SEATS_URL, passing every other request on.
+    """
+    def __init__(self, application):
+        self.application = application
+        self.path = getattr(settings, 'EVENTS_LIVE_SEATS_URL', None)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and self.path and scope['path'] == self.path:
+            return await stream_seats(scope, receive, send)
+        return await self.application(scope, receive, send)
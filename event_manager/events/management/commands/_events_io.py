@@ -0,0 +1,59 @@
+"""
+Row formats shared by the import_events and export_events commands.
+
+A row holds the editable fields of an event, the username of its organizer and
+the usernames of its attendees. CSV files have one column per field, with the
+attendees separated by spaces; JSON Lines files have one object per line.
+"""
+import csv
+import json
+
+from django.core.management.base import CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+FIELDS = ['name', 'description', 'date', 'venue', 'capacity', 'organizer', 'attendees']
+FORMATS = ['csv', 'jsonl']
+
+
+def get_format(path, fmt=None):
+    if fmt:
+        return fmt
+    extension = path.rsplit('.', 1)[-1].lower()
+    if extension in FORMATS:
+        return extension
+    raise CommandError(f'Cannot guess the format of {path}, use --format')
+
+
+def read_rows(stream, fmt):
+    """
+    Yield (line number, row) pairs, where row is the exception raised for lines that cannot be parsed.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            row['attendees'] = (row.get('attendees') or '').split()
+            yield reader.line_num, row
+    else:
+        for number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                row = e
+            yield number, row
+
+
+class RowWriter:
+    def __init__(self, write, fmt):
+        self.write = write
+        self.fmt = fmt
+        if fmt == 'csv':
+            self.csv_writer = csv.DictWriter(self, FIELDS)
+            self.csv_writer.writeheader()
+
+    def writerow(self, row):
+        if self.fmt == 'csv':
+            self.csv_writer.writerow(dict(row, attendees=' '.join(row['attendees'])))
+        else:
+            self.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
@@ -0,0 +1,102 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from events.cache import invalidate_events, invalidate_registrations
+from events.models import ArchivedAttendance, ArchivedEvent, Attendance, Event, Reminder, WaitlistEntry
+from events.search import get_backend
+from events.services import lock_events
+
+ARCHIVED_FIELDS = ['id', 'name', 'description', 'date', 'venue', 'organizer_id', 'capacity', 'attendee_count']
+# stay below the bound parameter limit of SQLite
+MAX_CHUNK_SIZE = 900
+
+
+class Command(BaseCommand):
+    help = (
+        'Move the events which took place more than --days days ago, and their attendances, to the archive '
+        'tables, --chunk-size events per transaction. An interrupted run resumes where it stopped when started '
+        'again, and --pause leaves the database to other clients between chunks.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365, help='Archive the events older than this many days.')
+        parser.add_argument('--chunk-size', type=int, default=100, help='Events moved per transaction.')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between two chunks.')
+        parser.add_argument('--limit', type=int, help='Stop after archiving this many events.')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('Only past events can be archived, --days must be at least 1')
+        if not 1 <= options['chunk_size'] <= MAX_CHUNK_SIZE:
+            raise CommandError(f'--chunk-size must be between 1 and {MAX_CHUNK_SIZE}')
+        cutoff = date.today() - timedelta(days=options['days'])
+        limit = options['limit']
+
+        start = time.monotonic()
+        self.events = self.attendances = 0
+        while limit is None or self.events < limit:
+            size = options['chunk_size'] if limit is None else min(options['chunk_size'], limit - self.events)
+            # the oldest first, a range on the (date, id) index read outside the transaction to keep it short
+            event_ids = list(
+                Event.objects.filter(date__lt=cutoff).order_by('date', 'id').values_list('pk', flat=True)[:size]
+            )
+            if not event_ids:
+                break
+            self.archive_chunk(event_ids, cutoff)
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Archived {self.events} events and {self.attendances} attendances')
+            if options['pause']:
+                time.sleep(options['pause'])
+        elapsed = time.monotonic() - start
+
+        rate = self.events / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {self.events} events before {cutoff} and {self.attendances} attendances '
+            f'in {elapsed:.2f}s ({rate:.0f} events/s)'
+        ))
+
+    def archive_chunk(self, event_ids, cutoff):
+        """
+        Copy the events and their attendances to the archive and delete them, in one transaction.
+        """
+        with transaction.atomic():
+            # first, see lock_events: the events cannot change while they are copied
+            locked = lock_events(event_ids)
+            # the date of an event may have changed since it was read
+            event_ids = [pk for pk, (_, event_date) in locked.items() if event_date < cutoff]
+            if not event_ids:
+                return
+            events = Event.objects.filter(pk__in=event_ids).values(*ARCHIVED_FIELDS)
+            # a row already in the archive raises and rolls the chunk back, rather than being silently kept
+            ArchivedEvent.objects.bulk_create([ArchivedEvent(**event) for event in events])
+            attendances = list(
+                Attendance.objects.filter(event_id__in=event_ids).values_list('event_id', 'user_id', 'event_date')
+            )
+            ArchivedAttendance.objects.bulk_create([
+                ArchivedAttendance(event_id=event_id, user_id=user_id, event_date=event_date)
+                for event_id, user_id, event_date in attendances
+            ])
+
+            # plain DELETE statements: Model.delete() would send signals for every row, and the
+            # post_delete of Event would write a calendar tombstone for events which still took place
+            for model in (Reminder, WaitlistEntry, Attendance):
+                self.delete_rows(model, model._meta.get_field('event').column, event_ids)
+            self.delete_rows(Event, Event._meta.pk.column, event_ids)
+            get_backend().remove(event_ids)
+            invalidate_events(event_ids)
+            invalidate_registrations({user_id for _, user_id, _ in attendances})
+
+        self.events += len(event_ids)
+        self.attendances += len(attendances)
+
+    def delete_rows(self, model, column, event_ids):
+        placeholders = ', '.join(['%s'] * len(event_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)} '
+                f'WHERE {connection.ops.quote_name(column)} IN ({placeholders})',
+                event_ids,
+            )
@@ -0,0 +1,66 @@
+import time
+from collections import defaultdict
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from events.models import Attendance, Event
+from ._events_io import FORMATS, RowWriter, get_format
+
+
+class Command(BaseCommand):
+    help = 'Export events and their attendees to a CSV or JSON Lines file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help="File to write, or '-' for the standard output.")
+        parser.add_argument('--format', choices=FORMATS, help='Default: guessed from the file extension.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of events read per query.')
+        parser.add_argument('--upcoming', action='store_true', help='Only export upcoming events.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = get_format(path, options['format'] or ('csv' if path == '-' else None))
+        events = Event.objects.order_by('pk')
+        if options['upcoming']:
+            events = events.filter(date__gte=date.today())
+
+        start = time.perf_counter()
+        if path == '-':
+            exported = self.export(events, RowWriter(lambda data: self.stdout.write(data, ending=''), fmt), options)
+            report = self.stderr
+        else:
+            with open(path, 'w', newline='', encoding='utf-8') as stream:
+                exported = self.export(events, RowWriter(stream.write, fmt), options)
+            report = self.stdout
+        elapsed = time.perf_counter() - start
+
+        rate = exported / elapsed if elapsed else 0
+        report.write(self.style.SUCCESS(f'Exported {exported} events in {elapsed:.2f}s ({rate:.0f} rows/s)'))
+
+    def export(self, events, writer, options):
+        exported = 0
+        last_pk = 0
+        while True:
+            rows = list(
+                events.filter(pk__gt=last_pk).values(
+                    'pk', 'name', 'description', 'date', 'venue', 'capacity', organizer_username=F('organizer__username')
+                )[:options['batch_size']]
+            )
+            if not rows:
+                return exported
+            last_pk = rows[-1]['pk']
+
+            attendees = defaultdict(list)
+            attendances = Attendance.objects.filter(
+                event_id__in=[row['pk'] for row in rows]
+            ).order_by('pk').values_list('event_id', 'user__username')
+            for event_id, username in attendances:
+                attendees[event_id].append(username)
+
+            for row in rows:
+                pk = row.pop('pk')
+                row['organizer'] = row.pop('organizer_username')
+                row['attendees'] = attendees[pk]
+                writer.writerow(row)
+            exported += len(rows)
@@ -0,0 +1,138 @@
+import sys
+import time
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from events.cache import invalidate_registrations
+from events.db import bulk_create_with_pks
+from events.models import Attendance, Event, EventChangeCounter, earliest_event_date
+from events.search import get_backend
+from ._events_io import FORMATS, get_format, read_rows
+
+EVENT_FIELDS = ['name', 'description', 'date', 'venue', 'capacity']
+# stay below the bound parameter limit of SQLite
+LOOKUP_CHUNK_SIZE = 900
+
+
+class Command(BaseCommand):
+    help = 'Import events, and optionally their attendees, from a CSV or JSON Lines file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to read, or '-' for the standard input.")
+        parser.add_argument('--format', choices=FORMATS, help='Default: guessed from the file extension.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of events inserted per transaction.')
+        parser.add_argument('--organizer', help='Username of the organizer of the rows without one.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = get_format(path, options['format'])
+        self.default_organizer = options['organizer']
+        self.imported = self.attendances = self.skipped = 0
+
+        start = time.perf_counter()
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        try:
+            batch = []
+            for number, row in read_rows(stream, fmt):
+                batch.append((number, row))
+                if len(batch) == options['batch_size']:
+                    self.import_batch(batch)
+                    batch = []
+            if batch:
+                self.import_batch(batch)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        elapsed = time.perf_counter() - start
+
+        rate = (self.imported + self.skipped) / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {self.imported} events and {self.attendances} attendances in {elapsed:.2f}s '
+            f'({rate:.0f} rows/s), skipped {self.skipped} invalid rows'
+        ))
+
+    def import_batch(self, batch):
+        users = self.get_user_ids(batch)
+        events = []
+        attendees = []
+        for number, row in batch:
+            try:
+                event, attendee_ids = self.build_event(row, users)
+            except ValidationError as e:
+                self.skipped += 1
+                self.stderr.write(f'Line {number}: {"; ".join(e.messages)}')
+                continue
+            events.append(event)
+            attendees.append(attendee_ids)
+        if not events:
+            return
+
+        with transaction.atomic():
+            # bulk_create bypasses Event.save, the batch shares one change sequence number
+            change_seq = EventChangeCounter.next()
+            for event in events:
+                event.change_seq = change_seq
+            # this transaction holds the write lock since the counter update
+            bulk_create_with_pks(Event, events)
+            # bulk_create sends no pre_save to copy the event dates
+            Attendance.objects.bulk_create([
+                Attendance(event_id=event.pk, user_id=user_id, event_date=event.date)
+                for event, attendee_ids in zip(events, attendees) for user_id in attendee_ids
+            ], ignore_conflicts=True)
+            # bulk_create does not send post_save
+            get_backend().index(event.pk for event in events)
+            invalidate_registrations(user_id for attendee_ids in attendees for user_id in attendee_ids)
+
+        self.imported += len(events)
+        self.attendances += sum(len(attendee_ids) for attendee_ids in attendees)
+
+    def get_user_ids(self, batch):
+        usernames = {self.default_organizer} if self.default_organizer else set()
+        for number, row in batch:
+            if isinstance(row, dict):
+                usernames.add(row.get('organizer'))
+                # anything but a list of usernames is reported by build_event
+                attendees = row.get('attendees') or []
+                if isinstance(attendees, list):
+                    usernames.update(username for username in attendees if isinstance(username, str))
+        usernames = [username for username in usernames if isinstance(username, str)]
+
+        users = {}
+        for i in range(0, len(usernames), LOOKUP_CHUNK_SIZE):
+            chunk = usernames[i:i + LOOKUP_CHUNK_SIZE]
+            users.update(User.objects.filter(username__in=chunk).values_list('username', 'pk'))
+        return users
+
+    def build_event(self, row, users):
+        """
+        Validate a row with the rules of EventCreateView and return the unsaved
+        event with the ids of its attendees.
+        """
+        if not isinstance(row, dict):
+            raise ValidationError(f'Cannot parse row: {row}')
+
+        event = Event(**{field: row[field] for field in EVENT_FIELDS if row.get(field) not in (None, '')})
+        event.full_clean(exclude=['organizer'])
+        if event.date < earliest_event_date():
+            raise ValidationError('Cannot create events in the past or today!')
+
+        organizer = row.get('organizer') or self.default_organizer
+        if organizer not in users:
+            raise ValidationError(f'Unknown organizer {organizer!r}')
+        event.organizer_id = users[organizer]
+
+        attendees = row.get('attendees') or []
+        if not isinstance(attendees, list) or not all(isinstance(username, str) for username in attendees):
+            raise ValidationError('The attendees must be a list of usernames')
+        unknown = [username for username in attendees if username not in users]
+        if unknown:
+            raise ValidationError(f'Unknown attendees {", ".join(map(repr, unknown))}')
+        attendee_ids = {users[username] for username in attendees}
+        if len(attendee_ids) > event.capacity:
+            raise ValidationError(f'{len(attendee_ids)} attendees exceed the capacity of {event.capacity}')
+        event.attendee_count = len(attendee_ids)
+
+        return event, attendee_ids
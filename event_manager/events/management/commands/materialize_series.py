@@ -0,0 +1,27 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+
+from events.series import WINDOW_DAYS, materialize, window_end
+
+
+class Command(BaseCommand):
+    help = (
+        'Create the occurrences of the event series falling within the window of EVENTS_SERIES_WINDOW_DAYS days. '
+        'Run it daily to move the window forward.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, help=f'Create the occurrences this many days ahead instead of {WINDOW_DAYS}.'
+        )
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        until = window_end() if options['days'] is None else date.today() + timedelta(days=options['days'])
+        events = materialize(until=until)
+        series = len({event.series_id for event in events})
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {len(events)} events of {series} series up to {until} in {time.monotonic() - start:.2f}s'
+        ))
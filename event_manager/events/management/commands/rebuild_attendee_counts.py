@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized attendee counter of events from the attendees table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_ids', nargs='*', type=int, help='Only rebuild these events (default: all).')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of events updated per statement.')
+
+    def handle(self, *args, **options):
+        events = Event.objects.order_by('pk')
+        if options['event_ids']:
+            events = events.filter(pk__in=options['event_ids'])
+
+        updated = 0
+        last_pk = 0
+        while True:
+            batch = list(events.filter(pk__gt=last_pk).values_list('pk', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            updated += Event.objects.filter(pk__in=batch).refresh_attendee_count()
+            last_pk = batch[-1]
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt attendee count of {updated} events'))
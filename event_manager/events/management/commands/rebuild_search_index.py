@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from events.models import Event
+from events.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Recreate the full-text search index of events from the events table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of events indexed per statement.')
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        start = time.monotonic()
+        indexed = 0
+        # searches never see a partially rebuilt index
+        with transaction.atomic():
+            backend.clear()
+            last_pk = 0
+            while True:
+                batch = list(
+                    Event.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:options['batch_size']]
+                )
+                if not batch:
+                    break
+                backend.index(batch)
+                indexed += len(batch)
+                last_pk = batch[-1]
+
+        elapsed = time.monotonic() - start
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} events in {elapsed:.2f}s'))
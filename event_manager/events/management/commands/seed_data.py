@@ -0,0 +1,158 @@
+import random
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+
+from events.models import Attendance, Event, EventChangeCounter
+from events.search import get_backend
+
+CITIES = ['London', 'Paris', 'Berlin', 'Madrid', 'Rome', 'Lisbon', 'Vienna', 'Prague', 'Dublin', 'Amsterdam']
+TOPICS = [
+    'Python', 'Django', 'Rust', 'Databases', 'Security', 'Design', 'Startups', 'Music', 'Cooking', 'Chess',
+    'Photography', 'Running', 'Climbing', 'Poetry', 'Robotics', 'Astronomy',
+]
+KINDS = ['meetup', 'workshop', 'conference', 'night', 'course', 'festival', 'hackathon', 'talk']
+CAPACITIES = [10, 20, 20, 30, 50, 50, 100]
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate users, events and attendances for load tests: event popularity and user activity are '
+        'skewed, and some events are fully booked. The same --seed generates the same data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--events', type=int, default=10000)
+        parser.add_argument(
+            '--attendances', type=int, default=500000,
+            help='Attendances to aim for, fewer if the events are too small to hold them.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows inserted per statement.')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['events'] < 0 or options['attendances'] < 0:
+            raise CommandError('--users must be positive, --events and --attendances not negative')
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        start = time.monotonic()
+        if connection.vendor == 'sqlite':
+            # the attendance indexes outgrow the default 2 MB page cache, making inserts seek
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA cache_size = -262144')
+
+        with transaction.atomic():
+            user_ids = self.create_users(options['users'])
+            counts = self.attendee_counts(options['events'], options['attendances'], len(user_ids))
+            event_dates = self.create_events(counts, user_ids)
+            attendances = self.create_attendances(event_dates, counts, user_ids)
+            # the ids were given explicitly, the sequences must catch up
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), [User, Event]):
+                    cursor.execute(sql)
+
+        elapsed = time.monotonic() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {len(user_ids)} users, {len(event_dates)} events and {attendances} attendances '
+            f'in {elapsed:.1f}s ({attendances / elapsed if elapsed else 0:.0f} attendances/s)'
+        ))
+
+    def next_id(self, model):
+        return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+    def create_users(self, count):
+        first = self.next_id(User)
+        ids = range(first, first + count)
+        for batch_start in range(0, count, self.batch_size):
+            User.objects.bulk_create([
+                User(pk=pk, username=f'user{pk}', email=f'user{pk}@example.com', password='!')
+                for pk in ids[batch_start:batch_start + self.batch_size]
+            ])
+        return ids
+
+    def attendee_counts(self, events, attendances, users):
+        """
+        The capacity and attendee count of each event, spreading the attendances by popularity.
+        """
+        capacities = [min(self.random.choice(CAPACITIES), users) for _ in range(events)]
+        # most events fill up partly, a few are fully booked
+        popularity = [capacity * self.random.betavariate(1.2, 1.5) for capacity in capacities]
+        scale = attendances / sum(popularity) if popularity and sum(popularity) else 0
+        return [
+            (capacity, min(capacity, round(weight * scale))) for capacity, weight in zip(capacities, popularity)
+        ]
+
+    def create_events(self, counts, user_ids):
+        today = date.today()
+        # a minority of users organizes the events
+        organizers = self.random.sample(user_ids, max(1, len(user_ids) // 20))
+        first = self.next_id(Event)
+        ids = range(first, first + len(counts))
+        dates = []
+        search = get_backend()
+        # bulk_create bypasses Event.save
+        change_seq = EventChangeCounter.next()
+        for batch_start in range(0, len(counts), self.batch_size):
+            events = []
+            batch = counts[batch_start:batch_start + self.batch_size]
+            for pk, (capacity, attendee_count) in zip(ids[batch_start:], batch):
+                topic, kind, city = self.random.choice(TOPICS), self.random.choice(KINDS), self.random.choice(CITIES)
+                events.append(Event(
+                    pk=pk,
+                    name=f'{topic} {kind} #{pk}',
+                    description=f'A {kind} about {topic.lower()} in {city}.',
+                    date=today + timedelta(days=self.random.randint(-180, 365)),
+                    venue=city,
+                    organizer_id=self.random.choice(organizers),
+                    capacity=capacity,
+                    attendee_count=attendee_count,
+                    change_seq=change_seq,
+                ))
+            Event.objects.bulk_create(events)
+            # bulk_create does not send post_save
+            search.index(event.pk for event in events)
+            dates += (connection.ops.adapt_datefield_value(event.date) for event in events)
+        return list(zip(ids, dates))
+
+    def create_attendances(self, event_dates, counts, user_ids):
+        """
+        Insert the attendees of each event straight into the through table.
+        """
+        # a fifth of the users make most of the registrations
+        active = user_ids[:max(1, len(user_ids) // 5)]
+        rows = []
+        total = 0
+        with connection.cursor() as cursor:
+            for (event_id, event_date), (capacity, attendee_count) in zip(event_dates, counts):
+                attendees = set()
+                while len(attendees) < attendee_count:
+                    pool = active if self.random.random() < 0.8 and len(active) > attendee_count else user_ids
+                    attendees.add(self.random.choice(pool))
+                rows.extend((event_id, user_id, event_date) for user_id in sorted(attendees))
+                if len(rows) >= self.batch_size:
+                    total += self.insert_attendances(cursor, rows)
+                    rows = []
+            total += self.insert_attendances(cursor, rows)
+        return total
+
+    def insert_attendances(self, cursor, rows):
+        """
+        Insert the (event_id, user_id, event_date) rows with as many rows per statement as the database takes.
+        """
+        fields = [Attendance._meta.get_field(name) for name in ('event', 'user', 'event_date')]
+        per_statement = connection.ops.bulk_batch_size(fields, rows)
+        table = connection.ops.quote_name(Attendance._meta.db_table)
+        for start in range(0, len(rows), per_statement):
+            chunk = rows[start:start + per_statement]
+            cursor.execute(
+                f'INSERT INTO {table} (event_id, user_id, event_date) VALUES '
+                + ', '.join(['(%s, %s, %s)'] * len(chunk)),
+                [value for row in chunk for value in row],
+            )
+        return len(rows)
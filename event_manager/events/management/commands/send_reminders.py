@@ -0,0 +1,135 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date, timedelta
+from uuid import uuid4
+
+from django.core.mail import EmailMessage
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from events.models import Attendance, Event, Reminder
+from events.tasks import send_emails
+
+
+class Command(BaseCommand):
+    help = (
+        'Email a reminder to the attendees of the events taking place in --days days. '
+        'Reminders are logged before being sent, so an interrupted run can be started again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=1, help='Remind of the events this many days ahead.')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Attendees read and sent per batch.')
+        parser.add_argument('--workers', type=int, default=8, help='Threads sending the batches.')
+        parser.add_argument(
+            '--reclaim-after', type=int, metavar='MINUTES',
+            help='Send again the reminders claimed this many minutes ago by runs which never confirmed them.',
+        )
+
+    def handle(self, *args, **options):
+        self.run_id = uuid4().hex
+        chunk_size = options['chunk_size']
+        start = time.monotonic()
+        self.sent = self.failed = 0
+
+        # an equality on the date of the (date, id) index, which also returns them in pk order
+        events = list(Event.objects.filter(date=date.today() + timedelta(days=options['days'])).order_by('pk'))
+        if options['reclaim_after'] is not None:
+            self.reclaim(events, timezone.now() - timedelta(minutes=options['reclaim_after']))
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            pending = set()
+            for event in events:
+                for batch in self.claim_batches(event, chunk_size):
+                    # at most two batches per worker in memory
+                    if len(pending) >= 2 * options['workers']:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        self.collect(done)
+                    pending.add(executor.submit(self.send_batch, event, batch))
+            self.collect(wait(pending).done)
+
+        unconfirmed = Reminder.objects.filter(event__in=events, sent_at__isnull=True).count()
+        elapsed = time.monotonic() - start
+        rate = self.sent / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Sent {self.sent} reminders for {len(events)} events in {elapsed:.2f}s ({rate:.0f} sent/s), '
+            f'{self.failed} failed'
+        ))
+        if unconfirmed:
+            self.stderr.write(
+                f'{unconfirmed} reminders were claimed by interrupted runs and may not have been sent, '
+                f'--reclaim-after sends them again'
+            )
+
+    def reclaim(self, events, before):
+        """
+        Release the reminders of the events claimed before the date and never confirmed as sent.
+
+        The run which claimed them crashed, or may have sent them before it did: released,
+        they are claimed again like the others, at the risk of a second email.
+        """
+        released, _ = Reminder.objects.filter(
+            event__in=events, sent_at__isnull=True, created_at__lt=before,
+        ).delete()
+        if released:
+            self.stdout.write(f'Reclaimed {released} reminders of interrupted runs')
+
+    def claim_batches(self, event, chunk_size):
+        """
+        Yield the not yet reminded attendees of the event in chunks, logging them as claimed by this run.
+        """
+        reminded = Reminder.objects.filter(event=event, user=OuterRef('user'))
+        attendees = Attendance.objects.filter(event=event).exclude(user__email='').filter(~Exists(reminded))
+        last_user_id = 0
+        while True:
+            # keyset on the (event, user) unique index
+            chunk = list(
+                attendees.filter(user_id__gt=last_user_id).order_by('user_id').values_list(
+                    'user_id', 'user__username', 'user__email'
+                )[:chunk_size]
+            )
+            if not chunk:
+                return
+            last_user_id = chunk[-1][0]
+            Reminder.objects.bulk_create(
+                [Reminder(event=event, user_id=user_id, run_id=self.run_id) for user_id, _, _ in chunk],
+                ignore_conflicts=True,
+            )
+            # a concurrent run may have claimed some of them first
+            claimed = set(Reminder.objects.filter(
+                event=event, user_id__in=[user_id for user_id, _, _ in chunk], run_id=self.run_id
+            ).values_list('user_id', flat=True))
+            batch = [row for row in chunk if row[0] in claimed]
+            if batch:
+                yield batch
+
+    def send_batch(self, event, batch):
+        messages = [
+            EmailMessage(
+                f'Reminder: {event.name} on {event.date}',
+                f'Hi {username},\n\nsee you at {event.name}, on {event.date} at {event.venue}.',
+                to=[email],
+            ) for _, username, email in batch
+        ]
+        user_ids = [user_id for user_id, _, _ in batch]
+        reminders = Reminder.objects.filter(event=event, user_id__in=user_ids, run_id=self.run_id)
+        try:
+            send_emails(messages)
+        except Exception as e:
+            # not sent: release them for the next run
+            reminders.delete()
+            return 0, len(batch), str(e)
+        else:
+            reminders.update(sent_at=timezone.now())
+            return len(batch), 0, None
+        finally:
+            connection.close()
+
+    def collect(self, futures):
+        for future in futures:
+            sent, failed, error = future.result()
+            self.sent += sent
+            self.failed += failed
+            if error:
+                self.stderr.write(f'Failed to send {failed} reminders: {error}')
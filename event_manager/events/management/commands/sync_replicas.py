@@ -0,0 +1,29 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the SQLite database to the SQLite read replicas of EVENTS_READ_REPLICAS, to run replicas locally. '
+        'Run it periodically: between two runs the replicas lag behind like real ones.'
+    )
+
+    def handle(self, *args, **options):
+        replicas = getattr(settings, 'EVENTS_READ_REPLICAS', [])
+        if not replicas:
+            raise CommandError('No read replica configured, see DB_REPLICAS')
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite' or any(connections[alias].vendor != 'sqlite' for alias in replicas):
+            raise CommandError('Only SQLite replicas can be copied, replicate PostgreSQL with its own tools')
+
+        primary.ensure_connection()
+        for alias in replicas:
+            start = time.monotonic()
+            replica = connections[alias]
+            replica.ensure_connection()
+            # the online backup API copies a consistent snapshot of the primary
+            primary.connection.backup(replica.connection)
+            self.stdout.write(f'Copied to {alias} in {time.monotonic() - start:.2f}s')
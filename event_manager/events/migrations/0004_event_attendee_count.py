@@ -0,0 +1,31 @@
+# Generated by Django 3.1.1 on 2026-10-18 19:00
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_attendee_count(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+    attendees = Event.attendees.through.objects.filter(
+        event=OuterRef('pk')
+    ).order_by().values('event').annotate(count=Count('pk')).values('count')
+    Event.objects.using(schema_editor.connection.alias).update(
+        attendee_count=Coalesce(Subquery(attendees), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0003_auto_20200907_1042'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='attendee_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_attendee_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 3.1.1 on 2026-10-18 19:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('events', '0004_event_attendee_count'),
+    ]
+
+    operations = [
+        # Attendance takes over the table of the implicit many-to-many relation
+        # as it is, including its unique (event_id, user_id) index.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='Attendance',
+                    fields=[
+                        ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='events.event')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'events_event_attendees',
+                        'unique_together': {('event', 'user')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='event',
+                    name='attendees',
+                    field=models.ManyToManyField(blank=True, related_name='attendees_set', through='events.Attendance', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        # swap the anonymous unique index for a named constraint
+        migrations.AlterUniqueTogether(
+            name='attendance',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='attendance',
+            constraint=models.UniqueConstraint(fields=('event', 'user'), name='unique_attendance'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['user', 'event'], name='attendance_user_event_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['date', 'id'], name='event_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['organizer', 'date'], name='event_organizer_date_idx'),
+        ),
+    ]
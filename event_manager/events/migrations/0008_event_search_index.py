@@ -0,0 +1,46 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE events_event_fts USING fts5("
+            "name, description, venue, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        schema_editor.execute(
+            'INSERT INTO events_event_fts (rowid, name, description, venue) '
+            'SELECT id, name, description, venue FROM events_event'
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE TABLE events_event_search ('
+            'event_id integer PRIMARY KEY REFERENCES events_event (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            'document tsvector NOT NULL)'
+        )
+        schema_editor.execute('CREATE INDEX events_event_search_document_idx ON events_event_search USING GIN (document)')
+        schema_editor.execute(
+            'INSERT INTO events_event_search (event_id, document) '
+            "SELECT id, setweight(to_tsvector('simple', name), 'A') || "
+            "setweight(to_tsvector('simple', venue), 'B') || "
+            "setweight(to_tsvector('simple', description), 'C') FROM events_event"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE events_event_fts')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP TABLE events_event_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0007_waitlistentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
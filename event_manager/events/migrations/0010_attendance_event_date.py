@@ -0,0 +1,36 @@
+# Generated by Django 3.1.1 on 2026-10-18 20:03
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_event_dates(apps, schema_editor):
+    Attendance = apps.get_model('events', 'Attendance')
+    Event = apps.get_model('events', 'Event')
+    dates = Event.objects.filter(pk=OuterRef('event_id')).values('date')[:1]
+    Attendance.objects.using(schema_editor.connection.alias).update(event_date=Subquery(dates))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0009_reminder'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='attendance',
+            name='attendance_user_event_idx',
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='event_date',
+            field=models.DateField(editable=False, null=True),
+        ),
+        # before the index is built
+        migrations.RunPython(copy_event_dates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['user', 'event_date', 'event'], name='attendance_user_date_idx'),
+        ),
+    ]
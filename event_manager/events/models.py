@@ -1,29 +1,339 @@
-from django.db import models
+import calendar
+from datetime import date, timedelta
+
+from django.db import models, router, transaction
+from django.db.models import BooleanField, Count, Exists, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.urls import reverse
+from django.utils import timezone
+
+
+def earliest_event_date():
+    """
+    Events can only be scheduled from tomorrow onwards.
+    """
+    return date.today() + timedelta(days=1)
+
+
+class EventQuerySet(models.QuerySet):
+    def refresh_attendee_count(self):
+        """
+        Recompute the denormalized attendee counter from the attendees table
+        in a single UPDATE statement.
+        """
+        attendees = Attendance.objects.filter(
+            event=OuterRef('pk')
+        ).order_by().values('event').annotate(count=Count('pk')).values('count')
+        return self.update(attendee_count=Coalesce(Subquery(attendees), 0), updated_at=timezone.now())
+
+    def for_user(self, user):
+        """
+        Fetch the organizer along with each event and annotate whether the user attends it,
+        so that rendering a list of events does not query per row.
+        """
+        events = self.select_related('organizer')
+        if not user.is_authenticated:
+            return events.annotate(is_attending=Value(False, output_field=BooleanField()))
+        attendance = Attendance.objects.filter(event=OuterRef('pk'), user=user)
+        return events.annotate(is_attending=Exists(attendance))
+
+
+class EventChangeCounter(models.Model):
+    """
+    The last change sequence number handed out to events, in a single row.
+    """
+    value = models.BigIntegerField(default=0)
+
+    @classmethod
+    def next(cls, using='default'):
+        """
+        Increment and return the counter, which must be done in a transaction.
+
+        The row stays locked until the transaction commits, so changes commit in
+        the order of their sequence numbers and a reader who has seen number n
+        has seen all the changes up to n.
+        """
+        counter = cls.objects.using(using).filter(pk=1)
+        if not counter.update(value=F('value') + 1):
+            # the row is created on first use
+            cls.objects.using(using).get_or_create(pk=1)
+            counter.update(value=F('value') + 1)
+        return counter.values_list('value', flat=True).get()
+
+    @classmethod
+    def current(cls, using='default'):
+        return cls.objects.using(using).filter(pk=1).values_list('value', flat=True).first() or 0
+
+
+def add_months(day, months):
+    """
+    The same day months later, or the last day of that month when it is shorter.
+    """
+    year, month = divmod(day.month - 1 + months, 12)
+    year += day.year
+    return day.replace(year=year, month=month + 1, day=min(day.day, calendar.monthrange(year, month + 1)[1]))
+
+
+class EventSeries(models.Model):
+    """
+    Handle recurring events, whose occurrences are created as events ahead of time by events.series.
+    """
+    WEEKLY = 'weekly'
+    MONTHLY = 'monthly'
+    FREQUENCIES = [(WEEKLY, 'Weekly'), (MONTHLY, 'Monthly')]
+
+    # copied to the occurrences
+    name = models.CharField(max_length=50)
+    description = models.TextField(max_length=200, blank=True)
+    venue = models.TextField(max_length=100)
+    capacity = models.PositiveIntegerField(default=20, validators=[MinValueValidator(1), MaxValueValidator(100)])
+    organizer = models.ForeignKey(User, on_delete=models.CASCADE)
+    frequency = models.CharField(max_length=10, choices=FREQUENCIES)
+    # every interval weeks or months
+    interval = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1), MaxValueValidator(12)])
+    start_date = models.DateField()
+    # the series ends on this date or after count occurrences, or never
+    until = models.DateField(null=True, blank=True)
+    count = models.PositiveIntegerField(null=True, blank=True, validators=[MinValueValidator(1)])
+    # the number of occurrences created so far, which is the index of the next one
+    materialized_count = models.PositiveIntegerField(default=0, editable=False)
+    # the date of the next occurrence to create, null once the series ended
+    next_date = models.DateField(null=True, editable=False)
+
+    class Meta:
+        verbose_name_plural = 'event series'
+        indexes = [
+            models.Index(fields=['next_date'], name='series_next_date_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    def occurrence_date(self, index):
+        """
+        The date of the occurrence at index, counted from the start date to not drift on short months.
+        """
+        if self.frequency == self.WEEKLY:
+            return self.start_date + timedelta(weeks=index * self.interval)
+        return add_months(self.start_date, index * self.interval)
+
+    def scheduled_date(self, index):
+        """
+        The date of the occurrence at index, or None past the end of the series.
+        """
+        if self.count is not None and index >= self.count:
+            return None
+        day = self.occurrence_date(index)
+        if self.until is not None and day > self.until:
+            return None
+        return day
 
 
 class Event(models.Model):
     """
     Handle event objects.
     """
+    # the fields exported to calendars, whose changes take a new change_seq
+    calendar_fields = ('name', 'description', 'date', 'venue')
+
     name = models.CharField(max_length=50)
     description = models.TextField(max_length=200, blank=True)
     date = models.DateField()
     venue = models.TextField(max_length=100)
     organizer = models.ForeignKey(User, on_delete=models.CASCADE)
-    attendees = models.ManyToManyField(User, related_name='attendees_set', blank=True)
+    attendees = models.ManyToManyField(User, through='Attendance', related_name='attendees_set', blank=True)
     capacity = models.PositiveIntegerField(default=20, validators=[MinValueValidator(1), MaxValueValidator(100)])
+    # kept in sync by events.signals through the attendees relation (add, remove, set, clear) and by
+    # events.services; writes straight to Attendance (create, bulk_create, queryset delete) leave it
+    # stale until refresh_attendee_count() or the rebuild_attendee_counts command runs
+    attendee_count = models.PositiveIntegerField(default=0, editable=False)
+    # also bumped by the queryset updates of attendee_count
+    updated_at = models.DateTimeField(auto_now=True)
+    # from EventChangeCounter on every save changing calendar_fields, for incremental calendar syncs
+    change_seq = models.BigIntegerField(default=0, editable=False)
+    series = models.ForeignKey(
+        EventSeries, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='occurrences',
+    )
+
+    objects = EventQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # event lists are ordered and paginated on (date, id)
+            models.Index(fields=['date', 'id'], name='event_date_id_idx'),
+            models.Index(fields=['organizer', 'date'], name='event_organizer_date_idx'),
+            models.Index(fields=['organizer', 'change_seq'], name='event_organizer_change_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and not self._state.adding and not kwargs.get('force_insert'):
+            # attendee_count is only written by queryset updates: the value loaded with
+            # the instance may be stale and would undo the registrations committed since
+            kwargs['update_fields'] = update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'attendee_count' and field.attname in self.__dict__
+            ]
+        # as loaded or last saved, none for a new event
+        saved = self.__dict__.get('_saved_calendar_values', {})
+        changed = [
+            name for name in (self.calendar_fields if update_fields is None else update_fields)
+            if name in self.calendar_fields and (name not in saved or saved[name] != getattr(self, name))
+        ]
+        if not changed:
+            super().save(*args, **kwargs)
+        else:
+            using = kwargs.get('using') or router.db_for_write(Event, instance=self)
+            with transaction.atomic(using=using):
+                # first, see EventChangeCounter.next
+                self.change_seq = EventChangeCounter.next(using)
+                if update_fields is not None:
+                    kwargs['update_fields'] = [*update_fields, 'change_seq']
+                super().save(*args, **kwargs)
+        self.remember_calendar_values(self.calendar_fields)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_calendar_values(cls.calendar_fields)
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using, fields)
+        self.remember_calendar_values(self.calendar_fields if fields is None else fields)
+
+    def remember_calendar_values(self, fields):
+        """
+        Keep the values of the calendar fields as in the database, so that save() only takes
+        a new change_seq when one of them changed. The deferred fields are left out.
+        """
+        saved = self.__dict__.setdefault('_saved_calendar_values', {})
+        saved.update({
+            name: self.__dict__[name] for name in fields if name in self.calendar_fields and name in self.__dict__
+        })
+
     @property
     def is_fully_booked(self):
-        if len(self.attendees.all()) < self.capacity:
-            return False
-        return True
+        return self.attendee_count >= self.capacity
+
+    @property
+    def seats_left(self):
+        return max(0, self.capacity - self.attendee_count)
+
+    def get_absolute_url(self):
+        return reverse('event-detail', kwargs={'pk': self.pk})
+
+
+class EventTombstone(models.Model):
+    """
+    Handle the record of a deleted event, for the incremental syncs of calendars.
+    """
+    event_id = models.IntegerField()
+    # not a foreign key: deleting the organizer deletes their events first
+    organizer_id = models.IntegerField()
+    change_seq = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['organizer_id', 'change_seq'], name='tombstone_organizer_change_idx'),
+        ]
+
+
+class Attendance(models.Model):
+    """
+    Handle the registration of a user to an event.
+    """
+    event = models.ForeignKey(Event, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # copied from the event by events.signals, to list the events of a user by date from this table alone
+    event_date = models.DateField(null=True, editable=False)
+
+    class Meta:
+        # the table created for the former implicit many-to-many relation
+        db_table = 'events_event_attendees'
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'user'], name='unique_attendance'),
+        ]
+        indexes = [
+            # also serves the lookups of the events of a user
+            models.Index(fields=['user', 'event_date', 'event'], name='attendance_user_date_idx'),
+        ]
+
+
+class WaitlistEntry(models.Model):
+    """
+    Handle a user queued for a seat at a fully booked event, served in ``id`` order.
+    """
+    event = models.ForeignKey(Event, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'user'], name='unique_waitlist_entry'),
+        ]
+        indexes = [
+            # the head of the queue and the positions are read on (event, id)
+            models.Index(fields=['event', 'id'], name='waitlist_event_id_idx'),
+        ]
+
+
+class Reminder(models.Model):
+    """
+    Handle the reminder of an event sent to an attendee.
+
+    Logged before the email is sent, so that reminders go out at most once
+    even when a ``send_reminders`` run crashes and is started again.
+    """
+    event = models.ForeignKey(Event, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # the send_reminders run which claimed the reminder
+    run_id = models.CharField(max_length=32)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'user'], name='unique_reminder'),
+        ]
+
+
+class ArchivedEvent(models.Model):
+    """
+    Handle a past event moved out of the event table by ``archive_events``, under its former id.
+    """
+    id = models.IntegerField(primary_key=True)
+    name = models.CharField(max_length=50)
+    description = models.TextField(max_length=200, blank=True)
+    date = models.DateField()
+    venue = models.TextField(max_length=100)
+    organizer = models.ForeignKey(User, on_delete=models.CASCADE)
+    capacity = models.PositiveIntegerField()
+    attendee_count = models.PositiveIntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
 
     def get_absolute_url(self):
         return reverse('event-detail', kwargs={'pk': self.pk})
+
+
+class ArchivedAttendance(models.Model):
+    """
+    Handle the registration of a user to an archived event.
+    """
+    event = models.ForeignKey(ArchivedEvent, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    event_date = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'user'], name='unique_archived_attendance'),
+        ]
@@ -0,0 +1,161 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from functools import reduce
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from django.http import Http404
+
+
+def get_page_size(request, default, maximum):
+    """
+    Read the ``page_size`` query parameter, falling back to default and capped at maximum.
+    """
+    try:
+        page_size = int(request.GET.get('page_size', default))
+    except ValueError:
+        page_size = default
+    return max(1, min(page_size, maximum))
+
+
+class KeysetPage:
+    """
+    One page of a KeysetPaginator, exposing the parts of Django's Page used by templates.
+    """
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return self.paginator.encode_cursor(self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return self.paginator.encode_cursor(self.object_list[0])
+        return None
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset, of instances or of ``values()`` dicts, on a unique key
+    such as ``('date', 'pk')``, whose fields are prefixed with ``-`` when descending.
+
+    Pages are addressed by an opaque cursor holding the key of the row they start
+    after (or end before), so every page is a single indexed range scan no matter
+    how deep it is.
+    """
+    def __init__(self, queryset, per_page, keys):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.keys = tuple(keys)
+
+    @property
+    def fields(self):
+        return [key.lstrip('-') for key in self.keys]
+
+    def encode_cursor(self, obj):
+        values = []
+        for key in self.fields:
+            value = obj
+            for attr in key.split('__'):
+                value = value[attr] if isinstance(value, dict) else getattr(value, attr)
+            values.append(str(value))
+        return urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            values = json.loads(urlsafe_b64decode(cursor.encode() + b'=' * (-len(cursor) % 4)))
+        except (BinasciiError, UnicodeError, ValueError):
+            raise InvalidPage('Invalid cursor')
+        if not isinstance(values, list) or len(values) != len(self.keys):
+            raise InvalidPage('Invalid cursor')
+        return values
+
+    def seek(self, queryset, cursor, lookup):
+        # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y), with < for descending fields
+        values = self.decode_cursor(cursor)
+        flipped = {'gt': 'lt', 'lt': 'gt'}
+        fields = self.fields
+        conditions = [
+            Q(
+                **dict(zip(fields[:i], values[:i])),
+                **{f'{field}__{flipped[lookup] if key.startswith("-") else lookup}': values[i]},
+            )
+            for i, (key, field) in enumerate(zip(self.keys, fields))
+        ]
+        try:
+            return queryset.filter(reduce(Q.__or__, conditions))
+        except (ValidationError, ValueError):
+            raise InvalidPage('Invalid cursor')
+
+    def page(self, after=None, before=None):
+        if before:
+            reversed_keys = [key[1:] if key.startswith('-') else f'-{key}' for key in self.keys]
+            queryset = self.seek(self.queryset, before, 'lt').order_by(*reversed_keys)
+            rows = list(queryset[:self.per_page + 1])
+            has_previous = len(rows) > self.per_page
+            return KeysetPage(rows[:self.per_page][::-1], self, True, has_previous)
+
+        queryset = self.queryset.order_by(*self.keys)
+        if after:
+            queryset = self.seek(queryset, after, 'gt')
+        rows = list(queryset[:self.per_page + 1])
+        return KeysetPage(rows[:self.per_page], self, len(rows) > self.per_page, bool(after))
+
+
+class KeysetPaginationMixin:
+    """
+    ListView mixin replacing page numbers with ``after``/``before`` cursors and
+    letting clients choose the page size up to ``max_paginate_by``.
+    """
+    paginate_by = 20
+    max_paginate_by = 100
+    keyset = ('pk',)
+
+    def get_paginate_by(self, queryset):
+        return get_page_size(self.request, self.paginate_by, self.max_paginate_by)
+
+    def get_keyset(self):
+        return self.keyset
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size, self.get_keyset())
+        try:
+            page = paginator.page(after=self.request.GET.get('after'), before=self.request.GET.get('before'))
+        except InvalidPage as e:
+            raise Http404(str(e))
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        # current query string minus the cursor, for building the page links
+        query = self.request.GET.copy()
+        query.pop('after', None)
+        query.pop('before', None)
+        kwargs.setdefault('page_query', query.urlencode())
+        return super().get_context_data(**kwargs)
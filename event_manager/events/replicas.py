@@ -0,0 +1,116 @@
+"""
+Routing of the reads of the event pages to the read replicas of ``EVENTS_READ_REPLICAS``.
+
+Views opt in with ``read_from_replica``. ReplicaMiddleware then picks a replica
+for the request, and ReplicaRouter sends the reads of the models of the events
+app there, including those run while rendering the template, while sessions and
+users are always read from the primary. Writes always go to the primary.
+
+A replica may lag behind the primary, so a user who just wrote must not read from
+it: unsafe requests (POST, ...) set a cookie keeping that user's requests on the
+primary for ``EVENTS_REPLICA_PIN_SECONDS``.
+"""
+import asyncio
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'pin_primary'
+REPLICATED_APPS = {'events'}
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+class Routing:
+    """
+    The database alias the current request reads from, None for the primary.
+    """
+    alias = None
+
+
+# a mutable holder, as process_view may run in a copy of the request's context under ASGI
+current = ContextVar('events_db_routing', default=None)
+
+
+def get_replicas():
+    return getattr(settings, 'EVENTS_READ_REPLICAS', [])
+
+
+def read_from_replica(view):
+    """
+    Let the view, a function or a class-based view, read from a replica.
+    """
+    view.read_from_replica = True
+    return view
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = current.get()
+        if routing is not None and routing.alias and model._meta.app_label in REPLICATED_APPS:
+            return routing.alias
+        # the primary even for the related objects of an instance read from a replica
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas are copies of the primary
+        if db in get_replicas():
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    # see MetricsMiddleware
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not get_replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.pin_seconds = getattr(settings, 'EVENTS_REPLICA_PIN_SECONDS', 10)
+        if asyncio.iscoroutinefunction(self.get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        token = current.set(Routing())
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        token = current.set(Routing())
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.pin(request, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'view_class', None) or view_func
+        routing = current.get()
+        if (
+            routing is not None and getattr(view, 'read_from_replica', False)
+            and request.method in SAFE_METHODS and PIN_COOKIE not in request.COOKIES
+        ):
+            routing.alias = random.choice(get_replicas())
+
+    def pin(self, request, response):
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(PIN_COOKIE, '1', max_age=self.pin_seconds, httponly=True, samesite='Lax')
+        return response
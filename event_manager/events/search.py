@@ -0,0 +1,186 @@
+"""
+Full-text search over the name, description and venue of events.
+
+The text of each event is copied into a search index maintained by the
+database itself: an FTS5 virtual table on SQLite, a ``tsvector`` table with a
+GIN index on PostgreSQL (both created by migration 0008). Signal receivers keep
+it in sync with every saved or deleted event, bulk writes call index() and the
+``rebuild_search_index`` command recreates it from scratch.
+
+Searching filters a queryset on the ids matched by the index and annotates it
+with ``search_rank``, lower being more relevant, so results can be ordered and
+paginated on ``('search_rank', 'id')``.
+"""
+import re
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.db.models import FloatField, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Event
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(query):
+    """
+    Split user input into words, dropping the operators of the query languages.
+    """
+    return TOKEN_RE.findall(query.lower())[:10]
+
+
+class SearchBackend:
+    """
+    Interface of the search indexes, bound to a database connection alias.
+    """
+    def __init__(self, using='default'):
+        self.using = using
+        quote_name = connections[using].ops.quote_name
+        # the indexed table and its primary key, as written in SQL
+        self.event_table = quote_name(Event._meta.db_table)
+        self.event_pk = f'{self.event_table}.{quote_name(Event._meta.pk.column)}'
+
+    def execute(self, sql, params=()):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
+
+    def index(self, event_ids):
+        """
+        Add or replace the indexed text of the events.
+        """
+        raise NotImplementedError
+
+    def remove(self, event_ids):
+        """
+        Drop the events from the index.
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def no_results(self, queryset):
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField())).none()
+
+    def search(self, queryset, query):
+        """
+        Filter the events matching all the words of the query, prefixes included,
+        and annotate them with ``search_rank``.
+        """
+        raise NotImplementedError
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    table = 'events_event_fts'
+    # bm25 weights of name, description and venue
+    weights = (10.0, 1.0, 5.0)
+
+    def index(self, event_ids):
+        event_ids = list(event_ids)
+        if not event_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(event_ids))
+        # FTS5 tables have no unique constraint on rowid to upsert on
+        self.execute(f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', event_ids)
+        self.execute(
+            f'INSERT INTO {self.table} (rowid, name, description, venue) '
+            f'SELECT {self.event_pk}, name, description, venue FROM {self.event_table} '
+            f'WHERE {self.event_pk} IN ({placeholders})',
+            event_ids,
+        )
+
+    def remove(self, event_ids):
+        event_ids = list(event_ids)
+        if event_ids:
+            placeholders = ', '.join(['%s'] * len(event_ids))
+            self.execute(f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', event_ids)
+
+    def clear(self):
+        self.execute(f'DELETE FROM {self.table}')
+
+    def search(self, queryset, query):
+        words = tokenize(query)
+        if not words:
+            return self.no_results(queryset)
+        match = ' '.join(f'"{word}"*' for word in words)
+        weights = ', '.join(str(weight) for weight in self.weights)
+        matches = RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', [match])
+        rank = RawSQL(
+            f'SELECT bm25({self.table}, {weights}) FROM {self.table} '
+            f'WHERE {self.table} MATCH %s AND rowid = {self.event_pk}',
+            [match],
+            output_field=FloatField(),
+        )
+        return queryset.filter(pk__in=matches).annotate(search_rank=rank)
+
+
+class PostgresBackend(SearchBackend):
+    table = 'events_event_search'
+    config = 'simple'
+    document = (
+        "setweight(to_tsvector(%(config)s, name), 'A') || "
+        "setweight(to_tsvector(%(config)s, venue), 'B') || "
+        "setweight(to_tsvector(%(config)s, description), 'C')"
+    )
+
+    def index(self, event_ids):
+        event_ids = list(event_ids)
+        if not event_ids:
+            return
+        document = self.document % {'config': f"'{self.config}'"}
+        self.execute(
+            f'INSERT INTO {self.table} (event_id, document) '
+            f'SELECT {self.event_pk}, {document} FROM {self.event_table} WHERE {self.event_pk} = ANY(%s) '
+            f'ON CONFLICT (event_id) DO UPDATE SET document = EXCLUDED.document',
+            [event_ids],
+        )
+
+    def remove(self, event_ids):
+        event_ids = list(event_ids)
+        if event_ids:
+            self.execute(f'DELETE FROM {self.table} WHERE event_id = ANY(%s)', [event_ids])
+
+    def clear(self):
+        self.execute(f'TRUNCATE {self.table}')
+
+    def search(self, queryset, query):
+        words = tokenize(query)
+        if not words:
+            return self.no_results(queryset)
+        match = ' & '.join(f'{word}:*' for word in words)
+        tsquery = f"to_tsquery('{self.config}', %s)"
+        matches = RawSQL(f'SELECT event_id FROM {self.table} WHERE document @@ {tsquery}', [match])
+        # negated so that, as with bm25, lower ranks come first
+        rank = RawSQL(
+            f'SELECT -ts_rank_cd(document, {tsquery}) FROM {self.table} WHERE event_id = {self.event_pk}',
+            [match],
+            output_field=FloatField(),
+        )
+        return queryset.filter(pk__in=matches).annotate(search_rank=rank)
+
+
+BACKENDS = {
+    'sqlite': SQLiteFTS5Backend,
+    'postgresql': PostgresBackend,
+}
+
+
+def get_backend(using='default'):
+    """
+    Return the backend of ``EVENTS_SEARCH_BACKEND`` or, by default, the one of the database vendor.
+    """
+    path = getattr(settings, 'EVENTS_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)(using)
+    vendor = connections[using].vendor
+    if vendor not in BACKENDS:
+        raise ImproperlyConfigured(f'No event search backend for the {vendor} database')
+    return BACKENDS[vendor](using)
+
+
+def search_events(queryset, query):
+    return get_backend(queryset.db).search(queryset, query)
@@ -0,0 +1,148 @@
+"""
+Recurring events: the occurrences of each series are created as plain events,
+only as far ahead as a rolling window of ``EVENTS_SERIES_WINDOW_DAYS`` days.
+
+A series remembers the date of its next occurrence, so materialize() finds the
+due series on an index and creates their occurrences with one bulk INSERT.
+It runs when a series is created and then daily with the ``materialize_series``
+command, which moves the window forward. A series without an end never has
+more than a window of events, and end_series() ends any series on a date.
+
+Changes of a series apply to its later occurrences with a single UPDATE of the
+events, and to the occurrences created afterwards through the series itself.
+"""
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import invalidate_events
+from .db import bulk_create_with_pks
+from .live import publish_seats
+from .models import Event, EventChangeCounter, EventSeries, WaitlistEntry
+from .search import get_backend
+from .services import promote_waitlist
+
+WINDOW_DAYS = getattr(settings, 'EVENTS_SERIES_WINDOW_DAYS', 90)
+# the fields of the occurrences copied from their series
+SERIES_FIELDS = ['name', 'description', 'venue', 'capacity']
+
+
+def window_end():
+    return date.today() + timedelta(days=WINDOW_DAYS)
+
+
+def start_series(series):
+    """
+    Save the new series and create its first occurrences, returning them.
+    """
+    series.next_date = series.scheduled_date(0)
+    series.save()
+    # the first occurrence even when it is further ahead than the window
+    return materialize([series.pk], max(window_end(), series.start_date))
+
+
+def materialize(series_ids=None, until=None):
+    """
+    Create the occurrences of the series, all by default, up to the end of the
+    window or the until date, returning the new events.
+
+    Occurrences whose date passed before they were created are skipped.
+    """
+    until = until or window_end()
+    due = EventSeries.objects.filter(next_date__lte=until).order_by('pk')
+    if series_ids is not None:
+        due = due.filter(pk__in=series_ids)
+    if not due.exists():
+        return []
+
+    today = date.today()
+    with transaction.atomic():
+        # first, see EventChangeCounter.next: it also runs concurrent materializations one after the other,
+        # so the series are read after the previous one committed
+        change_seq = EventChangeCounter.next()
+        series_list = list(due)
+        events = []
+        for series in series_list:
+            index, day = series.materialized_count, series.next_date
+            while day is not None and day <= until:
+                if day > today:
+                    events.append(Event(
+                        **{field: getattr(series, field) for field in SERIES_FIELDS},
+                        date=day, organizer_id=series.organizer_id, series=series, change_seq=change_seq,
+                    ))
+                index += 1
+                day = series.scheduled_date(index)
+            series.materialized_count, series.next_date = index, day
+        EventSeries.objects.bulk_update(series_list, ['materialized_count', 'next_date'])
+        # the transaction holds the write lock since the counter update
+        bulk_create_with_pks(Event, events)
+        # bulk_create does not send post_save
+        get_backend().index(event.pk for event in events)
+    return events
+
+
+def end_series(series, until):
+    """
+    End the series on the date, see apply_end. Return the ids of the deleted events.
+    """
+    series.until = until
+    return apply_end(series)
+
+
+def apply_end(series):
+    """
+    Save the until date and count of the series: the occurrences already created
+    past its end are deleted, and the next one is scheduled again.
+
+    Return the ids of the deleted events.
+    """
+    deleted = []
+    with transaction.atomic():
+        # first: a concurrent materialization commits before the created occurrences are read
+        EventSeries.objects.filter(pk=series.pk).update(until=series.until, count=series.count)
+        created = EventSeries.objects.values_list('materialized_count', flat=True).get(pk=series.pk)
+        index = created
+        while index and series.scheduled_date(index - 1) is None:
+            index -= 1
+        series.materialized_count, series.next_date = index, series.scheduled_date(index)
+        EventSeries.objects.filter(pk=series.pk).update(materialized_count=index, next_date=series.next_date)
+        if index < created:
+            later = Event.objects.filter(series=series)
+            if index:
+                later = later.filter(date__gt=series.occurrence_date(index - 1))
+            deleted = list(later.values_list('pk', flat=True))
+            # with post_delete for every event, removing it from the caches, the index and the calendars
+            later.delete()
+    return deleted
+
+
+def update_occurrences(series, after, values):
+    """
+    Apply the values of SERIES_FIELDS to the series and to its occurrences
+    dated after the date, with a single UPDATE of the events.
+
+    Return {event id: attendee count} of the updated occurrences.
+    """
+    occurrences = Event.objects.filter(series=series, date__gt=after)
+    extra = {}
+    with transaction.atomic():
+        if set(values) & set(Event.calendar_fields):
+            # first, see EventChangeCounter.next: bulk updates bypass Event.save, the occurrences share one number
+            extra['change_seq'] = EventChangeCounter.next()
+        # else the series update is the first write
+        EventSeries.objects.filter(pk=series.pk).update(**values)
+        updated = dict(occurrences.values_list('pk', 'attendee_count'))
+        occurrences.update(**values, **extra, updated_at=timezone.now())
+        if set(values) & {'name', 'description', 'venue'}:
+            get_backend().index(updated)
+        invalidate_events(updated)
+        if 'capacity' in values:
+            publish_seats(updated)
+
+    if 'capacity' in values:
+        # promote_waitlist checks the free seats itself, a lower capacity promotes nobody
+        for event in occurrences.filter(pk__in=WaitlistEntry.objects.values('event_id')):
+            promote_waitlist(event)
+    return updated
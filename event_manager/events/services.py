@@ -0,0 +1,266 @@
+from enum import Enum
+from uuid import uuid4
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Subquery
+from django.utils import timezone
+
+from jobs.queue import enqueue, enqueue_many
+
+from .cache import invalidate_event, invalidate_events, invalidate_registrations
+from .live import publish_seats
+from .models import Attendance, Event, WaitlistEntry
+
+
+class RegistrationResult(Enum):
+    REGISTERED = 'registered'
+    ALREADY_REGISTERED = 'already_registered'
+    FULL = 'full'
+    # batch registrations only
+    INVALID = 'invalid'
+    UNKNOWN_EVENT = 'unknown_event'
+    UNKNOWN_USER = 'unknown_user'
+    FORBIDDEN = 'forbidden'
+    ROLLED_BACK = 'rolled_back'
+
+
+SUCCESSFUL = (RegistrationResult.REGISTERED, RegistrationResult.ALREADY_REGISTERED)
+
+
+def register_attendee(event, user):
+    """
+    Reserve a seat at the event for the user without ever exceeding its capacity.
+
+    The seat is taken with a conditional UPDATE on the attendee counter, which is the
+    first statement of the transaction so the database serializes concurrent
+    registrations on it (on SQLite this also acquires the write lock before any read).
+    """
+    try:
+        with transaction.atomic():
+            reserved = Event.objects.filter(
+                pk=event.pk, attendee_count__lt=F('capacity')
+            ).exclude(attendees=user).update(attendee_count=F('attendee_count') + 1, updated_at=timezone.now())
+            if reserved:
+                attendance = Attendance.objects.create(event_id=event.pk, user_id=user.pk, event_date=event.date)
+                enqueue(
+                    'events.registered',
+                    {'event_id': event.pk, 'user_id': user.pk},
+                    key=f'events.registered:{attendance.pk}',
+                )
+    except IntegrityError:
+        # lost a race against a concurrent registration of the same user
+        return RegistrationResult.ALREADY_REGISTERED
+
+    if reserved:
+        event.attendee_count += 1
+        return RegistrationResult.REGISTERED
+    if Attendance.objects.filter(event_id=event.pk, user_id=user.pk).exists():
+        return RegistrationResult.ALREADY_REGISTERED
+    return RegistrationResult.FULL
+
+
+def lock_events(event_ids):
+    """
+    Lock the events until the end of the transaction, which must start with this
+    call, and return {pk: (free seats, date)}.
+    """
+    events = Event.objects.filter(pk__in=event_ids).order_by('pk')
+    if connection.features.has_select_for_update:
+        # in pk order, so that batches sharing events do not deadlock
+        events = events.select_for_update()
+    else:
+        # SQLite locks the whole database on the first write instead
+        events.update(attendee_count=F('attendee_count'))
+    return {
+        pk: (capacity - attendee_count, event_date)
+        for pk, capacity, attendee_count, event_date in events.values_list('pk', 'capacity', 'attendee_count', 'date')
+    }
+
+
+def register_attendees(pairs, all_or_nothing=False):
+    """
+    Register the (event id, user id) pairs and return a RegistrationResult for each of them.
+
+    The events are locked for the whole batch, so the seats of all its pairs are
+    checked against the capacities at once: pairs are seated in order while seats
+    last, the next ones are FULL. With all_or_nothing, a single pair that cannot be
+    registered leaves the others ROLLED_BACK. The batch costs the same handful
+    of queries whatever its size: the attendances are written with a bulk insert
+    and the counters with a single UPDATE.
+    """
+    pairs = list(pairs)
+    if not pairs:
+        return []
+    event_ids = {event_id for event_id, _ in pairs}
+    results = []
+    seated = []
+    with transaction.atomic():
+        events = lock_events(event_ids)
+        attending = set(Attendance.objects.filter(
+            event_id__in=event_ids, user_id__in={user_id for _, user_id in pairs}
+        ).values_list('event_id', 'user_id'))
+        free = {pk: seats for pk, (seats, _) in events.items()}
+        for pair in pairs:
+            if pair[0] not in events:
+                results.append(RegistrationResult.UNKNOWN_EVENT)
+            elif pair in attending:
+                results.append(RegistrationResult.ALREADY_REGISTERED)
+            elif free[pair[0]] <= 0:
+                results.append(RegistrationResult.FULL)
+            else:
+                free[pair[0]] -= 1
+                attending.add(pair)
+                seated.append(pair)
+                results.append(RegistrationResult.REGISTERED)
+        if all_or_nothing and any(result not in SUCCESSFUL for result in results):
+            return [RegistrationResult.ROLLED_BACK if result is RegistrationResult.REGISTERED else result
+                    for result in results]
+
+        if seated:
+            # the events are locked and the pairs checked, ignoring conflicts is only a safety net
+            Attendance.objects.bulk_create([
+                Attendance(event_id=event_id, user_id=user_id, event_date=events[event_id][1])
+                for event_id, user_id in seated
+            ], ignore_conflicts=True)
+            Event.objects.filter(pk__in={event_id for event_id, _ in seated}).refresh_attendee_count()
+            batch = uuid4().hex
+            enqueue_many('events.registered', [
+                ({'event_id': event_id, 'user_id': user_id}, f'events.registered:{batch}:{event_id}:{user_id}')
+                for event_id, user_id in seated
+            ])
+
+    # bulk_create does not send m2m_changed
+    invalidate_events(event_id for event_id, _ in seated)
+    invalidate_registrations(user_id for _, user_id in seated)
+    publish_seats(event_id for event_id, _ in seated)
+    return results
+
+
+def unregister_attendee(event, user):
+    """
+    Give up the seat of the user at the event and hand it over to the waitlist.
+
+    Return whether the user was attending the event.
+    """
+    with transaction.atomic():
+        # decrement first, see register_attendee
+        released = Event.objects.filter(
+            pk=event.pk, attendees=user
+        ).update(attendee_count=F('attendee_count') - 1, updated_at=timezone.now())
+        if released:
+            attendance = Attendance.objects.filter(event_id=event.pk, user_id=user.pk)
+            attendance_pk = attendance.values_list('pk', flat=True).get()
+            attendance.delete()
+            enqueue(
+                'events.unregistered',
+                {'event_id': event.pk, 'user_id': user.pk},
+                key=f'events.unregistered:{attendance_pk}',
+            )
+
+    if released:
+        event.attendee_count -= 1
+        promote_waitlist(event)
+    return bool(released)
+
+
+def waitlist_position(event, user):
+    """
+    Return the 1-based position of the user in the waitlist of the event, or None.
+
+    Counted in a single query on the (event, id) index.
+    """
+    entry = WaitlistEntry.objects.filter(event_id=event.pk, user_id=user.pk).values('pk')
+    position = WaitlistEntry.objects.filter(event_id=event.pk, pk__lte=Subquery(entry)).count()
+    return position or None
+
+
+def join_waitlist(event, user):
+    """
+    Queue the user for a seat at the event and return their waitlist position.
+
+    None is returned when the user attends the event, including when a seat was
+    free and they got it right away.
+    """
+    if Attendance.objects.filter(event_id=event.pk, user_id=user.pk).exists():
+        return None
+    try:
+        with transaction.atomic():
+            WaitlistEntry.objects.create(event_id=event.pk, user_id=user.pk)
+    except IntegrityError:
+        # already waiting
+        pass
+    promote_waitlist(event)
+    return waitlist_position(event, user)
+
+
+def leave_waitlist(event, user):
+    """
+    Remove the user from the waitlist of the event and return whether they were on it.
+    """
+    deleted, _ = WaitlistEntry.objects.filter(event_id=event.pk, user_id=user.pk).delete()
+    return bool(deleted)
+
+
+class WaitlistConflict(Exception):
+    """
+    The head of the waitlist changed while it was being promoted.
+    """
+
+
+def promote_waitlist(event, batch_size=100, max_attempts=5):
+    """
+    Move users from the head of the waitlist to the free seats of the event.
+
+    Each batch reads at most ``batch_size`` entries from the head of the queue,
+    then reserves their seats with a conditional UPDATE of the attendee counter,
+    deletes the entries and creates the attendances in one transaction. A batch
+    raced by a concurrent change of the queue is rolled back and read again.
+
+    Return the ids of the promoted users.
+    """
+    promoted = []
+    attempts = 0
+    while True:
+        free = Event.objects.filter(pk=event.pk).values_list(F('capacity') - F('attendee_count'), flat=True).first()
+        if not free or free <= 0:
+            break
+        head = list(
+            WaitlistEntry.objects.filter(event_id=event.pk).order_by('pk').values_list('pk', 'user_id')[:min(free, batch_size)]
+        )
+        if not head:
+            break
+        users = [user_id for _, user_id in head]
+        # users who registered directly in the meantime leave the queue without a seat
+        attending = set(Attendance.objects.filter(event_id=event.pk, user_id__in=users).values_list('user_id', flat=True))
+        seated = [user_id for user_id in users if user_id not in attending]
+        try:
+            with transaction.atomic():
+                reserved = Event.objects.filter(
+                    pk=event.pk, attendee_count__lte=F('capacity') - len(seated)
+                ).update(attendee_count=F('attendee_count') + len(seated), updated_at=timezone.now())
+                if not reserved:
+                    raise WaitlistConflict
+                deleted, _ = WaitlistEntry.objects.filter(pk__in=[pk for pk, _ in head]).delete()
+                if deleted != len(head):
+                    raise WaitlistConflict
+                Attendance.objects.bulk_create(
+                    Attendance(event_id=event.pk, user_id=user_id, event_date=event.date) for user_id in seated
+                )
+                enqueue_many('events.registered', [
+                    ({'event_id': event.pk, 'user_id': user_id}, f'events.promoted:{pk}')
+                    for pk, user_id in head if user_id not in attending
+                ])
+        except (WaitlistConflict, IntegrityError):
+            attempts += 1
+            if attempts >= max_attempts:
+                break
+            continue
+        promoted.extend(seated)
+
+    if promoted:
+        event.attendee_count += len(promoted)
+        # bulk_create does not send post_save
+        invalidate_event(event.pk)
+        invalidate_registrations(promoted)
+        publish_seats([event.pk])
+    return promoted
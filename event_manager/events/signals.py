@@ -0,0 +1,161 @@
+from django.contrib.auth.models import User
+from django.db.models import OuterRef, Subquery
+from django.db.models.signals import m2m_changed, pre_delete, pre_save, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import invalidate_event, invalidate_events, invalidate_registrations
+from .live import publish_seats
+from .models import Attendance, Event, EventChangeCounter, EventTombstone
+from .search import get_backend
+
+
+@receiver(m2m_changed, sender=Attendance)
+def update_attendee_count(sender, instance, action, reverse, pk_set, using, **kwargs):
+    """
+    Keep Event.attendee_count in sync on add/remove/clear, from either side of the relation.
+    """
+    if action == 'pre_clear' and reverse:
+        # the cleared events are gone by post_clear, remember them now
+        instance._cleared_event_ids = list(instance.attendees_set.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if action != 'post_clear' and not pk_set:
+        return
+
+    if not reverse:
+        event_ids = [instance.pk]
+    elif action == 'post_clear':
+        event_ids = instance.__dict__.pop('_cleared_event_ids', [])
+    else:
+        event_ids = pk_set
+    Event.objects.using(using).filter(pk__in=event_ids).refresh_attendee_count()
+    if not reverse:
+        instance.refresh_from_db(using=using, fields=['attendee_count'])
+    for event_id in event_ids:
+        invalidate_event(event_id)
+    publish_seats(event_ids, using)
+
+
+@receiver(m2m_changed, sender=Attendance)
+def update_registrations(sender, instance, action, reverse, pk_set, using, **kwargs):
+    """
+    Copy the event date to the attendances added through the relation and
+    invalidate the registrations of their users.
+    """
+    if action == 'pre_clear' and not reverse:
+        instance._cleared_user_ids = list(instance.attendees.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if reverse:
+        user_ids = [instance.pk]
+    elif action == 'post_clear':
+        user_ids = instance.__dict__.pop('_cleared_user_ids', [])
+    else:
+        user_ids = pk_set or []
+    if action == 'post_add' and pk_set:
+        if reverse:
+            added = Attendance.objects.using(using).filter(user_id=instance.pk, event_id__in=pk_set)
+        else:
+            added = Attendance.objects.using(using).filter(event_id=instance.pk, user_id__in=pk_set)
+        dates = Event.objects.using(using).filter(pk=OuterRef('event_id')).values('date')[:1]
+        added.filter(event_date__isnull=True).update(event_date=Subquery(dates))
+    invalidate_registrations(user_ids)
+
+
+@receiver(pre_save, sender=Attendance)
+def copy_event_date(sender, instance, using, **kwargs):
+    if instance.event_date is None:
+        instance.event_date = Event.objects.using(using).values_list('date', flat=True).get(pk=instance.event_id)
+
+
+@receiver(post_save, sender=Event)
+def update_attendance_dates(sender, instance, created, using, update_fields, **kwargs):
+    """
+    Follow a new date of the event in its attendances, invalidating the registrations of their users.
+    """
+    if created or (update_fields is not None and 'date' not in update_fields):
+        return
+    moved = Attendance.objects.using(using).filter(event_id=instance.pk).exclude(event_date=instance.date)
+    user_ids = list(moved.values_list('user_id', flat=True))
+    if user_ids:
+        moved.update(event_date=instance.date)
+        invalidate_registrations(user_ids)
+
+
+@receiver(pre_delete, sender=User)
+def remember_attended_events(sender, instance, using, **kwargs):
+    # deleting a user cascades to the attendees table without m2m_changed
+    instance._attended_event_ids = list(
+        Attendance.objects.using(using).filter(user=instance).values_list('event_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=User)
+def update_attended_events(sender, instance, using, **kwargs):
+    event_ids = instance.__dict__.pop('_attended_event_ids', [])
+    if event_ids:
+        Event.objects.using(using).filter(pk__in=event_ids).refresh_attendee_count()
+        publish_seats(event_ids, using)
+
+
+@receiver(pre_save, sender=User)
+def remember_username(sender, instance, update_fields, **kwargs):
+    if instance.pk is not None and (update_fields is None or 'username' in update_fields):
+        instance._saved_username = User.objects.filter(pk=instance.pk).values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def invalidate_organized_events(sender, instance, using, created, **kwargs):
+    """
+    Mark the events of a renamed organizer, which show their username, as updated: the ETags
+    of the API derive from updated_at, and their cached fragments are dropped.
+    """
+    saved = instance.__dict__.pop('_saved_username', None)
+    if not created and saved is not None and saved != instance.username:
+        events = Event.objects.using(using).filter(organizer=instance)
+        events.update(updated_at=timezone.now())
+        invalidate_events(events.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def invalidate_event_cache(sender, instance, **kwargs):
+    invalidate_event(instance.pk)
+
+
+@receiver(post_save, sender=Event)
+def index_event(sender, instance, using, update_fields, **kwargs):
+    if update_fields is None or {'name', 'description', 'venue'} & set(update_fields):
+        get_backend(using).index([instance.pk])
+
+
+@receiver(post_delete, sender=Event)
+def record_event_deletion(sender, instance, using, **kwargs):
+    # in the transaction of the delete, so the sequence number commits with it
+    EventTombstone.objects.using(using).create(
+        event_id=instance.pk, organizer_id=instance.organizer_id, change_seq=EventChangeCounter.next(using),
+    )
+
+
+@receiver(post_delete, sender=Event)
+def unindex_event(sender, instance, using, **kwargs):
+    get_backend(using).remove([instance.pk])
+
+
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+def invalidate_attendance_cache(sender, instance, **kwargs):
+    invalidate_event(instance.event_id)
+    invalidate_registrations([instance.user_id])
+
+
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+@receiver(post_save, sender=Event)
+def publish_event_seats(sender, instance, using, **kwargs):
+    # attendances come with the update of the counter of their event, events may change capacity
+    publish_seats([instance.pk if sender is Event else instance.event_id], using)
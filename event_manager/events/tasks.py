@@ -0,0 +1,107 @@
+"""
+Background jobs of the events app, run by the ``run_jobs`` worker.
+"""
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage, get_connection
+
+from jobs import queue
+from .models import Attendance, Event
+
+EMAIL_CHUNK_SIZE = 500
+
+
+def send_emails(messages):
+    """
+    Send the messages over a single connection to the mail server.
+    """
+    if messages:
+        with get_connection() as connection:
+            connection.send_messages(messages)
+
+
+def notify_users(jobs, subject, body):
+    """
+    Email the user of each job about its event, formatting subject and body with both.
+
+    The messages share a single connection to the mail server and each job is
+    marked done once its message is sent, so a failure does not send the
+    previous ones again when the batch is retried.
+    """
+    events = Event.objects.in_bulk({job.payload['event_id'] for job in jobs})
+    users = User.objects.in_bulk({job.payload['user_id'] for job in jobs})
+    messages = []
+    done = []
+    for job in jobs:
+        event = events.get(job.payload['event_id'])
+        user = users.get(job.payload['user_id'])
+        # the event or user may be gone, and not every user has an email
+        if event and user and user.email:
+            context = {'event': event, 'user': user}
+            messages.append((job, EmailMessage(subject.format(**context), body.format(**context), to=[user.email])))
+        else:
+            done.append(job)
+    try:
+        if messages:
+            with get_connection() as connection:
+                for job, message in messages:
+                    connection.send_messages([message])
+                    done.append(job)
+    finally:
+        queue.mark_done(done)
+
+
+@queue.register('events.registered', batch_size=100)
+def send_registration_confirmations(jobs):
+    notify_users(
+        jobs,
+        'You are attending {event.name}',
+        'Hi {user.username},\n\nyou are registered to {event.name}, on {event.date} at {event.venue}.',
+    )
+
+
+@queue.register('events.unregistered', batch_size=100)
+def send_unregistration_confirmations(jobs):
+    notify_users(
+        jobs,
+        'You are no longer attending {event.name}',
+        'Hi {user.username},\n\nyour registration to {event.name} is cancelled.',
+    )
+
+
+@queue.register('events.changed', batch_size=10)
+def notify_event_changes(jobs):
+    """
+    Email all the attendees of the changed events, streaming them in chunks.
+
+    The last attendance emailed is saved in the payload after each chunk, so a
+    retried job resumes after it.
+    """
+    events = Event.objects.in_bulk({job.payload['event_id'] for job in jobs})
+    for job in jobs:
+        event = events.get(job.payload['event_id'])
+        if event is None:
+            queue.mark_done([job])
+            continue
+        changes = '\n'.join(
+            f'- {field}: {old} -> {new}' for field, (old, new) in sorted(job.payload['changes'].items())
+        )
+        subject = f'{event.name} has changed'
+        body = f'The event {event.name} you are attending has changed:\n\n{changes}'
+        emails = Attendance.objects.filter(event=event, pk__gt=job.payload.get('after', 0)).exclude(
+            user__email=''
+        ).order_by('pk').values_list('pk', 'user__email').iterator(chunk_size=EMAIL_CHUNK_SIZE)
+        messages = []
+        for pk, email in emails:
+            messages.append(EmailMessage(subject, body, to=[email]))
+            if len(messages) == EMAIL_CHUNK_SIZE:
+                send_chunk(job, messages, pk)
+                messages = []
+        if messages:
+            send_chunk(job, messages, pk)
+        queue.mark_done([job])
+
+
+def send_chunk(job, messages, last_pk):
+    send_emails(messages)
+    job.payload['after'] = last_pk
+    queue.save_payload(job)
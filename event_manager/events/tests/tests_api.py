@@ -0,0 +1,234 @@
+import json
+from datetime import date, timedelta
+
+from django.test import TestCase, Client
+from django.contrib.auth.models import Permission, User
+from django.urls import reverse
+from django.utils.http import http_date
+
+from ..models import Attendance, Event
+
+
+class TestEventApi(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create(username='organizer', password='supersecure')
+        self.attendee = User.objects.create(username='attendee', password='verysafe')
+        self.events = [
+            Event.objects.create(
+                name=f'Event {i}',
+                venue='London',
+                organizer=self.organizer,
+                date=date.today() + timedelta(days=i),
+                capacity=5
+            ) for i in range(-1, 4)
+        ]
+        self.test_event = self.events[1]
+        self.client = Client()
+
+    def test_event_list(self):
+        response = self.client.get(reverse('api-event-list'))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([e['name'] for e in data['results']], ['Event 0', 'Event 1', 'Event 2', 'Event 3'])
+        self.assertEqual(data['results'][0]['organizer_username'], 'organizer')
+        self.assertEqual(data['results'][0]['date'], self.test_event.date.isoformat())
+        self.assertIsNone(data['next'])
+
+    def test_event_list_pagination(self):
+        data = self.client.get(reverse('api-event-list'), {'page_size': 3, 'upcoming': 'false'}).json()
+        self.assertEqual(len(data['results']), 3)
+        data = self.client.get(data['next']).json()
+        self.assertEqual([e['name'] for e in data['results']], ['Event 2', 'Event 3'])
+        self.assertIsNone(data['next'])
+        data = self.client.get(data['previous']).json()
+        self.assertEqual([e['name'] for e in data['results']], ['Event -1', 'Event 0', 'Event 1'])
+
+    def test_event_list_invalid_cursor(self):
+        response = self.client.get(reverse('api-event-list'), {'after': 'nope'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_event_list_not_modified(self):
+        response = self.client.get(reverse('api-event-list'))
+        etag = response['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        self.assertNotIn('Last-Modified', response)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('api-event-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        self.test_event.attendees.add(self.attendee)
+        response = self.client.get(reverse('api-event-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_event_list_deletion(self):
+        etag = self.client.get(reverse('api-event-list'))['ETag']
+        self.test_event.delete()
+        response = self.client.get(reverse('api-event-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        # the latest updated_at did not move
+        response = self.client.get(reverse('api-event-list'), HTTP_IF_MODIFIED_SINCE=http_date())
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Event 0', [event['name'] for event in response.json()['results']])
+
+    def test_event_list_etag_depends_on_query(self):
+        first = self.client.get(reverse('api-event-list'))['ETag']
+        second = self.client.get(reverse('api-event-list'), {'page_size': 2})['ETag']
+        self.assertNotEqual(first, second)
+
+    def test_event_detail(self):
+        response = self.client.get(reverse('api-event-detail', args=[self.test_event.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'Event 0')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse('api-event-detail', args=[self.test_event.id]), HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(response.status_code, 304)
+
+    def test_event_detail_modified_since(self):
+        response = self.client.get(reverse('api-event-detail', args=[self.test_event.id]))
+        response = self.client.get(
+            reverse('api-event-detail', args=[self.test_event.id]),
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_event_detail_changes_etag(self):
+        etag = self.client.get(reverse('api-event-detail', args=[self.test_event.id]))['ETag']
+        self.test_event.name = 'Renamed'
+        self.test_event.save()
+        response = self.client.get(reverse('api-event-detail', args=[self.test_event.id]), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'Renamed')
+
+    def test_organizer_rename_changes_etags(self):
+        list_etag = self.client.get(reverse('api-event-list'))['ETag']
+        detail_etag = self.client.get(reverse('api-event-detail', args=[self.test_event.id]))['ETag']
+        self.organizer.username = 'host'
+        self.organizer.save()
+        response = self.client.get(reverse('api-event-list'), HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({event['organizer_username'] for event in response.json()['results']}, {'host'})
+        response = self.client.get(
+            reverse('api-event-detail', args=[self.test_event.id]), HTTP_IF_NONE_MATCH=detail_etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['organizer_username'], 'host')
+
+    def test_event_detail_not_found(self):
+        response = self.client.get(reverse('api-event-detail', args=[999]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_my_registrations(self):
+        response = self.client.get(reverse('api-my-registrations'))
+        self.assertEqual(response.status_code, 403)
+
+        self.events[2].attendees.add(self.attendee)
+        self.client.force_login(self.attendee)
+        data = self.client.get(reverse('api-my-registrations')).json()
+        self.assertEqual([e['name'] for e in data['results']], ['Event 1'])
+
+    def test_read_only(self):
+        response = self.client.post(reverse('api-event-list'))
+        self.assertEqual(response.status_code, 405)
+
+
+class TestBatchRegistrations(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create(username='organizer', password='supersecure')
+        self.attendee = User.objects.create(username='attendee', password='verysafe')
+        User.objects.bulk_create([User(username=f'member{i}') for i in range(4)])
+        self.events = [
+            Event.objects.create(
+                name=f'Event {i}', venue='London', organizer=self.organizer,
+                date=date.today() + timedelta(days=10), capacity=3,
+            ) for i in range(2)
+        ]
+        self.url = reverse('api-registrations')
+        self.client = Client()
+
+    def post(self, data, user=None):
+        self.client.force_login(user or self.organizer)
+        return self.client.post(self.url, json.dumps(data), content_type='application/json')
+
+    def results(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [item['result'] for item in response.json()['results']]
+
+    def test_requires_login(self):
+        response = self.client.post(self.url, '{}', content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_group(self):
+        event = self.events[0]
+        response = self.post({'event': event.pk, 'users': ['member0', 'member1', 'member2']})
+        self.assertEqual(self.results(response), ['registered'] * 3)
+        self.assertEqual(response.json()['registered'], 3)
+        self.assertEqual(response.json()['results'][0], {'event': event.pk, 'user': 'member0', 'result': 'registered'})
+        self.assertEqual(Event.objects.get(pk=event.pk).attendee_count, 3)
+
+    def test_group_all_or_nothing(self):
+        event = self.events[0]
+        users = ['member0', 'member1', 'member2', 'member3']
+        self.assertEqual(self.results(self.post({'event': event.pk, 'users': users})), ['rolled_back'] * 3 + ['full'])
+        self.assertFalse(Attendance.objects.exists())
+
+        response = self.post({'event': event.pk, 'users': users, 'all_or_nothing': False})
+        self.assertEqual(self.results(response), ['registered'] * 3 + ['full'])
+
+    def test_group_with_unknown_user(self):
+        response = self.post({'event': self.events[0].pk, 'users': ['member0', 'nobody']})
+        self.assertEqual(self.results(response), ['rolled_back', 'unknown_user'])
+
+    def test_list(self):
+        first, second = (event.pk for event in self.events)
+        response = self.post({'registrations': [
+            {'event': first, 'user': 'member0'},
+            {'event': second, 'user': 'member0'},
+            {'event': second},
+            {'event': 999, 'user': 'member1'},
+            {'event': 'first'},
+            'member2',
+        ]})
+        self.assertEqual(
+            self.results(response),
+            ['registered', 'registered', 'registered', 'unknown_event', 'invalid', 'invalid'],
+        )
+        self.assertTrue(Attendance.objects.filter(event_id=second, user=self.organizer).exists())
+
+    def test_others_need_organizer_or_permission(self):
+        first, second = (event.pk for event in self.events)
+        other = Event.objects.create(
+            name='Other', venue='Paris', organizer=self.attendee, date=date.today() + timedelta(days=10), capacity=3,
+        )
+        data = {'registrations': [
+            {'event': first, 'user': 'member0'}, {'event': other.pk, 'user': 'member1'},
+            {'event': 999, 'user': 'member1'}, {'event': other.pk, 'user': 'organizer'},
+        ]}
+        self.assertEqual(self.results(self.post(data)), ['registered', 'forbidden', 'unknown_event', 'registered'])
+
+        self.organizer.user_permissions.add(Permission.objects.get(codename='add_attendance'))
+        self.organizer = User.objects.get(pk=self.organizer.pk)
+        self.assertEqual(
+            self.results(self.post(data)), ['already_registered', 'registered', 'unknown_event', 'already_registered']
+        )
+
+    def test_invalid_requests(self):
+        for data in [[], {}, {'registrations': {}}, {'event': 1, 'users': 'member0'}, {'registrations': []},
+                     {'event': 1, 'all_or_nothing': 'yes'}]:
+            with self.subTest(data=data):
+                self.assertEqual(self.post(data).status_code, 400)
+        response = self.client.post(self.url, 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_too_large(self):
+        response = self.post({'event': self.events[0].pk, 'users': ['member0'] * 501})
+        self.assertEqual(response.status_code, 400)
+
+    def test_get_not_allowed(self):
+        self.client.force_login(self.organizer)
+        self.assertEqual(self.client.get(self.url).status_code, 405)
@@ -0,0 +1,55 @@
+import threading
+from datetime import date, timedelta
+
+from asgiref.sync import sync_to_async
+from django.test import AsyncClient, TransactionTestCase, override_settings
+from django.contrib.auth.models import User
+from django.urls import resolve, reverse
+
+from .. import async_views
+from ..models import Event
+
+
+@override_settings(ROOT_URLCONF='event_manager.urls_asgi')
+class TestAsyncViews(TransactionTestCase):
+    # the pool threads use their own database connections, which only see committed data
+
+    def setUp(self):
+        self.organizer = User.objects.create(username='organizer', password='supersecure')
+        self.attendee = User.objects.create(username='attendee', password='verysafe')
+        self.test_event = Event.objects.create(
+            name='Test Event',
+            venue='London',
+            organizer=self.organizer,
+            date=date.today() + timedelta(days=10),
+            capacity=1
+        )
+        self.client = AsyncClient()
+
+    def test_urls(self):
+        self.assertEqual(resolve(reverse('home')).func, async_views.event_list)
+        self.assertEqual(resolve(reverse('event-detail', args=[1])).func, async_views.event_detail)
+        self.assertEqual(resolve(reverse('event-attend', args=[1])).func, async_views.attend_event)
+        self.assertEqual(resolve(reverse('event-update', args=[1])).func.view_class.__name__, 'EventUpdateView')
+
+    async def test_event_list(self):
+        response = await self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['events']), [self.test_event])
+        self.assertContains(response, 'Test Event')
+
+    async def test_event_detail(self):
+        response = await self.client.get(reverse('event-detail', args=[self.test_event.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['event'], self.test_event)
+
+    async def test_attend_event(self):
+        await sync_to_async(self.client.force_login)(self.attendee)
+        response = await self.client.post(reverse('event-attend', args=[self.test_event.pk]))
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        attending = await sync_to_async(self.test_event.attendees.filter(pk=self.attendee.pk).exists)()
+        self.assertTrue(attending)
+
+    async def test_runs_in_db_pool(self):
+        name = await async_views.run_in_db_thread(lambda: threading.current_thread().name)
+        self.assertTrue(name.startswith('events-db'))
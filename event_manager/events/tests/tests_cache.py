@@ -0,0 +1,94 @@
+import shutil
+import tempfile
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth.models import User
+from django.urls import reverse
+
+from .. import cache as fragment_cache
+from ..models import Event
+
+
+class TestFragmentCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        fragment_cache.stats.reset()
+        self.organizer = User.objects.create(username='organizer', password='supersecure')
+        self.attendee = User.objects.create(username='attendee', password='verysafe')
+        self.test_event = Event.objects.create(
+            name='Test Event',
+            venue='London',
+            organizer=self.organizer,
+            date=date.today() + timedelta(days=10),
+            capacity=1
+        )
+        self.client = Client()
+
+    def test_hits_and_misses(self):
+        self.client.get(reverse('home'))
+        self.assertEqual((fragment_cache.stats.hits, fragment_cache.stats.misses), (0, 1))
+        self.client.get(reverse('home'))
+        self.client.get(reverse('home'))
+        self.assertEqual((fragment_cache.stats.hits, fragment_cache.stats.misses), (2, 1))
+        self.assertAlmostEqual(fragment_cache.stats.hit_ratio, 2 / 3)
+
+    def test_event_change_invalidates(self):
+        self.client.get(reverse('event-detail', args=[self.test_event.id]))
+        self.test_event.venue = 'Manchester'
+        self.test_event.save()
+        response = self.client.get(reverse('event-detail', args=[self.test_event.id]))
+        self.assertContains(response, 'Where: Manchester')
+        self.assertEqual(fragment_cache.stats.misses, 2)
+
+    def test_organizer_rename_invalidates(self):
+        self.client.get(reverse('event-detail', args=[self.test_event.id]))
+        self.organizer.username = 'host'
+        self.organizer.save()
+        self.assertContains(self.client.get(reverse('event-detail', args=[self.test_event.id])), 'Organizer: host')
+
+        versions = fragment_cache.get_versions([self.test_event.pk])
+        self.organizer.save(update_fields=['last_login'])
+        self.organizer.save()
+        self.assertEqual(fragment_cache.get_versions([self.test_event.pk]), versions)
+
+    def test_attendance_change_invalidates(self):
+        versions = fragment_cache.get_versions([self.test_event.pk])
+        self.test_event.attendees.add(self.attendee)
+        self.assertNotEqual(fragment_cache.get_versions([self.test_event.pk]), versions)
+
+        versions = fragment_cache.get_versions([self.test_event.pk])
+        self.test_event.attendees.remove(self.attendee)
+        self.assertNotEqual(fragment_cache.get_versions([self.test_event.pk]), versions)
+
+    def test_per_user_parts_are_not_shared(self):
+        self.test_event.attendees.add(self.attendee)
+        response = self.client.get(reverse('home'))
+        self.assertNotContains(response, 'You are attending')
+
+        self.client.force_login(self.attendee)
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'You are attending')
+        self.assertNotContains(response, 'Modify')
+
+        self.client.force_login(self.organizer)
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Fully booked')
+        self.assertContains(response, 'Modify')
+        self.assertEqual(fragment_cache.stats.hits, 2)
+
+
+class TestFileBasedFragmentCache(TestFragmentCache):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        settings = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': self.cache_dir,
+            }
+        })
+        settings.enable()
+        self.addCleanup(settings.disable)
+        super().setUp()
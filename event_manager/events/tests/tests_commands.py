@@ -0,0 +1,361 @@
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.core import mail
+from django.db import IntegrityError
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import (
+    ArchivedAttendance, ArchivedEvent, Attendance, Event, EventTombstone, Reminder, WaitlistEntry,
+)
+from ..search import get_backend, search_events
+
+
+class TestRebuildAttendeeCounts(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create(username='organizer', password='supersecure')
+        self.attendee = User.objects.create(username='attendee', password='verysafe')
+        self.events = [
+            Event.objects.create(
+                name=f'Event {i}',
+                venue='London',
+                organizer=self.organizer,
+                date=date.today() + timedelta(days=10),
+                capacity=5
+            ) for i in range(3)
+        ]
+        Attendance.objects.bulk_create([
+            Attendance(event=event, user=self.attendee) for event in self.events
+        ])
+
+    def test_rebuild_all(self):
+        out = StringIO()
+        call_command('rebuild_attendee_counts', '--batch-size', '2', stdout=out)
+        self.assertIn('Rebuilt attendee count of 3 events', out.getvalue())
+        self.assertEqual(list(Event.objects.values_list('attendee_count', flat=True)), [1, 1, 1])
+
+    def test_rebuild_selected(self):
+        call_command('rebuild_attendee_counts', str(self.events[0].pk), stdout=StringIO())
+        counts = dict(Event.objects.values_list('pk', 'attendee_count'))
+        self.assertEqual(counts[self.events[0].pk], 1)
+        self.assertEqual(counts[self.events[1].pk], 0)
+
+
+class TestRebuildSearchIndex(TestCase):
+    def setUp(self):
+        organizer = User.objects.create(username='organizer', password='supersecure')
+        for i in range(3):
+            Event.objects.create(
+                name=f'Concert {i}',
+                venue='London',
+                organizer=organizer,
+                date=date.today() + timedelta(days=10),
+            )
+
+    def test_rebuild(self):
+        get_backend().clear()
+        self.assertFalse(search_events(Event.objects.all(), 'concert').exists())
+        out = StringIO()
+        call_command('rebuild_search_index', '--batch-size', '2', stdout=out)
+        self.assertIn('Indexed 3 events', out.getvalue())
+        self.assertEqual(search_events(Event.objects.all(), 'concert').count(), 3)
+
+
+class TestImportExportEvents(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create(username='organizer', password='supersecure')
+        self.attendees = [User.objects.create(username=f'attendee{i}', password='verysafe') for i in range(3)]
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.future = (date.today() + timedelta(days=10)).isoformat()
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def test_import_csv(self):
+        path = self.write('events.csv', (
+            'name,description,date,venue,capacity,organizer,attendees\n'
+            f'Aperitivo,,{self.future},Beach Bar,10,organizer,attendee0 attendee1\n'
+            f'Dinner,Pizza,{self.future},Naples,2,organizer,\n'
+        ))
+        out = StringIO()
+        call_command('import_events', path, '--batch-size', '1', stdout=out)
+        self.assertIn('Imported 2 events and 2 attendances', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+
+        aperitivo = Event.objects.get(name='Aperitivo')
+        self.assertEqual(aperitivo.organizer, self.organizer)
+        self.assertEqual(aperitivo.capacity, 10)
+        self.assertEqual(aperitivo.attendee_count, 2)
+        self.assertEqual(set(aperitivo.attendees.values_list('username', flat=True)), {'attendee0', 'attendee1'})
+        self.assertEqual(set(Attendance.objects.values_list('event_date', flat=True)), {aperitivo.date})
+        self.assertEqual(Event.objects.get(name='Dinner').attendee_count, 0)
+        self.assertEqual(list(search_events(Event.objects.all(), 'pizza')), [Event.objects.get(name='Dinner')])
+
+    def test_import_jsonl_with_default_organizer(self):
+        path = self.write('events.jsonl', (
+            f'{{"name": "Aperitivo", "date": "{self.future}", "venue": "Beach Bar", "attendees": ["attendee2"]}}\n'
+            '\n'
+            f'{{"name": "Dinner", "date": "{self.future}", "venue": "Naples", "capacity": 5}}\n'
+        ))
+        call_command('import_events', path, '--organizer', 'organizer', stdout=StringIO())
+        self.assertEqual(Event.objects.filter(organizer=self.organizer).count(), 2)
+        self.assertEqual(Event.objects.get(name='Aperitivo').capacity, 20)
+        self.assertEqual(Event.objects.get(name='Aperitivo').attendee_count, 1)
+
+    def test_import_skips_invalid_rows(self):
+        past = (date.today() - timedelta(days=1)).isoformat()
+        path = self.write('events.jsonl', (
+            f'{{"name": "Past", "date": "{past}", "venue": "London", "organizer": "organizer"}}\n'
+            f'{{"name": "Huge", "date": "{self.future}", "venue": "London", "capacity": 101, "organizer": "organizer"}}\n'
+            f'{{"name": "Ghost", "date": "{self.future}", "venue": "London", "organizer": "nobody"}}\n'
+            f'{{"name": "Crowded", "date": "{self.future}", "venue": "London", "capacity": 1, "organizer": "organizer",'
+            ' "attendees": ["attendee0", "attendee1"]}\n'
+            'not json\n'
+            f'{{"name": "Number", "date": "{self.future}", "venue": "London", "organizer": "organizer",'
+            ' "attendees": 5}\n'
+            f'{{"name": "String", "date": "{self.future}", "venue": "London", "organizer": "organizer",'
+            ' "attendees": "attendee0"}\n'
+            f'{{"name": "Nested", "date": "{self.future}", "venue": "London", "organizer": "organizer",'
+            ' "attendees": [["attendee0"]]}\n'
+            f'{{"name": "Valid", "date": "{self.future}", "venue": "London", "organizer": "organizer"}}\n'
+        ))
+        out, err = StringIO(), StringIO()
+        call_command('import_events', path, stdout=out, stderr=err)
+        self.assertIn('Imported 1 events', out.getvalue())
+        self.assertIn('skipped 8 invalid rows', out.getvalue())
+        self.assertIn('Line 1: Cannot create events in the past or today!', err.getvalue())
+        self.assertIn('Line 2: Ensure this value is less than or equal to 100.', err.getvalue())
+        self.assertIn("Line 3: Unknown organizer 'nobody'", err.getvalue())
+        self.assertIn('Line 4: 2 attendees exceed the capacity of 1', err.getvalue())
+        self.assertIn('Line 5: Cannot parse row', err.getvalue())
+        for number in (6, 7, 8):
+            self.assertIn(f'Line {number}: The attendees must be a list of usernames', err.getvalue())
+        self.assertEqual(list(Event.objects.values_list('name', flat=True)), ['Valid'])
+
+    def test_export_import_round_trip(self):
+        event = Event.objects.create(
+            name='Aperitivo', venue='Beach Bar', organizer=self.organizer, date=self.future, capacity=10
+        )
+        event.attendees.add(*self.attendees)
+        for fmt in ['csv', 'jsonl']:
+            with self.subTest(fmt=fmt):
+                path = os.path.join(self.tmp_dir, f'events.{fmt}')
+                call_command('export_events', path, stdout=StringIO())
+                call_command('import_events', path, stdout=StringIO())
+                imported = Event.objects.exclude(pk=event.pk).get()
+                self.assertEqual(imported.name, 'Aperitivo')
+                self.assertEqual(imported.attendee_count, 3)
+                imported.delete()
+
+    def test_export_to_stdout(self):
+        Event.objects.create(name='Aperitivo', venue='Beach Bar', organizer=self.organizer, date=self.future)
+        out, err = StringIO(), StringIO()
+        call_command('export_events', '--format', 'jsonl', stdout=out, stderr=err)
+        self.assertIn('"name": "Aperitivo"', out.getvalue())
+        self.assertIn('Exported 1 events', err.getvalue())
+
+
+class TestSeedData(TestCase):
+    def seed(self, *args):
+        out = StringIO()
+        call_command('seed_data', '--users', '200', '--events', '50', '--attendances', '1000', *args, stdout=out)
+        return out.getvalue()
+
+    def test_seed(self):
+        User.objects.create(username='existing', password='supersecure')
+        self.assertIn('Created 200 users, 50 events and', self.seed('--batch-size', '7'))
+        self.assertEqual(User.objects.count(), 201)
+        self.assertEqual(Event.objects.count(), 50)
+        self.assertGreater(Attendance.objects.count(), 500)
+        self.assertLessEqual(Attendance.objects.count(), 1000)
+        # the stored counters match the attendees table, within capacity
+        counts = dict(Event.objects.values_list('pk', 'attendee_count'))
+        Event.objects.refresh_attendee_count()
+        self.assertEqual(dict(Event.objects.values_list('pk', 'attendee_count')), counts)
+        self.assertFalse(Event.objects.filter(attendee_count__gt=F('capacity')).exists())
+        self.assertFalse(Attendance.objects.exclude(event_date=F('event__date')).exists())
+        self.assertEqual(search_events(Event.objects.all(), 'Python').count(), Event.objects.filter(
+            name__startswith='Python'
+        ).count())
+
+    def test_same_seed_same_data(self):
+        self.seed('--seed', '3')
+        first = list(Attendance.objects.values_list('event__name', 'user__username').order_by('pk'))
+        Event.objects.all().delete()
+        User.objects.all().delete()
+        self.seed('--seed', '3')
+        self.assertEqual(list(Attendance.objects.values_list('event__name', 'user__username').order_by('pk')), first)
+
+    def test_sequences_catch_up(self):
+        self.seed()
+        event = Event.objects.create(
+            name='After', venue='London', organizer=User.objects.first(), date=date.today(), capacity=1
+        )
+        self.assertEqual(event.pk, 51)
+
+
+class TestArchiveEvents(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create(username='organizer', password='supersecure')
+        self.attendee = User.objects.create(username='attendee', password='verysafe')
+        self.old = [
+            Event.objects.create(
+                name=f'Old event {i}', venue='London', organizer=self.organizer,
+                date=date.today() - timedelta(days=400 + i), capacity=5,
+            ) for i in range(5)
+        ]
+        self.recent = Event.objects.create(
+            name='Recent event', venue='London', organizer=self.organizer,
+            date=date.today() - timedelta(days=10), capacity=5,
+        )
+        for event in self.old + [self.recent]:
+            event.attendees.add(self.attendee)
+        WaitlistEntry.objects.create(event=self.old[0], user=self.organizer)
+        Reminder.objects.create(event=self.old[0], user=self.attendee, run_id='run')
+
+    def archive(self, *args):
+        out = StringIO()
+        call_command('archive_events', '--chunk-size', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def test_archive(self):
+        self.assertIn('Archived 5 events', self.archive())
+        self.assertEqual(list(Event.objects.all()), [self.recent])
+        self.assertEqual(list(Attendance.objects.values_list('event_id', flat=True)), [self.recent.pk])
+        self.assertFalse(WaitlistEntry.objects.exists())
+        self.assertFalse(Reminder.objects.exists())
+        # they did take place: calendar clients keep them
+        self.assertFalse(EventTombstone.objects.exists())
+        self.assertEqual(search_events(Event.objects.all(), 'old').count(), 0)
+
+        archived = ArchivedEvent.objects.get(pk=self.old[0].pk)
+        self.assertEqual(
+            (archived.name, archived.date, archived.organizer, archived.attendee_count),
+            ('Old event 0', self.old[0].date, self.organizer, 1),
+        )
+        self.assertEqual(
+            set(ArchivedAttendance.objects.values_list('event_id', 'user_id')),
+            {(event.pk, self.attendee.pk) for event in self.old},
+        )
+
+    def test_resume(self):
+        self.assertIn('Archived 3 events', self.archive('--limit', '3'))
+        # the oldest first
+        self.assertEqual(set(ArchivedEvent.objects.values_list('pk', flat=True)), {event.pk for event in self.old[2:]})
+        self.assertIn('Archived 2 events', self.archive('--pause', '0.01'))
+        self.assertIn('Archived 0 events', self.archive())
+        self.assertEqual(ArchivedEvent.objects.count(), 5)
+
+    def test_conflict_rolls_back(self):
+        # an archived event under the id of the oldest event, e.g. a restored backup
+        ArchivedEvent.objects.create(
+            id=self.old[4].pk, name='Other event', venue='Paris', organizer=self.organizer,
+            date=self.old[4].date, capacity=5, attendee_count=0,
+        )
+        with self.assertRaises(IntegrityError):
+            self.archive()
+        self.assertEqual(Event.objects.count(), 6)
+        self.assertEqual(list(ArchivedEvent.objects.values_list('name', flat=True)), ['Other event'])
+        self.assertFalse(ArchivedAttendance.objects.exists())
+
+    def test_cutoff(self):
+        self.archive('--days', '5')
+        self.assertFalse(Event.objects.exists())
+        with self.assertRaises(CommandError):
+            self.archive('--days', '0')
+        with self.assertRaises(CommandError):
+            self.archive('--chunk-size', '1000')
+
+    def test_detail_view(self):
+        self.archive()
+        self.client.force_login(self.attendee)
+        response = self.client.get(reverse('event-detail', args=[self.old[0].pk]))
+        self.assertTemplateUsed(response, 'events/archivedevent_detail.html')
+        self.assertContains(response, 'Old event 0')
+        self.assertContains(response, 'You attended')
+        self.assertContains(self.client.get(reverse('event-detail', args=[self.recent.pk])), 'Recent event')
+        self.assertEqual(self.client.get(reverse('event-detail', args=[9999])).status_code, 404)
+
+
+class TestSendReminders(TransactionTestCase):
+    # the reminders are sent by threads with their own database connections
+
+    def setUp(self):
+        organizer = User.objects.create(username='organizer', password='supersecure')
+        User.objects.bulk_create([User(username=f'attendee{i}', email=f'attendee{i}@example.com') for i in range(25)])
+        User.objects.create(username='noemail', password='verysafe')
+        self.attendees = list(User.objects.exclude(pk=organizer.pk).order_by('pk'))
+        self.tomorrow = Event.objects.create(
+            name='Tomorrow', venue='London', organizer=organizer, date=date.today() + timedelta(days=1), capacity=100
+        )
+        self.later = Event.objects.create(
+            name='Later', venue='London', organizer=organizer, date=date.today() + timedelta(days=2), capacity=100
+        )
+        for event in (self.tomorrow, self.later):
+            Attendance.objects.bulk_create([Attendance(event=event, user=user) for user in self.attendees])
+
+    def test_send_due_reminders(self):
+        out = StringIO()
+        call_command('send_reminders', '--chunk-size', '10', '--workers', '3', stdout=out)
+        self.assertIn('Sent 25 reminders for 1 events', out.getvalue())
+        self.assertIn('sent/s', out.getvalue())
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), sorted(
+            f'attendee{i}@example.com' for i in range(25)
+        ))
+        self.assertTrue(all(message.subject.startswith('Reminder: Tomorrow') for message in mail.outbox))
+        self.assertFalse(Reminder.objects.filter(sent_at__isnull=True).exists())
+
+    def test_rerun_sends_nothing_twice(self):
+        call_command('send_reminders', stdout=StringIO())
+        mail.outbox = []
+        out = StringIO()
+        call_command('send_reminders', stdout=out)
+        self.assertIn('Sent 0 reminders', out.getvalue())
+        self.assertEqual(mail.outbox, [])
+
+    def test_resume_after_crash(self):
+        # claimed by a run which died before sending
+        Reminder.objects.bulk_create([
+            Reminder(event=self.tomorrow, user=user, run_id='crashed') for user in self.attendees[:5]
+        ])
+        out, err = StringIO(), StringIO()
+        call_command('send_reminders', stdout=out, stderr=err)
+        self.assertIn('Sent 20 reminders', out.getvalue())
+        self.assertIn('5 reminders were claimed by interrupted runs', err.getvalue())
+
+    def test_reclaim_after_crash(self):
+        Reminder.objects.bulk_create([
+            Reminder(event=self.tomorrow, user=user, run_id='crashed') for user in self.attendees[:5]
+        ])
+        Reminder.objects.filter(user=self.attendees[0]).update(created_at=timezone.now() - timedelta(minutes=5))
+        out, err = StringIO(), StringIO()
+        call_command('send_reminders', '--reclaim-after', '60', stdout=out, stderr=err)
+        self.assertIn('Sent 20 reminders', out.getvalue())
+        self.assertNotIn('Reclaimed', out.getvalue())
+
+        Reminder.objects.filter(run_id='crashed').update(created_at=timezone.now() - timedelta(minutes=90))
+        mail.outbox = []
+        out = StringIO()
+        call_command('send_reminders', '--reclaim-after', '60', stdout=out, stderr=err)
+        self.assertIn('Reclaimed 5 reminders', out.getvalue())
+        self.assertIn('Sent 5 reminders', out.getvalue())
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox), sorted(user.email for user in self.attendees[:5]),
+        )
+        self.assertFalse(Reminder.objects.filter(sent_at__isnull=True).exists())
+
+    def test_days_ahead(self):
+        call_command('send_reminders', '--days', '2', stdout=StringIO())
+        self.assertTrue(all(message.subject.startswith('Reminder: Later') for message in mail.outbox))
@@ -0,0 +1,50 @@
+from datetime import date
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.transaction import TransactionManagementError
+from django.test import SimpleTestCase, TransactionTestCase
+
+from ..db import bulk_create_with_pks
+from ..models import Event
+
+
+@skipUnless(connection.settings_dict.get('PRAGMAS'), 'SQLite pragmas are not configured')
+class TestSQLitePragmas(SimpleTestCase):
+    databases = {'default'}
+
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_on_connect(self):
+        connection.close()
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        # NORMAL
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+
+
+class TestBulkCreateWithPks(TransactionTestCase):
+    def setUp(self):
+        self.organizer = User.objects.create(username='organizer', password='supersecure')
+
+    def events(self, count, name='Event'):
+        return [
+            Event(name=f'{name} {i}', venue='London', organizer=self.organizer, date=date(2030, 1, 1))
+            for i in range(count)
+        ]
+
+    def test_sets_pks(self):
+        Event.objects.bulk_create(self.events(2, 'Old event'))
+        with transaction.atomic():
+            events = bulk_create_with_pks(Event, self.events(3))
+        self.assertEqual([Event.objects.get(pk=event.pk).name for event in events], ['Event 0', 'Event 1', 'Event 2'])
+        self.assertEqual(Event.objects.count(), 5)
+
+    @skipUnless(not connection.features.can_return_rows_from_bulk_insert, 'the backend returns the pks')
+    def test_requires_a_transaction(self):
+        with self.assertRaises(TransactionManagementError):
+            bulk_create_with_pks(Event, self.events(1))
@@ -0,0 +1,231 @@
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.test import Client, SimpleTestCase, TestCase
+from django.urls import reverse
+
+from ..feeds import calendar_key, escape, fold
+from ..models import Event, EventChangeCounter, EventTombstone
+
+
+def content(response):
+    return b''.join(response.streaming_content).decode()
+
+
+class TestFormatting(SimpleTestCase):
+    def test_escape(self):
+        self.assertEqual(escape('a,b;c\\d\ne\r\nf'), 'a\\,b\\;c\\\\d\\ne\\nf')
+
+    def test_fold_short_line(self):
+        self.assertEqual(fold('SUMMARY:Chess'), 'SUMMARY:Chess\r\n')
+
+    def test_fold_long_line(self):
+        folded = fold('DESCRIPTION:' + 'x' * 200)
+        lines = folded.split('\r\n')
+        self.assertEqual([len(line) for line in lines], [75, 75, 64, 0])
+        self.assertTrue(all(line.startswith(' ') for line in lines[1:3]))
+        self.assertEqual(''.join(line[1:] if i else line for i, line in enumerate(lines)), 'DESCRIPTION:' + 'x' * 200)
+
+    def test_fold_keeps_utf8_sequences(self):
+        folded = fold('SUMMARY:' + 'é' * 100)
+        for line in folded.split('\r\n'):
+            self.assertLessEqual(len(line.encode()), 75)
+        self.assertEqual(folded.replace('\r\n ', ''), 'SUMMARY:' + 'é' * 100 + '\r\n')
+
+
+class TestChangeSequence(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create(username='organizer', password='supersecure')
+        self.event = Event.objects.create(
+            name='Chess night', venue='London', organizer=self.organizer,
+            date=date.today() + timedelta(days=10), capacity=5,
+        )
+
+    def test_save_takes_next_number(self):
+        first = self.event.change_seq
+        self.assertEqual(first, EventChangeCounter.current())
+        self.event.name = 'Chess evening'
+        self.event.save()
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.change_seq, first + 1)
+
+    def test_unchanged_calendar_fields(self):
+        first = self.event.change_seq
+        self.event.capacity = 10
+        self.event.save()
+        event = Event.objects.get(pk=self.event.pk)
+        event.save()
+        self.assertEqual(EventChangeCounter.current(), first)
+        event.venue = 'Paris'
+        event.save()
+        self.assertEqual(Event.objects.get(pk=event.pk).change_seq, first + 1)
+        event.venue = 'London'
+        event.save()
+        self.assertEqual(Event.objects.get(pk=event.pk).change_seq, first + 2)
+
+    def test_refreshed_values(self):
+        first = self.event.change_seq
+        Event.objects.filter(pk=self.event.pk).update(venue='Paris')
+        self.event.refresh_from_db()
+        self.event.venue = 'London'
+        self.event.save()
+        self.assertEqual(Event.objects.get(pk=self.event.pk).change_seq, first + 1)
+
+    def test_update_fields(self):
+        first = self.event.change_seq
+        self.event.capacity = 10
+        self.event.save(update_fields=['capacity'])
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.change_seq, first)
+        self.event.venue = 'Paris'
+        self.event.save(update_fields=['venue'])
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.change_seq, first + 1)
+
+    def test_delete_leaves_tombstone(self):
+        pk = self.event.pk
+        self.event.delete()
+        tombstone = EventTombstone.objects.get()
+        self.assertEqual((tombstone.event_id, tombstone.organizer_id), (pk, self.organizer.pk))
+        self.assertEqual(tombstone.change_seq, EventChangeCounter.current())
+
+
+class TestOrganizerCalendar(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create(username='organizer', password='supersecure')
+        other = User.objects.create(username='other', password='verysafe')
+        self.events = [
+            Event.objects.create(
+                name=f'Event {i}', description='Bring a friend, or two; maybe', venue='London',
+                organizer=self.organizer, date=date.today() + timedelta(days=i), capacity=5,
+            ) for i in range(1, 4)
+        ]
+        Event.objects.create(name='Other', venue='Paris', organizer=other, date=date.today(), capacity=5)
+        self.url = reverse('calendar-organizer', args=[self.organizer.pk])
+        self.client = Client()
+
+    def test_full(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        self.assertEqual(response['X-Sync-Mode'], 'full')
+        self.assertEqual(response['X-Sync-Token'], str(self.events[-1].change_seq))
+        self.assertIn('public', response['Cache-Control'])
+        body = content(response)
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\nVERSION:2.0\r\n'))
+        self.assertTrue(body.endswith('END:VCALENDAR\r\n'))
+        self.assertEqual(body.count('BEGIN:VEVENT'), 3)
+        self.assertNotIn('Other', body)
+        event = self.events[0]
+        self.assertIn(f'UID:event-{event.pk}@testserver\r\n', body)
+        self.assertIn(f'DTSTART;VALUE=DATE:{event.date:%Y%m%d}\r\n', body)
+        self.assertIn('DESCRIPTION:Bring a friend\\, or two\\; maybe\r\n', body)
+        self.assertIn(f'URL:http://testserver/event/{event.pk}/\r\n', body)
+        self.assertIn('X-WR-CALNAME:Events by organizer\r\n', body)
+
+    def test_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.events[0].name = 'Renamed'
+        self.events[0].save()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_incremental(self):
+        token = self.client.get(self.url)['X-Sync-Token']
+        self.events[1].name = 'Renamed'
+        self.events[1].save()
+        deleted = self.events[2].pk
+        self.events[2].delete()
+
+        response = self.client.get(self.url, {'since': token})
+        self.assertEqual(response['X-Sync-Mode'], 'incremental')
+        body = content(response)
+        self.assertEqual(body.count('BEGIN:VEVENT'), 2)
+        self.assertIn('SUMMARY:Renamed\r\n', body)
+        self.assertIn(f'UID:event-{deleted}@testserver\r\nDTSTAMP:', body)
+        self.assertIn('STATUS:CANCELLED\r\n', body)
+
+        token = response['X-Sync-Token']
+        self.assertEqual(int(token), EventChangeCounter.current())
+        body = content(self.client.get(self.url, {'since': token}))
+        self.assertNotIn('BEGIN:VEVENT', body)
+
+    def test_other_organizers_changes(self):
+        token = self.client.get(self.url)['X-Sync-Token']
+        Event.objects.get(name='Other').delete()
+        response = self.client.get(self.url, {'since': token})
+        self.assertEqual(response['X-Sync-Token'], token)
+        self.assertNotIn('BEGIN:VEVENT', content(response))
+
+    def test_token_from_the_future(self):
+        response = self.client.get(self.url, {'since': '1000'})
+        self.assertEqual(response['X-Sync-Mode'], 'full')
+        self.assertEqual(content(response).count('BEGIN:VEVENT'), 3)
+
+    def test_invalid_token(self):
+        self.assertEqual(self.client.get(self.url, {'since': 'yesterday'}).status_code, 400)
+
+    def test_unknown_organizer(self):
+        url = reverse('calendar-organizer', args=[self.organizer.pk + 100])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class TestAttendingCalendar(TestCase):
+    def setUp(self):
+        organizer = User.objects.create(username='organizer', password='supersecure')
+        self.attendee = User.objects.create(username='attendee', password='verysafe')
+        self.events = [
+            Event.objects.create(
+                name=f'Event {i}', venue='London', organizer=organizer,
+                date=date.today() + timedelta(days=i), capacity=5,
+            ) for i in range(1, 4)
+        ]
+        for event in self.events[:2]:
+            event.attendees.add(self.attendee)
+        self.url = reverse('calendar-attending', args=[calendar_key(self.attendee)])
+        self.client = Client()
+
+    def test_full(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Sync-Mode'], 'full')
+        self.assertIn('private', response['Cache-Control'])
+        body = content(response)
+        self.assertEqual(body.count('BEGIN:VEVENT'), 2)
+        self.assertNotIn('Event 3', body)
+        self.assertIn('X-WR-CALNAME:Events attended by attendee\r\n', body)
+
+    def test_forged_key(self):
+        url = reverse('calendar-attending', args=[f'{self.attendee.pk}:forged'])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_incremental(self):
+        token = self.client.get(self.url)['X-Sync-Token']
+        self.events[0].date += timedelta(days=1)
+        self.events[0].save()
+        self.events[2].name = 'Not attended'
+        self.events[2].save()
+
+        response = self.client.get(self.url, {'since': token})
+        self.assertEqual(response['X-Sync-Mode'], 'incremental')
+        body = content(response)
+        self.assertEqual(body.count('BEGIN:VEVENT'), 1)
+        self.assertIn(f'DTSTART;VALUE=DATE:{self.events[0].date:%Y%m%d}\r\n', body)
+
+    def test_attendance_changes_resync(self):
+        token = self.client.get(self.url)['X-Sync-Token']
+        self.events[2].attendees.add(self.attendee)
+        response = self.client.get(self.url, {'since': token})
+        self.assertEqual(response['X-Sync-Mode'], 'full')
+        self.assertEqual(content(response).count('BEGIN:VEVENT'), 3)
+
+        token = response['X-Sync-Token']
+        self.events[0].attendees.remove(self.attendee)
+        response = self.client.get(self.url, {'since': token})
+        self.assertEqual(response['X-Sync-Mode'], 'full')
+        self.assertEqual(content(response).count('BEGIN:VEVENT'), 2)
+
+    def test_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.events[1].attendees.remove(self.attendee)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
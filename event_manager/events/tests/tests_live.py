@@ -0,0 +1,160 @@
+import asyncio
+import json
+import threading
+from datetime import date, timedelta
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .. import live
+from ..live import LiveSeatsMiddleware, broker, parse_event_ids
+from ..models import Event
+from ..services import register_attendee
+
+
+def seats(event_id, remaining, updated_at=None):
+    return {
+        'event': event_id, 'capacity': 10, 'attendees': 10 - remaining, 'remaining': remaining,
+        'updated_at': updated_at or timezone.now(),
+    }
+
+
+class TestBroker(SimpleTestCase):
+    async def test_subscribers_share_a_topic(self):
+        first = broker.subscribe({1, 2})
+        second = broker.subscribe({1})
+        try:
+            self.assertEqual(broker.topics[1], {first, second})
+            broker.fan_out([seats(1, 3)])
+            self.assertEqual([row['remaining'] for row in first.take()], [3])
+            self.assertEqual([row['remaining'] for row in second.take()], [3])
+        finally:
+            broker.unsubscribe(first)
+            broker.unsubscribe(second)
+        self.assertEqual(broker.topics, {})
+        self.assertFalse(broker.is_followed(1))
+
+    async def test_publish_from_a_thread(self):
+        subscriber = broker.subscribe({1})
+        try:
+            thread = threading.Thread(target=broker.publish, args=([seats(1, 2), seats(3, 1)],))
+            thread.start()
+            await asyncio.wait_for(subscriber.wake.wait(), 5)
+            thread.join()
+            self.assertEqual([row['event'] for row in subscriber.take()], [1])
+        finally:
+            broker.unsubscribe(subscriber)
+
+    async def test_keeps_the_latest_counts(self):
+        subscriber = broker.subscribe({1})
+        try:
+            newer = timezone.now()
+            broker.fan_out([seats(1, 2)])
+            broker.fan_out([seats(1, 1)])
+            self.assertEqual([row['remaining'] for row in subscriber.take()], [1])
+            # read before the counts already written
+            broker.fan_out([seats(1, 5, newer - timedelta(seconds=1))])
+            self.assertEqual(subscriber.take(), [])
+        finally:
+            broker.unsubscribe(subscriber)
+
+    def test_parse_event_ids(self):
+        self.assertEqual(parse_event_ids(b'events=1,2&events=3'), {1, 2, 3})
+        for query in [b'', b'events=', b'events=one', b'events=' + ','.join(map(str, range(101))).encode()]:
+            with self.subTest(query=query), self.assertRaises(ValueError):
+                parse_event_ids(query)
+
+
+@override_settings(EVENTS_LIVE_SEATS_URL='/event/live/')
+class TestLiveSeats(TransactionTestCase):
+    # the change is published by another thread, which only sees committed data
+
+    def setUp(self):
+        self.organizer = User.objects.create(username='organizer', password='supersecure')
+        self.attendee = User.objects.create(username='attendee', password='verysafe')
+        self.event = Event.objects.create(
+            name='Chess night', venue='London', organizer=self.organizer,
+            date=date.today() + timedelta(days=10), capacity=1,
+        )
+
+    async def passed_on(self, scope, receive, send):
+        await send({'type': 'passed on', 'path': scope['path']})
+
+    async def request(self, query_string, method='GET'):
+        """
+        Start a request to the stream, returning the queue of what is sent and
+        the event disconnecting the client.
+        """
+        sent = asyncio.Queue()
+        disconnected = asyncio.Event()
+
+        async def receive():
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        scope = {'type': 'http', 'method': method, 'path': '/event/live/', 'query_string': query_string}
+        task = asyncio.ensure_future(LiveSeatsMiddleware(self.passed_on)(scope, receive, sent.put))
+        return task, sent, disconnected
+
+    async def next_body(self, sent):
+        message = await asyncio.wait_for(sent.get(), 5)
+        return message['body'].decode()
+
+    def data(self, body):
+        return [json.loads(line[len('data: '):]) for line in body.splitlines() if line.startswith('data: ')]
+
+    async def test_stream(self):
+        task, sent, disconnected = await self.request(f'events={self.event.pk},999'.encode())
+        start = await asyncio.wait_for(sent.get(), 5)
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), start['headers'])
+        self.assertEqual(await self.next_body(sent), 'retry: 5000\n\n')
+        snapshot = await self.next_body(sent)
+        self.assertTrue(snapshot.startswith('event: seats\n'))
+        self.assertEqual(
+            self.data(snapshot), [{'event': self.event.pk, 'capacity': 1, 'attendees': 0, 'remaining': 1}]
+        )
+
+        def register():
+            try:
+                register_attendee(self.event, self.attendee)
+            finally:
+                connection.close()
+
+        await sync_to_async(register)()
+        self.assertEqual(self.data(await self.next_body(sent))[0]['remaining'], 0)
+
+        disconnected.set()
+        await asyncio.wait_for(task, 5)
+        self.assertFalse(broker.is_followed(self.event.pk))
+
+    async def test_heartbeat(self):
+        heartbeat, live.HEARTBEAT_SECONDS = live.HEARTBEAT_SECONDS, 0.01
+        try:
+            task, sent, disconnected = await self.request(f'events={self.event.pk}'.encode())
+            for _ in range(3):
+                await sent.get()
+            self.assertEqual(await self.next_body(sent), ':\n\n')
+            disconnected.set()
+            await asyncio.wait_for(task, 5)
+        finally:
+            live.HEARTBEAT_SECONDS = heartbeat
+
+    async def test_invalid_requests(self):
+        for query_string, method, status in [(b'events=x', 'GET', 400), (b'events=1', 'POST', 405)]:
+            task, sent, _ = await self.request(query_string, method)
+            await asyncio.wait_for(task, 5)
+            self.assertEqual((await sent.get())['status'], status)
+        self.assertEqual(broker.topics, {})
+
+    async def test_other_paths(self):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        await LiveSeatsMiddleware(self.passed_on)({'type': 'http', 'path': '/'}, None, send)
+        self.assertEqual(sent, [{'type': 'passed on', 'path': '/'}])
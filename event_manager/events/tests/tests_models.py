@@ -2,7 +2,8 @@ from datetime import date, timedelta
 
 from django.test import TestCase
 from django.contrib.auth.models import User
-from ..models import Event
+from ..models import Attendance, Event
+from ..services import register_attendee
 
 
 class TestEventModels(TestCase):
@@ -34,4 +35,96 @@ class TestEventModels(TestCase):
         self.assertFalse(self.test_event.is_fully_booked)
 
         self.test_event.attendees.add(self.attendee)
-        self.assertTrue(self.test_event.is_fully_booked)
\ No newline at end of file
+        self.assertTrue(self.test_event.is_fully_booked)
+
+
+class TestAttendeeCount(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create(username='organizer', password='supersecure')
+        self.attendees = [
+            User.objects.create(username=f'attendee{i}', password='verysafe') for i in range(3)
+        ]
+        self.test_event = Event.objects.create(
+            name='Test Event',
+            venue='London',
+            organizer=self.organizer,
+            date=date.today() + timedelta(days=10),
+            capacity=3
+        )
+        self.other_event = Event.objects.create(
+            name='Other Event',
+            venue='Paris',
+            organizer=self.organizer,
+            date=date.today() + timedelta(days=12),
+            capacity=3
+        )
+
+    def assertAttendeeCount(self, event, count):
+        self.assertEqual(Event.objects.get(pk=event.pk).attendee_count, count)
+
+    def test_add_remove_clear(self):
+        self.test_event.attendees.add(*self.attendees)
+        self.assertEqual(self.test_event.attendee_count, 3)
+        self.assertAttendeeCount(self.test_event, 3)
+        self.assertTrue(self.test_event.is_fully_booked)
+
+        self.test_event.attendees.add(self.attendees[0])
+        self.assertAttendeeCount(self.test_event, 3)
+
+        self.test_event.attendees.remove(self.attendees[0])
+        self.assertAttendeeCount(self.test_event, 2)
+        self.assertFalse(self.test_event.is_fully_booked)
+
+        self.test_event.attendees.clear()
+        self.assertAttendeeCount(self.test_event, 0)
+
+    def test_direct_attendance_writes(self):
+        # not followed by the counter, see Event.attendee_count
+        Attendance.objects.bulk_create([Attendance(event=self.test_event, user=user) for user in self.attendees])
+        self.assertAttendeeCount(self.test_event, 0)
+        Event.objects.filter(pk=self.test_event.pk).refresh_attendee_count()
+        self.assertAttendeeCount(self.test_event, 3)
+        Attendance.objects.filter(user=self.attendees[0]).delete()
+        self.assertAttendeeCount(self.test_event, 3)
+        Event.objects.filter(pk=self.test_event.pk).refresh_attendee_count()
+        self.assertAttendeeCount(self.test_event, 2)
+
+    def test_set(self):
+        self.test_event.attendees.set(self.attendees[:2])
+        self.assertAttendeeCount(self.test_event, 2)
+        self.test_event.attendees.set(self.attendees[1:])
+        self.assertAttendeeCount(self.test_event, 2)
+
+    def test_reverse_side(self):
+        attendee = self.attendees[0]
+        attendee.attendees_set.add(self.test_event, self.other_event)
+        self.assertAttendeeCount(self.test_event, 1)
+        self.assertAttendeeCount(self.other_event, 1)
+
+        attendee.attendees_set.remove(self.other_event)
+        self.assertAttendeeCount(self.other_event, 0)
+
+        attendee.attendees_set.clear()
+        self.assertAttendeeCount(self.test_event, 0)
+
+    def test_user_delete(self):
+        self.test_event.attendees.add(*self.attendees)
+        self.attendees[0].delete()
+        self.assertAttendeeCount(self.test_event, 2)
+
+    def test_refresh_attendee_count(self):
+        Attendance.objects.bulk_create([
+            Attendance(event=self.test_event, user=attendee) for attendee in self.attendees
+        ])
+        self.assertAttendeeCount(self.test_event, 0)
+        Event.objects.all().refresh_attendee_count()
+        self.assertAttendeeCount(self.test_event, 3)
+        self.assertAttendeeCount(self.other_event, 0)
+
+    def test_stale_save_keeps_attendee_count(self):
+        stale = Event.objects.get(pk=self.test_event.pk)
+        register_attendee(self.test_event, self.attendees[0])
+        stale.capacity = 5
+        stale.save()
+        self.assertAttendeeCount(self.test_event, 1)
+        self.assertEqual(Event.objects.get(pk=self.test_event.pk).capacity, 5)
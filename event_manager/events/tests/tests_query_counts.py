@@ -0,0 +1,170 @@
+import json
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from users import urls as users_urls
+from .. import urls as events_urls
+from ..feeds import calendar_key
+from ..models import Attendance, Event, EventSeries, WaitlistEntry
+from .utils import QueryCountMixin, normalize_sql
+
+
+class TestQueryCountMixin(QueryCountMixin, TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create(username='organizer', password='supersecure')
+
+    def populate(self, size):
+        Event.objects.all().delete()
+        Event.objects.bulk_create([
+            Event(name=f'Event {i}', venue='London', organizer=self.organizer, date=date.today(), capacity=1)
+            for i in range(size)
+        ])
+
+    def test_constant(self):
+        self.assertConstantQueries(lambda: list(Event.objects.select_related('organizer')), self.populate)
+
+    def test_growing_shows_repeated_queries(self):
+        def names():
+            return [event.organizer.username for event in Event.objects.all()]
+
+        with self.assertRaises(AssertionError) as raised:
+            self.assertConstantQueries(names, self.populate, sizes=[1, 3])
+        message = str(raised.exception)
+        self.assertIn('2 queries with 1 rows but 4 with 3 rows', message)
+        self.assertIn('3 x SELECT "auth_user"."id"', message)
+        self.assertIn('+SELECT "auth_user"."id"', message)
+
+    def test_normalize_sql(self):
+        self.assertEqual(
+            normalize_sql("SELECT 1 FROM t WHERE id = 42 AND name = 'it''s' AND t2.x = 1.5"),
+            "SELECT ? FROM t WHERE id = ? AND name = ? AND t2.x = ?",
+        )
+
+
+class TestViewQueryCounts(QueryCountMixin, TestCase):
+    """
+    Every view of events.urls and users.urls runs as many queries whatever the size of the data it shows.
+    """
+    def setUp(self):
+        self.organizer = User.objects.create(username='organizer', password='supersecure')
+        self.attendee = User.objects.create(username='attendee', password='verysafe')
+        self.series = EventSeries.objects.create(
+            name='Event', venue='London', organizer=self.organizer, frequency=EventSeries.WEEKLY,
+            start_date=date.today() + timedelta(days=1),
+        )
+        self.client = Client()
+        self.covered = set()
+
+    def populate(self, size):
+        """
+        size events of the organizer in a series, the first of them with size
+        attendees and waiting users, the others attended by the attendee.
+        """
+        Event.objects.all().delete()
+        User.objects.exclude(pk__in=[self.organizer.pk, self.attendee.pk]).delete()
+        # the bulk inserts below send no signal to invalidate it
+        cache.clear()
+        users = User.objects.bulk_create([User(username=f'user{i}', email=f'user{i}@example.com') for i in range(size)])
+        users = self.users = list(User.objects.filter(username__in=[user.username for user in users]))
+        Event.objects.bulk_create([
+            Event(
+                name=f'Event {i}',
+                description='Bring a friend',
+                venue='London',
+                organizer=self.organizer,
+                date=date.today() + timedelta(days=1 + i),
+                capacity=100,
+                series=self.series,
+            ) for i in range(size + 1)
+        ])
+        self.event, *others = Event.objects.order_by('date')
+        Attendance.objects.bulk_create(
+            [Attendance(event=self.event, user=user, event_date=self.event.date) for user in users]
+            + [Attendance(event=event, user=self.attendee, event_date=event.date) for event in others]
+        )
+        WaitlistEntry.objects.bulk_create([WaitlistEntry(event=self.event, user=user) for user in users])
+        Event.objects.all().refresh_attendee_count()
+
+    def assertViewQueries(self, name, user=None, method='get', data=None, args=lambda test: []):
+        """
+        Request the view as user at each size, following no redirect.
+        """
+        self.covered.add(name)
+        self.client.logout()
+        if user is not None:
+            self.client.force_login(user)
+
+        def request():
+            response = getattr(self.client, method)(reverse(name, args=args(self)), data or {})
+            if response.streaming:
+                b''.join(response.streaming_content)
+            self.assertLess(response.status_code, 400)
+
+        self.assertConstantQueries(request, self.populate, msg=f'{method.upper()} {name}')
+
+    def test_events_urls(self):
+        event = lambda test: [test.event.pk]  # noqa: E731
+        other = lambda test: [Event.objects.exclude(pk=test.event.pk).first().pk]  # noqa: E731
+
+        self.assertViewQueries('home')
+        self.assertViewQueries('home', self.attendee)
+        self.assertViewQueries('home', self.attendee, data={'q': 'event', 'venue': 'London'})
+        self.assertViewQueries('event-detail', args=event)
+        self.assertViewQueries('event-detail', self.attendee, args=event)
+        self.assertViewQueries('event-create', self.organizer)
+        self.assertViewQueries('event-update', self.organizer, args=event)
+        self.assertViewQueries('event-update', self.organizer, 'post', args=event, data={
+            'name': 'Event 0', 'venue': 'Paris', 'capacity': 100, 'date': date.today() + timedelta(days=1),
+            'apply_to_series': 'on',
+        })
+        self.assertViewQueries('event-delete', self.organizer, args=event)
+        self.assertViewQueries('event-attend', self.attendee, args=event)
+        self.assertViewQueries('event-attend', self.attendee, 'post', args=event)
+        self.assertViewQueries('event-unattend', self.attendee, args=other)
+        self.assertViewQueries('event-unattend', self.attendee, 'post', args=other)
+        self.assertViewQueries('event-roster', self.organizer, args=event)
+        self.assertViewQueries('my-events', self.organizer)
+        self.assertViewQueries('my-registrations', self.attendee)
+        self.assertViewQueries('my-registrations', self.attendee, data={'section': 'past'})
+        self.assertViewQueries('calendar-organizer', args=lambda test: [test.organizer.pk])
+        self.assertViewQueries('calendar-organizer', data={'since': '0'}, args=lambda test: [test.organizer.pk])
+        self.assertViewQueries('calendar-attending', args=lambda test: [calendar_key(test.attendee)])
+        self.assertViewQueries('calendar-attending', data={'since': '0'}, args=lambda test: [calendar_key(test.attendee)])
+        self.assertViewQueries('api-event-list')
+        self.assertViewQueries('api-event-list', self.attendee)
+        self.assertViewQueries('api-event-detail', self.attendee, args=event)
+        self.assertViewQueries('api-my-registrations', self.attendee)
+
+        self.assertBatchRegistrationQueries()
+
+        self.assertCovered(events_urls)
+
+    def assertBatchRegistrationQueries(self):
+        """
+        The organizer registers each user to another of their events.
+        """
+        self.covered.add('api-registrations')
+        self.client.force_login(self.organizer)
+
+        def request():
+            others = Event.objects.exclude(pk=self.event.pk).order_by('pk')
+            data = {'registrations': [
+                {'event': event.pk, 'user': user.username} for event, user in zip(others, self.users)
+            ]}
+            response = self.client.post(reverse('api-registrations'), json.dumps(data), content_type='application/json')
+            self.assertEqual(response.json()['registered'], len(self.users))
+
+        self.assertConstantQueries(request, self.populate, msg='POST api-registrations')
+
+    def test_users_urls(self):
+        self.assertViewQueries('sign-up')
+
+        self.assertCovered(users_urls)
+
+    def assertCovered(self, urls):
+        names = {pattern.name for pattern in urls.urlpatterns}
+        self.assertEqual(names - self.covered, set(), 'Add the new views to this suite')
@@ -0,0 +1,133 @@
+import os
+from datetime import date, timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from ..models import Event
+from ..replicas import PIN_COOKIE, ReplicaMiddleware, ReplicaRouter, current, read_from_replica
+from ..views import EventListView, attend_event
+
+
+@override_settings(EVENTS_READ_REPLICAS=['replica'], EVENTS_REPLICA_PIN_SECONDS=30)
+class TestReplicaRouting(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+
+    def route(self, request, view, models=(Event, User)):
+        """
+        The databases the models are read from while the middleware handles the request with the view.
+        """
+        routed = {}
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            routed.update({model: self.router.db_for_read(model) for model in models})
+            return HttpResponse()
+
+        middleware = ReplicaMiddleware(get_response)
+        response = middleware(request)
+        return routed, response
+
+    def test_replica_view(self):
+        routed, response = self.route(self.factory.get('/'), EventListView.as_view())
+        self.assertEqual(routed, {Event: 'replica', User: 'default'})
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_other_views(self):
+        routed, _ = self.route(self.factory.get('/'), attend_event)
+        self.assertEqual(routed, {Event: 'default', User: 'default'})
+
+    def test_function_view(self):
+        routed, _ = self.route(self.factory.get('/'), read_from_replica(lambda request: HttpResponse()))
+        self.assertEqual(routed[Event], 'replica')
+
+    def test_write_pins_primary(self):
+        routed, response = self.route(self.factory.post('/'), EventListView.as_view())
+        self.assertEqual(routed[Event], 'default')
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 30)
+
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        routed, response = self.route(request, EventListView.as_view())
+        self.assertEqual(routed[Event], 'default')
+
+    def test_outside_requests(self):
+        self.assertIsNone(current.get())
+        self.assertEqual(self.router.db_for_read(Event), 'default')
+
+    def test_writes(self):
+        self.assertEqual(self.router.db_for_write(Event), 'default')
+
+    def test_no_migrations_on_replicas(self):
+        self.assertIs(self.router.allow_migrate('replica', 'events'), False)
+        self.assertIsNone(self.router.allow_migrate('default', 'events'))
+
+    @override_settings(EVENTS_READ_REPLICAS=[])
+    def test_not_used_without_replicas(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ReplicaMiddleware(lambda request: HttpResponse())
+
+
+class TestSQLiteReplica(TransactionTestCase):
+    """
+    A replica in a second SQLite file, refreshed by sync_replicas.
+    """
+    replica_name = os.path.join(settings.BASE_DIR, 'test_replica.sqlite3')
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        connections.databases['replica'] = {**connections.databases['default'], 'NAME': cls.replica_name}
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.databases['replica']
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(cls.replica_name + suffix):
+                os.remove(cls.replica_name + suffix)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.organizer = User.objects.create(username='organizer', password='supersecure')
+        self.attendee = User.objects.create(username='attendee', password='verysafe')
+        self.event = Event.objects.create(
+            name='Chess night', venue='London', organizer=self.organizer,
+            date=date.today() + timedelta(days=10), capacity=5,
+        )
+        with override_settings(EVENTS_READ_REPLICAS=['replica']):
+            call_command('sync_replicas', stdout=StringIO())
+        self.event.name = 'Chess evening'
+        self.event.save()
+
+    @override_settings(EVENTS_READ_REPLICAS=['replica'])
+    def test_reads_from_replica_until_written(self):
+        client = Client()
+        client.force_login(self.attendee)
+        self.assertContains(client.get(reverse('home')), 'Chess night')
+        self.assertContains(client.get(reverse('event-detail', args=[self.event.pk])), 'Chess night')
+
+        client.post(reverse('event-attend', args=[self.event.pk]))
+        self.assertIn(PIN_COOKIE, client.cookies)
+        response = client.get(reverse('home'))
+        self.assertContains(response, 'Chess evening')
+        self.assertContains(response, 'You are attending')
+
+    def test_primary_without_replicas(self):
+        self.assertContains(Client().get(reverse('home')), 'Chess evening')
+
+    def test_sync_requires_replicas(self):
+        with self.assertRaisesMessage(CommandError, 'No read replica configured'):
+            call_command('sync_replicas', stdout=StringIO())
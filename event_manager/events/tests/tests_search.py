@@ -0,0 +1,102 @@
+from datetime import date, timedelta
+
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.urls import reverse
+
+from ..models import Event
+from ..search import search_events, tokenize
+
+
+class TestSearch(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create(username='organizer', password='supersecure')
+        self.jazz = self.create_event('Jazz night', 'Live music by the river', 'Blue Note')
+        self.rock = self.create_event('Rock concert', 'With a jazz band opening', 'Stadium')
+        self.brunch = self.create_event('Sunday brunch', 'Pancakes', 'Café Crème')
+
+    def create_event(self, name, description, venue):
+        return Event.objects.create(
+            name=name,
+            description=description,
+            venue=venue,
+            organizer=self.organizer,
+            date=date.today() + timedelta(days=10),
+        )
+
+    def search(self, query):
+        return list(search_events(Event.objects.all(), query).order_by('search_rank', 'pk'))
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize('Jazz "night" OR -rock*'), ['jazz', 'night', 'or', 'rock'])
+
+    def test_ranked_by_field(self):
+        self.assertEqual(self.search('jazz'), [self.jazz, self.rock])
+
+    def test_all_words_and_prefixes(self):
+        self.assertEqual(self.search('jaz nig'), [self.jazz])
+        self.assertEqual(self.search('stadium'), [self.rock])
+
+    def test_diacritics(self):
+        self.assertEqual(self.search('cafe creme'), [self.brunch])
+
+    def test_empty_query(self):
+        self.assertEqual(self.search('"*'), [])
+
+    def test_index_follows_updates(self):
+        self.jazz.name = 'Blues night'
+        self.jazz.save()
+        self.assertEqual(self.search('blues'), [self.jazz])
+        self.assertEqual(self.search('jazz'), [self.rock])
+
+    def test_index_follows_deletes(self):
+        self.rock.delete()
+        self.assertEqual(self.search('jazz'), [self.jazz])
+
+    def test_no_like_scan(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.search('jazz')
+        self.assertNotIn('LIKE', queries[0]['sql'].upper())
+        self.assertIn('MATCH', queries[0]['sql'].upper())
+
+
+class TestSearchViews(TestCase):
+    def setUp(self):
+        organizer = User.objects.create(username='organizer', password='supersecure')
+        for i in range(5):
+            Event.objects.create(
+                name=f'Jazz night {i}' if i % 2 else f'Concert {i}',
+                description='' if i % 2 else 'With a jazz band',
+                venue='London',
+                organizer=organizer,
+                date=date.today() + timedelta(days=10 + i),
+            )
+        # bm25 does not rank words found in most events, so most must not match
+        for i in range(10):
+            Event.objects.create(name=f'Brunch {i}', venue='London', organizer=organizer, date=date.today() + timedelta(days=1))
+        self.client = Client()
+
+    def test_home_paginates_ranked_results(self):
+        response = self.client.get(reverse('home'), {'q': 'jazz', 'page_size': 3})
+        names = [event.name for event in response.context['events']]
+        response = self.client.get(reverse('home'), {
+            'q': 'jazz', 'page_size': 3, 'after': response.context['page_obj'].next_cursor,
+        })
+        names += [event.name for event in response.context['events']]
+        self.assertFalse(response.context['page_obj'].has_next())
+        self.assertEqual(names[:2], ['Jazz night 1', 'Jazz night 3'])
+        self.assertEqual(sorted(names[2:]), ['Concert 0', 'Concert 2', 'Concert 4'])
+
+    def test_home_search_keeps_query_in_page_links(self):
+        response = self.client.get(reverse('home'), {'q': 'jazz', 'page_size': 3})
+        self.assertContains(response, 'q=jazz&amp;page_size=3&amp;after=')
+
+    def test_api_search(self):
+        response = self.client.get(reverse('api-event-list'), {'q': 'jazz', 'page_size': 4})
+        data = response.json()
+        names = [event['name'] for event in data['results']]
+        self.assertEqual(names[:2], ['Jazz night 1', 'Jazz night 3'])
+        response = self.client.get(data['next'])
+        self.assertEqual(len(response.json()['results']), 1)
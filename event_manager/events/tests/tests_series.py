@@ -0,0 +1,262 @@
+from datetime import date, timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from jobs.models import Job
+from ..models import Attendance, Event, EventChangeCounter, EventSeries, EventTombstone, WaitlistEntry
+from ..search import search_events
+from ..series import materialize, start_series, window_end
+
+
+class TestEventSeries(TestCase):
+    def series(self, **kwargs):
+        return EventSeries(**{
+            'name': 'Meetup', 'frequency': EventSeries.WEEKLY, 'start_date': date(2030, 1, 31), **kwargs,
+        })
+
+    def test_weekly(self):
+        series = self.series(interval=2)
+        self.assertEqual([series.occurrence_date(i) for i in range(3)], [
+            date(2030, 1, 31), date(2030, 2, 14), date(2030, 2, 28),
+        ])
+
+    def test_monthly_keeps_the_day(self):
+        series = self.series(frequency=EventSeries.MONTHLY)
+        self.assertEqual([series.occurrence_date(i) for i in range(4)], [
+            date(2030, 1, 31), date(2030, 2, 28), date(2030, 3, 31), date(2030, 4, 30),
+        ])
+        self.assertEqual(series.occurrence_date(13), date(2031, 2, 28))
+
+    def test_end(self):
+        self.assertIsNone(self.series(count=2).scheduled_date(2))
+        self.assertEqual(self.series(count=2).scheduled_date(1), date(2030, 2, 7))
+        self.assertIsNone(self.series(until=date(2030, 2, 6)).scheduled_date(1))
+        self.assertEqual(self.series().scheduled_date(1000), date(2030, 1, 31) + timedelta(weeks=1000))
+
+
+class TestMaterialize(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create(username='organizer', password='supersecure')
+
+    def start(self, **kwargs):
+        series = EventSeries(**{
+            'name': 'Chess night', 'venue': 'London', 'capacity': 5, 'organizer': self.organizer,
+            'frequency': EventSeries.WEEKLY, 'start_date': date.today() + timedelta(days=1), **kwargs,
+        })
+        return series, start_series(series)
+
+    def test_rolling_window(self):
+        series, events = self.start()
+        self.assertEqual(len(events), (window_end() - series.start_date).days // 7 + 1)
+        self.assertEqual(
+            list(series.occurrences.order_by('date').values_list('date', flat=True)),
+            [series.start_date + timedelta(weeks=i) for i in range(len(events))],
+        )
+        self.assertEqual({event.change_seq for event in events}, {EventChangeCounter.current()})
+        self.assertEqual(events[0].name, 'Chess night')
+        self.assertEqual(search_events(Event.objects.all(), 'chess').count(), len(events))
+
+        self.assertEqual(materialize(), [])
+        later = materialize(until=window_end() + timedelta(weeks=2))
+        self.assertEqual([event.date for event in later], [
+            series.start_date + timedelta(weeks=i) for i in range(len(events), len(events) + 2)
+        ])
+        series.refresh_from_db()
+        self.assertEqual(series.materialized_count, len(events) + 2)
+
+    def test_ends(self):
+        series, events = self.start(count=3)
+        self.assertEqual(len(events), 3)
+        series.refresh_from_db()
+        self.assertIsNone(series.next_date)
+        self.assertEqual(materialize(until=window_end() + timedelta(weeks=10)), [])
+
+    def test_first_occurrence_after_the_window(self):
+        _, events = self.start(start_date=window_end() + timedelta(days=30), frequency=EventSeries.MONTHLY)
+        self.assertEqual(len(events), 1)
+
+    def test_skips_past_occurrences(self):
+        # a series the command did not run for
+        start = date.today() - timedelta(weeks=2)
+        series = EventSeries.objects.create(
+            name='Chess night', venue='London', organizer=self.organizer, frequency=EventSeries.WEEKLY,
+            start_date=start, count=4, next_date=start,
+        )
+        self.assertEqual([event.date for event in materialize()], [date.today() + timedelta(weeks=1)])
+        series.refresh_from_db()
+        self.assertEqual(series.materialized_count, 4)
+
+    def test_command(self):
+        self.start(count=10)
+        out = StringIO()
+        call_command('materialize_series', '--days', '1000', stdout=out)
+        self.assertIn('Created', out.getvalue())
+        self.assertEqual(Event.objects.count(), 10)
+
+
+class TestSeriesViews(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create(username='organizer', password='supersecure')
+        self.attendee = User.objects.create(username='attendee', password='verysafe', email='attendee@example.com')
+        self.client.force_login(self.organizer)
+
+    def create(self, **data):
+        return self.client.post(reverse('event-create'), {
+            'name': 'Chess night', 'venue': 'London', 'capacity': 1, 'date': date.today() + timedelta(days=3),
+            'repeat': 'weekly', 'count': 4, **data,
+        })
+
+    def test_create_series(self):
+        response = self.create()
+        events = list(Event.objects.order_by('date'))
+        self.assertRedirects(response, reverse('event-detail', args=[events[0].pk]))
+        self.assertEqual([event.date for event in events], [
+            date.today() + timedelta(days=3, weeks=i) for i in range(4)
+        ])
+        self.assertEqual({event.series.organizer for event in events}, {self.organizer})
+
+    def test_create_single_event(self):
+        self.create(repeat='')
+        self.assertEqual(Event.objects.get().series, None)
+
+    def test_create_invalid_series(self):
+        response = self.create(until=date.today() + timedelta(days=30))
+        self.assertFormError(response, 'form', None, 'End the series on a date or after a number of events, not both.')
+        response = self.create(count='', until=date.today())
+        self.assertFormError(response, 'form', 'until', 'The series cannot end before it starts.')
+        self.assertFalse(Event.objects.exists())
+
+    def test_update_later_occurrences(self):
+        self.create()
+        first, second, third, fourth = Event.objects.order_by('date')
+        third.attendees.add(self.attendee)
+        waiting = User.objects.create(username='waiting', password='verysafe')
+        WaitlistEntry.objects.create(event=third, user=waiting)
+        change_seq = EventChangeCounter.current()
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('event-update', args=[second.pk]), {
+                'name': 'Chess evening', 'venue': 'Paris', 'capacity': 2, 'date': second.date,
+                'apply_to_series': 'on',
+            })
+        event_updates = [
+            query['sql'] for query in queries if query['sql'].startswith('UPDATE "events_event" SET "name"')
+        ]
+        # the edited event and its later occurrences
+        self.assertEqual(len(event_updates), 2)
+
+        events = list(Event.objects.order_by('date'))
+        self.assertEqual([event.name for event in events], ['Chess night'] + ['Chess evening'] * 3)
+        self.assertEqual([event.venue for event in events], ['London'] + ['Paris'] * 3)
+        self.assertGreater(events[3].change_seq, change_seq)
+        self.assertEqual(EventSeries.objects.get().venue, 'Paris')
+        self.assertTrue(Attendance.objects.filter(event=third, user=waiting).exists())
+        # the later occurrences are only notified when attended
+        self.assertEqual(
+            sorted(job.payload['event_id'] for job in Job.objects.filter(kind='events.changed')), [second.pk, third.pk],
+        )
+
+    def test_update_capacity_keeps_change_seq(self):
+        self.create()
+        first, second, *_ = Event.objects.order_by('date')
+        change_seq = EventChangeCounter.current()
+        self.client.post(reverse('event-update', args=[second.pk]), {
+            'name': 'Chess night', 'venue': 'London', 'capacity': 3, 'date': second.date, 'apply_to_series': 'on',
+        })
+        self.assertEqual(list(Event.objects.order_by('date').values_list('capacity', flat=True)), [1, 3, 3, 3])
+        self.assertEqual(EventChangeCounter.current(), change_seq)
+
+    def test_update_single_occurrence(self):
+        self.create()
+        first, second, *_ = Event.objects.order_by('date')
+        self.client.post(reverse('event-update', args=[first.pk]), {
+            'name': 'Chess evening', 'venue': 'London', 'capacity': 1, 'date': first.date,
+        })
+        self.assertEqual(Event.objects.filter(name='Chess evening').get(), first)
+        self.assertEqual(EventSeries.objects.get().name, 'Chess night')
+
+    def test_option_only_for_series(self):
+        self.create(repeat='')
+        response = self.client.get(reverse('event-update', args=[Event.objects.get().pk]))
+        self.assertNotIn('apply_to_series', response.context['form'].fields)
+
+    def test_delete_single_occurrence(self):
+        self.create(count='')
+        first, second, *_ = events = list(Event.objects.order_by('date'))
+        response = self.client.get(reverse('event-delete', args=[second.pk]))
+        self.assertContains(response, 'name="end_series"')
+        self.client.post(reverse('event-delete', args=[second.pk]))
+        self.assertEqual(Event.objects.count(), len(events) - 1)
+        self.assertIsNotNone(EventSeries.objects.get().next_date)
+
+    def test_end_series(self):
+        self.create(count='')
+        first, second, *_ = events = list(Event.objects.order_by('date'))
+        response = self.client.post(reverse('event-delete', args=[second.pk]), {'end_series': 'on'})
+        self.assertRedirects(response, reverse('home'))
+        self.assertEqual(list(Event.objects.all()), [first])
+        series = EventSeries.objects.get()
+        self.assertEqual(series.until, second.date - timedelta(days=1))
+        self.assertIsNone(series.next_date)
+        self.assertEqual(materialize(until=window_end() + timedelta(weeks=10)), [])
+        self.assertEqual(search_events(Event.objects.all(), 'chess').count(), 1)
+        self.assertEqual(EventTombstone.objects.count(), len(events) - 1)
+
+    def test_no_option_for_single_events(self):
+        self.create(repeat='')
+        response = self.client.get(reverse('event-delete', args=[Event.objects.get().pk]))
+        self.assertNotContains(response, 'name="end_series"')
+
+
+class TestSeriesAdmin(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='supersecure')
+        self.client.force_login(self.admin)
+
+    def data(self, **data):
+        return {
+            'name': 'Chess night', 'description': '', 'venue': 'London', 'capacity': 5, 'organizer': self.admin.pk,
+            'frequency': EventSeries.WEEKLY, 'interval': 1, 'start_date': date.today() + timedelta(days=1),
+            'until': '', 'count': '', **data,
+        }
+
+    def test_add_starts_the_series(self):
+        self.client.post(reverse('admin:events_eventseries_add'), self.data())
+        series = EventSeries.objects.get()
+        self.assertEqual(series.occurrences.count(), series.materialized_count)
+        self.assertGreater(series.materialized_count, 0)
+
+    def test_end(self):
+        self.client.post(reverse('admin:events_eventseries_add'), self.data())
+        series = EventSeries.objects.get()
+        until = series.start_date + timedelta(weeks=series.materialized_count)
+        self.client.post(reverse('admin:events_eventseries_change', args=[series.pk]), self.data(until=until))
+        series.refresh_from_db()
+        self.assertEqual(series.next_date, until)
+        self.assertEqual(len(materialize(until=window_end() + timedelta(weeks=10))), 1)
+
+    def test_shorten(self):
+        self.client.post(reverse('admin:events_eventseries_add'), self.data())
+        series = EventSeries.objects.get()
+        self.client.post(reverse('admin:events_eventseries_change', args=[series.pk]), self.data(count=2))
+        series.refresh_from_db()
+        self.assertEqual((series.materialized_count, series.next_date), (2, None))
+        self.assertEqual(list(series.occurrences.order_by('date').values_list('date', flat=True)), [
+            series.start_date, series.start_date + timedelta(weeks=1),
+        ])
+
+    def test_schedule_read_only_once_created(self):
+        self.client.post(reverse('admin:events_eventseries_add'), self.data())
+        series = EventSeries.objects.get()
+        self.client.post(
+            reverse('admin:events_eventseries_change', args=[series.pk]),
+            self.data(frequency=EventSeries.MONTHLY, interval=2),
+        )
+        series.refresh_from_db()
+        self.assertEqual((series.frequency, series.interval), (EventSeries.WEEKLY, 1))
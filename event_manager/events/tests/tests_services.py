@@ -0,0 +1,245 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.contrib.auth.models import User
+
+from jobs.models import Job
+
+from ..models import Attendance, Event, WaitlistEntry
+from ..services import (
+    RegistrationResult, join_waitlist, leave_waitlist, promote_waitlist, register_attendee, register_attendees,
+    unregister_attendee, waitlist_position,
+)
+
+
+class TestRegisterAttendee(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create(username='organizer', password='supersecure')
+        self.attendee = User.objects.create(username='attendee', password='verysafe')
+        self.test_event = Event.objects.create(
+            name='Test Event',
+            venue='London',
+            organizer=self.organizer,
+            date=date.today() + timedelta(days=10),
+            capacity=1
+        )
+
+    def test_registered(self):
+        result = register_attendee(self.test_event, self.attendee)
+        self.assertIs(result, RegistrationResult.REGISTERED)
+        self.assertTrue(self.test_event.attendees.filter(pk=self.attendee.pk).exists())
+        self.assertEqual(Event.objects.get(pk=self.test_event.pk).attendee_count, 1)
+
+    def test_already_registered(self):
+        register_attendee(self.test_event, self.attendee)
+        result = register_attendee(self.test_event, self.attendee)
+        self.assertIs(result, RegistrationResult.ALREADY_REGISTERED)
+        self.assertEqual(Event.objects.get(pk=self.test_event.pk).attendee_count, 1)
+
+    def test_full(self):
+        register_attendee(self.test_event, self.organizer)
+        result = register_attendee(self.test_event, self.attendee)
+        self.assertIs(result, RegistrationResult.FULL)
+        self.assertFalse(self.test_event.attendees.filter(pk=self.attendee.pk).exists())
+        self.assertEqual(Event.objects.get(pk=self.test_event.pk).attendee_count, 1)
+
+
+class TestWaitlist(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create(username='organizer', password='supersecure')
+        self.attendee = User.objects.create(username='attendee', password='verysafe')
+        User.objects.bulk_create([User(username=f'waiting{i}') for i in range(5)])
+        self.waiting = list(User.objects.filter(username__startswith='waiting').order_by('pk'))
+        self.test_event = Event.objects.create(
+            name='Test Event',
+            venue='London',
+            organizer=self.organizer,
+            date=date.today() + timedelta(days=10),
+            capacity=1
+        )
+        register_attendee(self.test_event, self.attendee)
+
+    def reload(self):
+        return Event.objects.get(pk=self.test_event.pk)
+
+    def test_join_full_event(self):
+        for position, user in enumerate(self.waiting, 1):
+            self.assertEqual(join_waitlist(self.test_event, user), position)
+        self.assertEqual(waitlist_position(self.test_event, self.waiting[2]), 3)
+        self.assertEqual(self.reload().attendee_count, 1)
+
+    def test_join_twice(self):
+        join_waitlist(self.test_event, self.waiting[0])
+        self.assertEqual(join_waitlist(self.test_event, self.waiting[0]), 1)
+        self.assertEqual(WaitlistEntry.objects.count(), 1)
+
+    def test_join_as_attendee(self):
+        self.assertIsNone(join_waitlist(self.test_event, self.attendee))
+        self.assertFalse(WaitlistEntry.objects.exists())
+
+    def test_join_event_with_free_seats(self):
+        unregister_attendee(self.test_event, self.attendee)
+        self.assertIsNone(join_waitlist(self.test_event, self.waiting[0]))
+        self.assertTrue(self.test_event.attendees.filter(pk=self.waiting[0].pk).exists())
+
+    def test_position_when_not_waiting(self):
+        self.assertIsNone(waitlist_position(self.test_event, self.waiting[0]))
+
+    def test_position_single_query(self):
+        join_waitlist(self.test_event, self.waiting[0])
+        with self.assertNumQueries(1):
+            waitlist_position(self.test_event, self.waiting[0])
+
+    def test_leave(self):
+        join_waitlist(self.test_event, self.waiting[0])
+        join_waitlist(self.test_event, self.waiting[1])
+        self.assertTrue(leave_waitlist(self.test_event, self.waiting[0]))
+        self.assertFalse(leave_waitlist(self.test_event, self.waiting[0]))
+        self.assertEqual(waitlist_position(self.test_event, self.waiting[1]), 1)
+
+    def test_unregister_promotes_head(self):
+        for user in self.waiting:
+            join_waitlist(self.test_event, user)
+        self.assertTrue(unregister_attendee(self.test_event, self.attendee))
+
+        event = self.reload()
+        self.assertEqual(list(event.attendees.all()), [self.waiting[0]])
+        self.assertEqual(event.attendee_count, 1)
+        self.assertEqual(waitlist_position(event, self.waiting[1]), 1)
+
+    def test_unregister_not_attending(self):
+        self.assertFalse(unregister_attendee(self.test_event, self.waiting[0]))
+        self.assertEqual(self.reload().attendee_count, 1)
+
+    def test_promote_in_batches(self):
+        for user in self.waiting:
+            join_waitlist(self.test_event, user)
+        Event.objects.filter(pk=self.test_event.pk).update(capacity=5)
+
+        promoted = promote_waitlist(self.test_event, batch_size=2)
+        self.assertEqual(promoted, [user.pk for user in self.waiting[:4]])
+        event = self.reload()
+        self.assertEqual(event.attendee_count, 5)
+        self.assertEqual(event.attendees.count(), 5)
+        self.assertEqual(waitlist_position(event, self.waiting[4]), 1)
+
+    def test_promote_skips_attendees(self):
+        join_waitlist(self.test_event, self.waiting[0])
+        join_waitlist(self.test_event, self.waiting[1])
+        Event.objects.filter(pk=self.test_event.pk).update(capacity=3)
+        # added by an admin before the waitlist was promoted
+        self.test_event.attendees.add(self.waiting[0])
+
+        self.assertEqual(promote_waitlist(self.test_event), [self.waiting[1].pk])
+        self.assertFalse(WaitlistEntry.objects.exists())
+        self.assertEqual(self.reload().attendee_count, 3)
+
+
+class TestRegisterAttendees(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create(username='organizer', password='supersecure')
+        User.objects.bulk_create([User(username=f'attendee{i}') for i in range(5)])
+        self.users = list(User.objects.exclude(pk=self.organizer.pk).values_list('pk', flat=True))
+        self.events = [
+            Event.objects.create(
+                name=f'Event {i}', venue='London', organizer=self.organizer,
+                date=date.today() + timedelta(days=10 + i), capacity=3,
+            ) for i in range(2)
+        ]
+
+    def test_batch(self):
+        first, second = (event.pk for event in self.events)
+        self.events[0].attendees.add(self.users[0])
+        pairs = [(first, user_id) for user_id in self.users] + [(second, self.users[0]), (second, self.users[0])]
+
+        results = register_attendees(pairs)
+        self.assertEqual(results, [
+            RegistrationResult.ALREADY_REGISTERED, RegistrationResult.REGISTERED, RegistrationResult.REGISTERED,
+            RegistrationResult.FULL, RegistrationResult.FULL,
+            RegistrationResult.REGISTERED, RegistrationResult.ALREADY_REGISTERED,
+        ])
+        self.assertEqual(
+            list(Event.objects.order_by('pk').values_list('attendee_count', flat=True)), [3, 1]
+        )
+        attendance = Attendance.objects.get(event_id=second)
+        self.assertEqual(attendance.event_date, self.events[1].date)
+        self.assertEqual(Job.objects.filter(kind='events.registered').count(), 3)
+
+    def test_unknown_event(self):
+        results = register_attendees([(self.events[0].pk, self.users[0]), (0, self.users[1])])
+        self.assertEqual(results, [RegistrationResult.REGISTERED, RegistrationResult.UNKNOWN_EVENT])
+
+    def test_all_or_nothing(self):
+        pairs = [(self.events[0].pk, user_id) for user_id in self.users]
+        results = register_attendees(pairs, all_or_nothing=True)
+        self.assertEqual(results, [RegistrationResult.ROLLED_BACK] * 3 + [RegistrationResult.FULL] * 2)
+        self.assertFalse(Attendance.objects.exists())
+        self.assertEqual(Event.objects.get(pk=self.events[0].pk).attendee_count, 0)
+
+        results = register_attendees(pairs[:3], all_or_nothing=True)
+        self.assertEqual(results, [RegistrationResult.REGISTERED] * 3)
+
+    def test_queries(self):
+        pairs = [(event.pk, user_id) for event in self.events for user_id in self.users]
+        # lock (and read) the events, attendances, insert, counters, jobs, in a savepoint
+        with self.assertNumQueries(8):
+            register_attendees(pairs)
+
+
+class TestConcurrentRegistrations(TransactionTestCase):
+    users = 300
+    workers = 50
+
+    def setUp(self):
+        self.organizer = User.objects.create(username='organizer', password='supersecure')
+        User.objects.bulk_create([User(username=f'attendee{i}') for i in range(self.users)])
+        self.attendees = list(User.objects.exclude(pk=self.organizer.pk))
+        self.test_event = Event.objects.create(
+            name='Popular Event',
+            venue='London',
+            organizer=self.organizer,
+            date=date.today() + timedelta(days=10),
+            capacity=100
+        )
+
+    def register_in_thread(self, user, barrier):
+        try:
+            barrier.wait(timeout=30)
+            return register_attendee(Event.objects.get(pk=self.test_event.pk), user)
+        finally:
+            connection.close()
+
+    def test_capacity_never_exceeded(self):
+        # every attendee tries twice so that duplicate registrations race as well
+        users = self.attendees * 2
+        barrier = threading.Barrier(self.workers)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = list(executor.map(lambda user: self.register_in_thread(user, barrier), users))
+
+        event = Event.objects.get(pk=self.test_event.pk)
+        attendees = event.attendees.count()
+        self.assertEqual(results.count(RegistrationResult.REGISTERED), event.capacity)
+        self.assertEqual(attendees, event.capacity)
+        self.assertEqual(event.attendee_count, attendees)
+
+    def test_batches_never_exceed_capacity(self):
+        batches = [self.attendees[i:i + 15] for i in range(0, len(self.attendees), 15)]
+        barrier = threading.Barrier(len(batches))
+
+        def register_batch(users):
+            try:
+                barrier.wait(timeout=30)
+                return register_attendees([(self.test_event.pk, user.pk) for user in users])
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=len(batches)) as executor:
+            results = [result for batch in executor.map(register_batch, batches) for result in batch]
+
+        event = Event.objects.get(pk=self.test_event.pk)
+        self.assertEqual(results.count(RegistrationResult.REGISTERED), event.capacity)
+        self.assertEqual(event.attendees.count(), event.capacity)
+        self.assertEqual(event.attendee_count, event.capacity)
@@ -0,0 +1,153 @@
+from datetime import date, timedelta
+from smtplib import SMTPException
+
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.test import TestCase, Client, override_settings
+from django.utils import timezone
+from django.contrib.auth.models import User
+from django.urls import reverse
+
+from jobs import queue
+from jobs.models import Job
+from .. import tasks
+from ..models import Event, WaitlistEntry
+from ..services import join_waitlist, register_attendee, unregister_attendee
+
+
+class FailingEmailBackend(locmem.EmailBackend):
+    """
+    The test backend, refusing the messages to failing@example.com.
+    """
+    def send_messages(self, messages):
+        for message in messages:
+            if 'failing@example.com' in message.to:
+                raise SMTPException('Recipient refused')
+            super().send_messages([message])
+        return len(messages)
+
+
+class TestEventJobs(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create(username='organizer', password='supersecure')
+        self.attendee = User.objects.create(username='attendee', password='verysafe', email='attendee@example.com')
+        self.test_event = Event.objects.create(
+            name='Test Event',
+            venue='London',
+            organizer=self.organizer,
+            date=date.today() + timedelta(days=10),
+            capacity=1
+        )
+
+    def run_jobs(self):
+        for kind in ['events.registered', 'events.unregistered', 'events.changed']:
+            queue.run_batch(kind)
+
+    def test_registration_confirmation(self):
+        register_attendee(self.test_event, self.attendee)
+        self.assertEqual(Job.objects.get().kind, 'events.registered')
+        self.assertEqual(mail.outbox, [])
+        self.run_jobs()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['attendee@example.com'])
+        self.assertEqual(mail.outbox[0].subject, 'You are attending Test Event')
+
+    def test_unregistration_confirmation(self):
+        register_attendee(self.test_event, self.attendee)
+        unregister_attendee(self.test_event, self.attendee)
+        self.run_jobs()
+        self.assertEqual(
+            [message.subject for message in mail.outbox],
+            ['You are attending Test Event', 'You are no longer attending Test Event'],
+        )
+
+    def test_promotion_confirmation(self):
+        register_attendee(self.test_event, self.organizer)
+        join_waitlist(self.test_event, self.attendee)
+        unregister_attendee(self.test_event, self.organizer)
+        self.assertFalse(WaitlistEntry.objects.exists())
+        self.run_jobs()
+        self.assertEqual([message.to for message in mail.outbox], [['attendee@example.com']])
+
+    def test_date_change_notifies_attendees(self):
+        register_attendee(self.test_event, self.attendee)
+        self.run_jobs()
+        mail.outbox = []
+        client = Client()
+        client.force_login(self.organizer)
+        new_date = date.today() + timedelta(days=20)
+        client.post(reverse('event-update', args=[self.test_event.id]), {
+            'name': self.test_event.name,
+            'venue': self.test_event.venue,
+            'capacity': self.test_event.capacity,
+            'date': new_date,
+        })
+        job = Job.objects.get(kind='events.changed')
+        self.assertEqual(job.payload['changes'], {'date': [str(self.test_event.date), str(new_date)]})
+
+        self.run_jobs()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, 'Test Event has changed')
+        self.assertIn(f'- date: {self.test_event.date} -> {new_date}', mail.outbox[0].body)
+
+    def test_unchanged_event_notifies_nobody(self):
+        client = Client()
+        client.force_login(self.organizer)
+        client.post(reverse('event-update', args=[self.test_event.id]), {
+            'name': self.test_event.name,
+            'venue': self.test_event.venue,
+            'capacity': 2,
+            'date': self.test_event.date,
+        })
+        self.assertFalse(Job.objects.filter(kind='events.changed').exists())
+
+
+@override_settings(EMAIL_BACKEND='events.tests.tests_tasks.FailingEmailBackend')
+class TestFailingJobs(TestCase):
+    """
+    A job failing in a batch does not send again what the batch already sent when it is retried.
+    """
+    def setUp(self):
+        self.organizer = User.objects.create(username='organizer', password='supersecure')
+        self.attendee = User.objects.create(username='attendee', password='verysafe', email='attendee@example.com')
+        self.failing = User.objects.create(username='failing', password='verysafe', email='failing@example.com')
+        self.events = [
+            Event.objects.create(
+                name=f'Event {i}', venue='London', organizer=self.organizer,
+                date=date.today() + timedelta(days=10), capacity=2,
+            ) for i in range(2)
+        ]
+
+    def retry(self, kind):
+        Job.objects.filter(status=Job.PENDING).update(run_after=timezone.now())
+        return queue.run_batch(kind)
+
+    def test_registrations(self):
+        register_attendee(self.events[0], self.attendee)
+        register_attendee(self.events[0], self.failing)
+        self.assertEqual(queue.run_batch('events.registered'), (1, 1))
+        self.assertEqual([message.to for message in mail.outbox], [['attendee@example.com']])
+
+        self.assertEqual(self.retry('events.registered'), (0, 1))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_event_changes(self):
+        chunk_size, tasks.EMAIL_CHUNK_SIZE = tasks.EMAIL_CHUNK_SIZE, 1
+        self.addCleanup(setattr, tasks, 'EMAIL_CHUNK_SIZE', chunk_size)
+        self.events[0].attendees.add(self.attendee)
+        self.events[1].attendees.add(self.attendee)
+        self.events[1].attendees.add(self.failing)
+        queue.enqueue_many('events.changed', [
+            ({'event_id': event.pk, 'changes': {'venue': ['London', 'Paris']}}, None) for event in self.events
+        ])
+
+        # the second job fails on its second chunk
+        self.assertEqual(queue.run_batch('events.changed'), (1, 1))
+        self.assertEqual(len(mail.outbox), 2)
+
+        User.objects.filter(pk=self.failing.pk).update(email='fixed@example.com')
+        self.assertEqual(self.retry('events.changed'), (1, 0))
+        self.assertEqual(
+            [message.to for message in mail.outbox],
+            [['attendee@example.com'], ['attendee@example.com'], ['fixed@example.com']],
+        )
@@ -1,8 +1,10 @@
 from django.test import SimpleTestCase
 from django.urls import reverse, resolve
 
+from .. import api, feeds
 from ..views import \
-    EventListView, EventDetailView, EventCreateView, EventUpdateView, EventDeleteView, attend_event, OrganizerEventList
+    EventListView, EventDetailView, EventCreateView, EventUpdateView, EventDeleteView, attend_event, OrganizerEventList, \
+    EventRosterView, RegistrationListView, unattend_event
 
 
 class TestEventUrls(SimpleTestCase):
@@ -30,6 +32,43 @@ class TestEventUrls(SimpleTestCase):
         url = reverse('event-attend', args=[1])
         self.assertEqual(resolve(url).func, attend_event)
 
+    def test_event_unattend_url(self):
+        url = reverse('event-unattend', args=[1])
+        self.assertEqual(resolve(url).func, unattend_event)
+
     def test_my_events_url(self):
         url = reverse('my-events')
         self.assertEqual(resolve(url).func.view_class, OrganizerEventList)
+
+    def test_api_event_list_url(self):
+        url = reverse('api-event-list')
+        self.assertEqual(resolve(url).func, api.event_list)
+
+    def test_api_event_detail_url(self):
+        url = reverse('api-event-detail', args=[1])
+        self.assertEqual(resolve(url).func, api.event_detail)
+
+    def test_api_my_registrations_url(self):
+        url = reverse('api-my-registrations')
+        self.assertEqual(resolve(url).func, api.my_registrations)
+
+    def test_event_roster_url(self):
+        url = reverse('event-roster', args=[1])
+        self.assertEqual(resolve(url).func.view_class, EventRosterView)
+
+    def test_my_registrations_url(self):
+        url = reverse('my-registrations')
+        self.assertEqual(resolve(url).func.view_class, RegistrationListView)
+
+    def test_organizer_calendar_url(self):
+        url = reverse('calendar-organizer', args=[1])
+        self.assertEqual(url, '/calendar/organizer/1.ics')
+        self.assertEqual(resolve(url).func, feeds.organizer_calendar)
+
+    def test_attending_calendar_url(self):
+        url = reverse('calendar-attending', args=['1:signature'])
+        self.assertEqual(resolve(url).func, feeds.attending_calendar)
+
+    def test_api_registrations_url(self):
+        url = reverse('api-registrations')
+        self.assertEqual(resolve(url).func, api.registrations)
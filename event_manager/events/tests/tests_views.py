@@ -1,10 +1,11 @@
 from datetime import date, timedelta
 
+from django.core.cache import cache
 from django.test import TestCase, Client
 from django.contrib.auth.models import User
 from django.urls import reverse
 
-from ..models import Event
+from ..models import Attendance, Event, WaitlistEntry
 
 
 class TestEventViews(TestCase):
@@ -230,3 +231,328 @@ class TestEventViews(TestCase):
         self.client.post(reverse('event-attend', args=[self.test_event.id]))
         event_updated = Event.objects.get(pk=self.test_event.id)
         self.assertEqual(event_updated.attendees.all().count(), 1)
+
+    def test_event_attend_fully_booked(self):
+        self.test_event.attendees.add(self.organizer)
+        self.client.force_login(self.attendee)
+        response = self.client.post(reverse('event-attend', args=[self.test_event.id]))
+        self.assertEqual(response.status_code, 200)
+        msg = list(response.context.get('messages'))[0]
+        self.assertEquals(msg.tags, 'error')
+        self.assertEquals(msg.message, 'Sorry, this event is fully booked')
+        self.assertFalse(self.test_event.attendees.filter(pk=self.attendee.pk).exists())
+
+    def test_event_attend_already_registered(self):
+        self.test_event.attendees.add(self.attendee)
+        self.client.force_login(self.attendee)
+        response = self.client.post(reverse('event-attend', args=[self.test_event.id]), follow=True)
+        self.assertRedirects(response, reverse('home'))
+        msg = list(response.context.get('messages'))[0]
+        self.assertEquals(msg.message, 'You are already registered to Test Event')
+
+    def test_event_join_waitlist(self):
+        self.test_event.attendees.add(self.organizer)
+        self.client.force_login(self.attendee)
+        response = self.client.post(reverse('event-attend', args=[self.test_event.id]), {'waitlist': '1'}, follow=True)
+        self.assertRedirects(response, reverse('home'))
+        msg = list(response.context.get('messages'))[0]
+        self.assertEquals(msg.message, 'You are number 1 on the waitlist of Test Event')
+
+        response = self.client.get(reverse('event-detail', args=[self.test_event.id]))
+        self.assertEqual(response.context['waitlist_position'], 1)
+        self.assertContains(response, 'Leave waitlist')
+
+    def test_event_unattend_promotes_waitlist(self):
+        self.test_event.attendees.add(self.organizer)
+        WaitlistEntry.objects.create(event=self.test_event, user=self.attendee)
+        self.client.force_login(self.organizer)
+        response = self.client.post(reverse('event-unattend', args=[self.test_event.id]), follow=True)
+        self.assertRedirects(response, reverse('home'))
+        msg = list(response.context.get('messages'))[0]
+        self.assertEquals(msg.message, 'You are no longer attending Test Event')
+        self.assertEqual(list(self.test_event.attendees.all()), [self.attendee])
+        self.assertFalse(WaitlistEntry.objects.exists())
+
+    def test_event_unattend_leaves_waitlist(self):
+        WaitlistEntry.objects.create(event=self.test_event, user=self.attendee)
+        self.client.force_login(self.attendee)
+        self.client.post(reverse('event-unattend', args=[self.test_event.id]))
+        self.assertFalse(WaitlistEntry.objects.exists())
+
+    def test_event_update_capacity_promotes_waitlist(self):
+        self.test_event.attendees.add(self.attendee)
+        waiting = User.objects.create(username='waiting', password='verysafe')
+        WaitlistEntry.objects.create(event=self.test_event, user=waiting)
+        self.client.force_login(self.organizer)
+        event_data = {
+            'name': self.test_event.name,
+            'venue': self.test_event.venue,
+            'capacity': 2,
+            'date': self.test_event.date,
+        }
+        self.client.post(reverse('event-update', args=[self.test_event.id]), event_data)
+        event = Event.objects.get(pk=self.test_event.id)
+        self.assertEqual(event.attendee_count, 2)
+        self.assertTrue(event.attendees.filter(pk=waiting.pk).exists())
+
+    def test_admin_attendance_inline_updates_attendee_count(self):
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'supersecure')
+        self.client.force_login(admin_user)
+        event_data = {
+            'name': self.test_event.name,
+            'description': '',
+            'date': self.test_event.date,
+            'venue': self.test_event.venue,
+            'organizer': self.organizer.id,
+            'capacity': self.test_event.capacity,
+            'attendance_set-TOTAL_FORMS': '1',
+            'attendance_set-INITIAL_FORMS': '0',
+            'attendance_set-MIN_NUM_FORMS': '0',
+            'attendance_set-MAX_NUM_FORMS': '1000',
+            'attendance_set-0-id': '',
+            'attendance_set-0-event': self.test_event.id,
+            'attendance_set-0-user': self.attendee.id,
+        }
+        response = self.client.post(reverse('admin:events_event_change', args=[self.test_event.id]), event_data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Event.objects.get(pk=self.test_event.id).attendee_count, 1)
+
+    def test_event_roster(self):
+        self.test_event.attendees.add(self.attendee)
+        self.client.force_login(self.organizer)
+        response = self.client.get(reverse('event-roster', args=[self.test_event.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(content.splitlines(), ['username,first_name,last_name,email', 'attendee,,,'])
+
+    def test_event_roster_unauthorized(self):
+        self.client.force_login(self.attendee)
+        response = self.client.get(reverse('event-roster', args=[self.test_event.id]))
+        self.assertEqual(response.status_code, 403)
+
+    def test_event_roster_unauthenticated_redirects_login(self):
+        response = self.client.get(reverse('event-roster', args=[1]))
+        self.assertRedirects(response, '/login/?next=/event/1/attendees.csv')
+
+
+class TestEventListQueries(TestCase):
+    sizes = [1, 100, 1000]
+
+    def setUp(self):
+        self.organizer = User.objects.create(username='organizer', password='supersecure')
+        self.attendee = User.objects.create(username='attendee', password='verysafe')
+        self.client = Client()
+
+    def create_events(self, size):
+        Event.objects.all().delete()
+        Event.objects.bulk_create([
+            Event(
+                name=f'Event {i}',
+                venue='London',
+                organizer=self.organizer,
+                date=date.today() + timedelta(days=1 + i % 30),
+                capacity=1 + i % 2
+            ) for i in range(size)
+        ])
+        events = list(Event.objects.order_by('pk'))
+        # attend every third event so that all the card variants get rendered
+        Attendance.objects.bulk_create([
+            Attendance(event=event, user=self.attendee) for event in events[::3]
+        ])
+        Event.objects.all().refresh_attendee_count()
+
+    def assertListQueries(self, url, user, num, page_size=None):
+        if user is not None:
+            self.client.force_login(user)
+        for size in self.sizes:
+            self.create_events(size)
+            with self.subTest(size=size), self.assertNumQueries(num):
+                response = self.client.get(url)
+                self.assertEqual(len(response.context['events']), min(size, page_size or size))
+
+    def test_home_anonymous(self):
+        self.assertListQueries(reverse('home') + '?page_size=100', None, 1, page_size=100)
+
+    def test_home_authenticated(self):
+        self.assertListQueries(reverse('home') + '?page_size=100', self.attendee, 3, page_size=100)
+
+    def test_organizer_events(self):
+        self.assertListQueries(reverse('my-events'), self.organizer, 3)
+
+    def test_is_attending(self):
+        self.create_events(3)
+        self.client.force_login(self.attendee)
+        response = self.client.get(reverse('home'))
+        self.assertEqual([e.is_attending for e in response.context['events']], [True, False, False])
+
+
+class TestEventListPagination(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create(username='organizer', password='supersecure')
+        # two events per day, so that pages split in the middle of a date
+        Event.objects.bulk_create([
+            Event(
+                name=f'Event {i}',
+                venue='London',
+                organizer=self.organizer,
+                date=date.today() + timedelta(days=i // 2),
+                capacity=10
+            ) for i in range(-4, 21)
+        ])
+        self.upcoming = list(Event.objects.filter(date__gte=date.today()).order_by('date', 'pk'))
+        self.client = Client()
+
+    def get_events(self, **params):
+        response = self.client.get(reverse('home'), params)
+        self.assertEqual(response.status_code, 200)
+        return response, list(response.context['events'])
+
+    def test_hides_past_events_by_default(self):
+        response, events = self.get_events(page_size=100)
+        self.assertEqual(events, self.upcoming)
+        response, events = self.get_events(page_size=100, upcoming='false')
+        self.assertEqual(len(events), 25)
+
+    def test_walk_pages_forward_and_back(self):
+        response, first = self.get_events(page_size=7)
+        self.assertEqual(first, self.upcoming[:7])
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+        seen = list(first)
+        page = response.context['page_obj']
+        while page.has_next():
+            response, events = self.get_events(page_size=7, after=page.next_cursor)
+            page = response.context['page_obj']
+            seen.extend(events)
+        self.assertEqual(seen, self.upcoming)
+
+        response, events = self.get_events(page_size=7, before=page.previous_cursor)
+        self.assertEqual(events, self.upcoming[7:14])
+
+    def test_deep_page_query_count(self):
+        response, events = self.get_events(page_size=5)
+        cursor = response.context['page_obj'].next_cursor
+        with self.assertNumQueries(1):
+            self.client.get(reverse('home'), {'page_size': 5, 'after': cursor})
+
+    def test_date_range(self):
+        start = date.today() + timedelta(days=2)
+        end = date.today() + timedelta(days=4)
+        response, events = self.get_events(start=start, end=end)
+        self.assertEqual(len(events), 6)
+        self.assertTrue(all(start <= e.date <= end for e in events))
+
+    def test_page_size_is_bounded(self):
+        response, events = self.get_events(page_size=0)
+        self.assertEqual(len(events), 1)
+        response, events = self.get_events(page_size='many')
+        self.assertEqual(len(events), 20)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('home'), {'after': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_links_keep_filters(self):
+        response = self.client.get(reverse('home'), {'page_size': 5, 'upcoming': 'false'})
+        cursor = response.context['page_obj'].next_cursor
+        self.assertContains(response, f'?page_size=5&amp;upcoming=false&amp;after={cursor}')
+
+
+class TestRegistrationList(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.organizer = User.objects.create(username='organizer', password='supersecure')
+        self.attendee = User.objects.create(username='attendee', password='verysafe')
+        Event.objects.bulk_create([
+            Event(
+                name=f'Event {i}',
+                venue='London',
+                organizer=self.organizer,
+                date=date.today() + timedelta(days=i // 2),
+                capacity=10
+            ) for i in range(-6, 14)
+        ])
+        events = list(Event.objects.order_by('date', 'pk'))
+        # attends every event but one
+        for event in events[1:]:
+            event.attendees.add(self.attendee)
+        self.upcoming = [event for event in events[1:] if event.date >= date.today()]
+        self.past = [event for event in events[1:] if event.date < date.today()][::-1]
+        self.client = Client()
+        self.client.force_login(self.attendee)
+
+    def get_events(self, **params):
+        response = self.client.get(reverse('my-registrations'), params)
+        self.assertEqual(response.status_code, 200)
+        return response, list(response.context['events'])
+
+    def walk(self, **params):
+        response, events = self.get_events(**params)
+        while response.context['page_obj'].has_next():
+            response, page = self.get_events(after=response.context['page_obj'].next_cursor, **params)
+            events += page
+        return events
+
+    def test_requires_login(self):
+        self.client.logout()
+        response = self.client.get(reverse('my-registrations'))
+        self.assertRedirects(response, '/login/?next=/event/registrations/')
+
+    def test_sections(self):
+        response, events = self.get_events(page_size=100)
+        self.assertEqual(events, self.upcoming)
+        self.assertTemplateUsed(response, 'events/my_registrations.html')
+        self.assertContains(response, 'Unattend')
+        response, events = self.get_events(page_size=100, section='past')
+        self.assertEqual(events, self.past)
+        self.assertNotContains(response, 'Unattend')
+
+    def test_walk_pages_forward_and_back(self):
+        self.assertEqual(self.walk(page_size=3), self.upcoming)
+        self.assertEqual(self.walk(page_size=2, section='past'), self.past)
+
+        response, first = self.get_events(page_size=2, section='past')
+        response, second = self.get_events(page_size=2, section='past', after=response.context['page_obj'].next_cursor)
+        response, back = self.get_events(page_size=2, section='past', before=response.context['page_obj'].previous_cursor)
+        self.assertEqual(back, first)
+
+    def test_pages_are_cached_until_the_user_registers(self):
+        with self.assertNumQueries(4):
+            self.get_events()
+        with self.assertNumQueries(3):
+            # session, user and events: the page rows come from the cache
+            self.get_events()
+
+        # the attendances of other users leave the cache alone
+        other = User.objects.create(username='other', password='verysafe')
+        self.upcoming[0].attendees.add(other)
+        with self.assertNumQueries(3):
+            self.get_events()
+
+        event = Event.objects.exclude(attendees=self.attendee).get()
+        event.date = date.today() + timedelta(days=30)
+        event.save()
+        event.attendees.add(self.attendee)
+        response, events = self.get_events(page_size=100)
+        self.assertEqual(events, self.upcoming + [event])
+
+    def test_event_date_change(self):
+        event = self.upcoming[0]
+        event.date = date.today() - timedelta(days=30)
+        event.save()
+        response, events = self.get_events(page_size=100)
+        self.assertEqual(events, self.upcoming[1:])
+        response, events = self.get_events(page_size=100, section='past')
+        self.assertEqual(events, self.past + [event])
+
+    def test_unregistering(self):
+        self.get_events()
+        self.client.post(reverse('event-unattend', args=[self.upcoming[0].pk]))
+        response, events = self.get_events(page_size=100)
+        self.assertEqual(events, self.upcoming[1:])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('my-registrations'), {'after': 'garbage'})
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,59 @@
+import difflib
+import re
+from collections import Counter
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def normalize_sql(sql):
+    """
+    The shape of a query, with its literal values replaced by ``?``.
+    """
+    return LITERALS.sub('?', sql)
+
+
+class QueryCountMixin:
+    """
+    Assert that the queries of a request do not grow with the data it shows.
+    """
+    query_count_sizes = (1, 5, 15)
+
+    def capture_queries(self, func):
+        with CaptureQueriesContext(connection) as captured:
+            func()
+        return [query['sql'] for query in captured.captured_queries]
+
+    def assertConstantQueries(self, func, populate, sizes=None, msg=None):
+        """
+        Call populate(size) then func() at each size, failing if func() does not
+        run the same number of queries every time. The failure shows the repeated
+        queries and a diff with the smallest size.
+        """
+        baseline_size, baseline = None, None
+        for size in sizes or self.query_count_sizes:
+            populate(size)
+            queries = self.capture_queries(func)
+            if baseline is None:
+                baseline_size, baseline = size, queries
+                continue
+            if len(queries) != len(baseline):
+                self.fail(self.query_count_message(baseline_size, baseline, size, queries, msg))
+
+    def query_count_message(self, baseline_size, baseline, size, queries, msg=None):
+        shapes = [normalize_sql(sql) for sql in queries]
+        repeated = [
+            f'  {count} x {shape}' for shape, count in Counter(shapes).most_common() if count > 1
+        ]
+        diff = difflib.unified_diff(
+            [normalize_sql(sql) for sql in baseline], shapes,
+            fromfile=f'{baseline_size} rows', tofile=f'{size} rows', lineterm='',
+        )
+        lines = [f'{len(baseline)} queries with {baseline_size} rows but {len(queries)} with {size} rows']
+        if msg:
+            lines[0] = f'{msg}: {lines[0]}'
+        if repeated:
+            lines += ['Repeated queries:'] + repeated
+        return '\n'.join(lines + list(diff))
@@ -1,7 +1,9 @@
 from django.urls import path
 
+from . import api, feeds
 from .views import \
-    EventListView, EventDetailView, EventCreateView, EventUpdateView, EventDeleteView, attend_event, OrganizerEventList
+    EventListView, EventDetailView, EventCreateView, EventUpdateView, EventDeleteView, attend_event, OrganizerEventList, \
+    EventRosterView, RegistrationListView, unattend_event
 
 urlpatterns = [
     path('', EventListView.as_view(), name='home'),
@@ -10,6 +12,15 @@ urlpatterns = [
     path('event/<int:pk>/update/', EventUpdateView.as_view(), name='event-update'),
     path('event/<int:pk>/delete/', EventDeleteView.as_view(), name='event-delete'),
     path('event/<int:pk>/attend/', attend_event, name="event-attend"),
+    path('event/<int:pk>/unattend/', unattend_event, name='event-unattend'),
+    path('event/<int:pk>/attendees.csv', EventRosterView.as_view(), name='event-roster'),
     path('event/mine/', OrganizerEventList.as_view(), name='my-events'),
+    path('event/registrations/', RegistrationListView.as_view(), name='my-registrations'),
+    path('calendar/organizer/<int:pk>.ics', feeds.organizer_calendar, name='calendar-organizer'),
+    path('calendar/<str:key>/attending.ics', feeds.attending_calendar, name='calendar-attending'),
+    path('api/events/', api.event_list, name='api-event-list'),
+    path('api/events/<int:pk>/', api.event_detail, name='api-event-detail'),
+    path('api/registrations/', api.registrations, name='api-registrations'),
+    path('api/me/registrations/', api.my_registrations, name='api-my-registrations'),
 
 ]
@@ -1,86 +1,338 @@
+import csv
+import itertools
 from datetime import date, timedelta
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import InvalidPage
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
+from django.views.generic import View, ListView, DetailView, CreateView, UpdateView, DeleteView
+from django.views.generic.detail import SingleObjectMixin
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib import messages
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 
-from .models import Event
+from jobs.queue import enqueue, enqueue_many
+
+from .cache import FRAGMENT_TIMEOUT, get_registrations_version, render_fragments
+from .feeds import calendar_key
+from .forms import EventCreateForm, EventFilterForm, EventUpdateForm
+from .models import ArchivedAttendance, ArchivedEvent, Attendance, Event, earliest_event_date
+from .pagination import KeysetPage, KeysetPaginationMixin, KeysetPaginator
+from .replicas import read_from_replica
+from .series import SERIES_FIELDS, end_series, start_series, update_occurrences
+from .services import (
+    RegistrationResult, join_waitlist, leave_waitlist, promote_waitlist, register_attendee,
+    unregister_attendee, waitlist_position,
+)
 
 
 @login_required
 def attend_event(request, pk):
     event = get_object_or_404(Event, pk=pk)
-    if event.is_fully_booked:
+    if request.method == 'POST' and 'waitlist' in request.POST:
+        position = join_waitlist(event, request.user)
+        if position is None:
+            messages.success(request, f'You are attending {event.name}!')
+        else:
+            messages.info(request, f'You are number {position} on the waitlist of {event.name}')
+        return redirect('home')
+    if request.method == 'POST':
+        result = register_attendee(event, request.user)
+        if result is RegistrationResult.REGISTERED:
+            messages.success(request, f'You have successfully registered to {event.name}!')
+            return redirect('home')
+        if result is RegistrationResult.ALREADY_REGISTERED:
+            messages.info(request, f'You are already registered to {event.name}')
+            return redirect('home')
+        messages.error(request, f'Sorry, this event is fully booked')
+        event.refresh_from_db(fields=['attendee_count'])
+    elif event.is_fully_booked:
         messages.error(request, f'Sorry, this event is fully booked')
-        return render(request, 'events/event_attend.html', {'event': event})
 
+    return render(request, 'events/event_attend.html', {
+        'event': event, 'live_seats_url': getattr(settings, 'EVENTS_LIVE_SEATS_URL', None),
+    })
+
+
+@login_required
+def unattend_event(request, pk):
+    event = get_object_or_404(Event, pk=pk)
     if request.method == 'POST':
-        event.attendees.add(request.user)
-        messages.success(request, f'You have successfully registered to {event.name}!')
+        if unregister_attendee(event, request.user):
+            messages.success(request, f'You are no longer attending {event.name}')
+        elif leave_waitlist(event, request.user):
+            messages.success(request, f'You left the waitlist of {event.name}')
+        else:
+            messages.info(request, f'You are not registered to {event.name}')
         return redirect('home')
 
-    return render(request, 'events/event_attend.html', {'event': event})
+    return render(request, 'events/event_unattend.html', {'event': event})
+
+
+class CachedCardsMixin:
+    """
+    Attach the cached HTML shared by all users to each listed event as ``card``.
+    """
+    card_template_name = 'events/includes/event_card.html'
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        events = context['object_list']
+        cards = render_fragments(events, self.card_template_name)
+        for event in events:
+            event.card = cards[event.pk]
+        return context
 
-class EventListView(ListView):
+
+@read_from_replica
+class EventListView(CachedCardsMixin, KeysetPaginationMixin, ListView):
     model = Event
     template_name = 'events/home.html'
     context_object_name = 'events'
     ordering = ['date']
 
+    def get_queryset(self):
+        self.filter_form = EventFilterForm(self.request.GET)
+        events = super().get_queryset().for_user(self.request.user)
+        return self.filter_form.filter_queryset(events)
+
+    def get_keyset(self):
+        return self.filter_form.keyset
 
+
+@read_from_replica
 class EventDetailView(DetailView):
     model = Event
 
+    def get_queryset(self):
+        return super().get_queryset().for_user(self.request.user)
+
+    def get(self, request, *args, **kwargs):
+        try:
+            return super().get(request, *args, **kwargs)
+        except Http404:
+            # moved out of the event table by archive_events
+            event = ArchivedEvent.objects.select_related('organizer').filter(pk=kwargs['pk']).first()
+            if event is None:
+                raise
+            attended = request.user.is_authenticated and ArchivedAttendance.objects.filter(
+                event=event, user=request.user
+            ).exists()
+            return render(request, 'events/archivedevent_detail.html', {'event': event, 'attended': attended})
+
+    def get_object(self, queryset=None):
+        event = super().get_object(queryset)
+        event.card = render_fragments([event], 'events/includes/event_info.html')[event.pk]
+        return event
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['live_seats_url'] = getattr(settings, 'EVENTS_LIVE_SEATS_URL', None)
+        event = self.object
+        if self.request.user.is_authenticated and not event.is_attending and event.is_fully_booked:
+            context['waitlist_position'] = waitlist_position(event, self.request.user)
+        return context
+
+
+class OrganizerRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
+    """
+    Only let the organizer of the event through.
+    """
+    def test_func(self):
+        if self.request.user == self.get_object().organizer:
+            return True
+        return False
+
 
 class EventCreateView(LoginRequiredMixin, CreateView):
     model = Event
-    fields = ['name', 'description', 'date', 'venue', 'capacity']
+    form_class = EventCreateForm
 
     def form_valid(self, form):
         # set creating user as organizer
         form.instance.organizer = self.request.user
-        if form.instance.date < date.today() + timedelta(days=1):
+        if form.instance.date < earliest_event_date():
             msg = messages.error(self.request, f'Cannot create events in the past or today!')
             return super().form_invalid(form)
-        return super().form_valid(form)
+        series = form.build_series(self.request.user)
+        if series is None:
+            return super().form_valid(form)
+        # the event is the first occurrence of the series
+        events = start_series(series)
+        messages.success(self.request, f'Scheduled {len(events)} events of {series.name}')
+        return redirect(events[0])
 
 
-class EventUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+class EventUpdateView(OrganizerRequiredMixin, UpdateView):
     model = Event
-    fields = ['name', 'description', 'date', 'venue', 'capacity']
+    form_class = EventUpdateForm
+    # changes the attendees are notified of
+    notified_fields = ['name', 'date', 'venue']
 
     def form_valid(self, form):
         form.instance.organizer = self.request.user
-        if form.instance.date < date.today() + timedelta(days=1):
+        if form.instance.date < earliest_event_date():
             msg = messages.error(self.request, f'Cannot schedule events in the past or today!')
             return super().form_invalid(form)
-        return super().form_valid(form)
+        response = super().form_valid(form)
+        if 'capacity' in form.changed_data and form.initial['capacity'] < self.object.capacity:
+            promote_waitlist(self.object)
+        changes = {
+            field: [str(form.initial[field]), str(form.cleaned_data[field])]
+            for field in self.notified_fields if field in form.changed_data
+        }
+        if changes:
+            enqueue(
+                'events.changed',
+                {'event_id': self.object.pk, 'changes': changes},
+                key=f'events.changed:{self.object.pk}:{self.object.updated_at.isoformat()}',
+            )
+        if form.cleaned_data.get('apply_to_series'):
+            self.update_series(form)
+        return response
 
-    def test_func(self):
-        if self.request.user == self.get_object().organizer:
-            return True
-        return False
+    def update_series(self, form):
+        """
+        Apply the changes but the date to the later occurrences of the series, notifying their attendees.
+        """
+        values = {field: form.cleaned_data[field] for field in SERIES_FIELDS if field in form.changed_data}
+        if not values:
+            return
+        after = max(form.initial['date'], date.today())
+        updated = update_occurrences(self.object.series, after, values)
+        changes = {
+            field: [str(form.initial[field]), str(values[field])] for field in self.notified_fields if field in values
+        }
+        if changes:
+            enqueue_many('events.changed', [
+                ({'event_id': pk, 'changes': changes}, f'events.changed:{pk}:{self.object.updated_at.isoformat()}')
+                for pk, attendee_count in updated.items() if attendee_count
+            ])
+        messages.success(self.request, f'Also updated {len(updated)} later events of the series')
 
 
-class EventDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
+class EventDeleteView(OrganizerRequiredMixin, DeleteView):
+    """
+    Delete an event, or end its series with it, deleting its later occurrences too.
+    """
     model = Event
     success_url = reverse_lazy('home')
 
-    def test_func(self):
-        if self.request.user == self.get_object().organizer:
-            return True
-        return False
+    def delete(self, request, *args, **kwargs):
+        self.object = event = self.get_object()
+        if event.series_id is None or 'end_series' not in request.POST:
+            return super().delete(request, *args, **kwargs)
+        deleted = end_series(event.series, event.date - timedelta(days=1))
+        messages.success(request, f'The series {event.series.name} ended, {len(deleted)} events were deleted.')
+        return redirect(self.get_success_url())
+
+
+class Echo:
+    """
+    File-like object handing back what is written to it, to stream csv.writer rows.
+    """
+    def write(self, value):
+        return value
+
+
+class EventRosterView(OrganizerRequiredMixin, SingleObjectMixin, View):
+    """
+    Stream the attendees of an event as CSV, reading them in chunks.
+    """
+    model = Event
+    chunk_size = 2000
+
+    def get(self, request, *args, **kwargs):
+        event = self.get_object()
+        attendees = Attendance.objects.filter(event=event).order_by('pk').values_list(
+            'user__username', 'user__first_name', 'user__last_name', 'user__email'
+        ).iterator(chunk_size=self.chunk_size)
+        writer = csv.writer(Echo())
+        rows = (writer.writerow(row) for row in attendees)
+        header = writer.writerow(['username', 'first_name', 'last_name', 'email'])
 
+        response = StreamingHttpResponse(itertools.chain([header], rows), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="event-{event.pk}-attendees.csv"'
+        return response
 
-class OrganizerEventList(LoginRequiredMixin, ListView):
+
+@read_from_replica
+class OrganizerEventList(LoginRequiredMixin, CachedCardsMixin, ListView):
     model = Event
     template_name = 'events/event_organizer.html'
     context_object_name = 'events'
     ordering = ['date']
 
     def get_queryset(self):
-        return Event.objects.filter(organizer=self.request.user)
+        return super().get_queryset().filter(organizer=self.request.user).for_user(self.request.user)
+
+    def get_context_data(self, **kwargs):
+        kwargs.setdefault('calendar_url', self.request.build_absolute_uri(
+            reverse('calendar-organizer', args=[self.request.user.pk])
+        ))
+        return super().get_context_data(**kwargs)
+
+
+class RegistrationListView(LoginRequiredMixin, CachedCardsMixin, KeysetPaginationMixin, ListView):
+    """
+    The upcoming or past events the user attends, listed from the attendees table.
+
+    Pages are read on the (user, event_date, event) index and cached under a
+    version of the user's registrations, which only their own attendance
+    changes replace.
+    """
+    template_name = 'events/my_registrations.html'
+    context_object_name = 'events'
+    # past events from the most recent
+    sections = {
+        'upcoming': ('event_date', 'event_id'),
+        'past': ('-event_date', '-event_id'),
+    }
+
+    def get_section(self):
+        section = self.request.GET.get('section')
+        return section if section in self.sections else 'upcoming'
+
+    def get_keyset(self):
+        return self.sections[self.get_section()]
+
+    def get_queryset(self):
+        attendances = Attendance.objects.filter(user=self.request.user)
+        if self.get_section() == 'upcoming':
+            attendances = attendances.filter(event_date__gte=date.today())
+        else:
+            attendances = attendances.filter(event_date__lt=date.today())
+        return attendances.values('event_id', 'event_date')
+
+    def paginate_queryset(self, queryset, page_size):
+        after, before = self.request.GET.get('after'), self.request.GET.get('before')
+        version = get_registrations_version(self.request.user.pk)
+        # the day is part of the key, as events move from upcoming to past
+        key = f'events:registrations:{version}:{date.today()}:{self.get_section()}:{page_size}:{after}:{before}'
+        paginator = KeysetPaginator(queryset, page_size, self.get_keyset())
+        cached = cache.get(key)
+        if cached is None:
+            try:
+                page = paginator.page(after=after, before=before)
+            except InvalidPage as e:
+                raise Http404(str(e))
+            cached = (page.object_list, page.has_next(), page.has_previous())
+            cache.set(key, cached, FRAGMENT_TIMEOUT)
+        rows, has_next, has_previous = cached
+        page = KeysetPage(rows, paginator, has_next, has_previous)
+
+        events = Event.objects.select_related('organizer').in_bulk([row['event_id'] for row in rows])
+        events = [events[row['event_id']] for row in rows if row['event_id'] in events]
+        for event in events:
+            event.is_attending = True
+        return (paginator, page, events, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        kwargs.setdefault('section', self.get_section())
+        kwargs.setdefault('calendar_url', self.request.build_absolute_uri(
+            reverse('calendar-attending', args=[calendar_key(self.request.user)])
+        ))
+        return super().get_context_data(**kwargs)
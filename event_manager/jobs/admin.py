@@ -0,0 +1,12 @@
+from django.contrib import admin
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'status', 'attempts', 'run_after', 'created_at']
+    list_filter = ['status', 'kind']
+    search_fields = ['idempotency_key']
+    readonly_fields = ['locked_by', 'locked_at', 'last_error', 'created_at']
+
+
+admin.site.register(Job, JobAdmin)
@@ -0,0 +1,62 @@
+import os
+import socket
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from jobs import queue
+
+
+class Command(BaseCommand):
+    help = 'Run the background jobs, claiming them in batches of one kind. Several workers can run at once.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', action='append', dest='kinds', help='Only run jobs of this kind (repeatable).')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due instead of waiting.')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait when no job is due.')
+        parser.add_argument('--stale-after', type=int, default=15 * 60,
+                            help='Seconds after which jobs claimed by a dead worker are requeued.')
+        parser.add_argument('--keep-done', type=int, default=7 * 24 * 60 * 60,
+                            help='Seconds after which done jobs are deleted.')
+
+    def handle(self, *args, **options):
+        kinds = options['kinds'] or sorted(queue.handlers)
+        unknown = set(kinds) - set(queue.handlers)
+        if unknown:
+            raise CommandError(f'No handler for {", ".join(sorted(unknown))}')
+        self.stdout.write(f'Worker {socket.gethostname()}:{os.getpid()} running {", ".join(kinds)}')
+
+        done = failed = 0
+        maintained_at = None
+        try:
+            while True:
+                close_old_connections()
+                # writes, so not on every poll: they would take the write lock of SQLite every --sleep
+                if maintained_at is None or time.monotonic() - maintained_at >= options['stale_after'] / 2:
+                    self.maintain(options)
+                    maintained_at = time.monotonic()
+                claimed = 0
+                for kind in kinds:
+                    batch_done, batch_failed = queue.run_batch(kind)
+                    done += batch_done
+                    failed += batch_failed
+                    claimed += batch_done + batch_failed
+                if not claimed:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Ran {done} jobs, {failed} failed'))
+
+    def maintain(self, options):
+        """
+        Requeue the jobs of dead workers and delete the old done jobs.
+        """
+        requeued = queue.release_stale(options['stale_after'])
+        if requeued:
+            self.stderr.write(f'Requeued {requeued} stale jobs')
+        purged = queue.purge(options['keep_done'])
+        if purged and options['verbosity'] > 1:
+            self.stdout.write(f'Deleted {purged} done jobs')
@@ -0,0 +1,186 @@
+"""
+A job queue stored in the database.
+
+Apps register handlers in their ``tasks`` module and enqueue jobs, usually in
+the transaction of the change they follow up on, so a job exists if and only
+if that change was committed. The ``run_jobs`` worker claims the due jobs of
+one kind at a time and passes them to its handler as a batch.
+
+Claims are exclusive, so several workers can run in parallel: with
+``SELECT ... FOR UPDATE SKIP LOCKED`` where the database supports it
+(PostgreSQL), else with a single UPDATE of the first pending rows, which
+databases serializing writers (SQLite) run one at a time.
+"""
+import random
+import traceback
+from datetime import timedelta
+from uuid import uuid4
+
+from django.db import connections, transaction
+from django.db.models import F, Subquery
+from django.utils import timezone
+
+from .models import Job
+
+handlers = {}
+
+
+class Handler:
+    def __init__(self, func, kind, batch_size, max_attempts):
+        self.func = func
+        self.kind = kind
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+
+    def __call__(self, jobs):
+        return self.func(jobs)
+
+
+def register(kind, batch_size=50, max_attempts=5):
+    """
+    Register the decorated function as the handler of the jobs of kind.
+
+    It is called with a list of up to batch_size jobs and must handle them
+    all; if it raises, those it did not pass to mark_done() are retried later.
+    """
+    def decorator(func):
+        handlers[kind] = Handler(func, kind, batch_size, max_attempts)
+        return func
+    return decorator
+
+
+def enqueue(kind, payload, key=None, delay=None):
+    """
+    Add a job, unless one with the same idempotency key exists.
+    """
+    enqueue_many(kind, [(payload, key)], delay)
+
+
+def enqueue_many(kind, items, delay=None):
+    """
+    Add a job for each (payload, key) pair in a single INSERT, skipping the existing keys.
+    """
+    handler = handlers.get(kind)
+    run_after = timezone.now() + (delay or timedelta())
+    Job.objects.bulk_create([
+        Job(
+            kind=kind,
+            payload=payload,
+            idempotency_key=key,
+            run_after=run_after,
+            max_attempts=handler.max_attempts if handler else 5,
+        ) for payload, key in items
+    ], ignore_conflicts=True)
+
+
+def backoff(attempts, base=10, cap=60 * 60):
+    """
+    Seconds to wait before the next attempt: exponential, capped and jittered.
+    """
+    delay = min(cap, base * 2 ** (attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def claim(kind, limit, using='default'):
+    """
+    Mark up to limit due pending jobs of kind as running and return them.
+    """
+    now = timezone.now()
+    token = uuid4().hex
+    due = Job.objects.using(using).filter(status=Job.PENDING, kind=kind, run_after__lte=now).order_by('run_after', 'pk')
+    claimed = {'status': Job.RUNNING, 'locked_by': token, 'locked_at': now, 'attempts': F('attempts') + 1}
+
+    with transaction.atomic(using=using):
+        if connections[using].features.has_select_for_update_skip_locked:
+            pks = list(due.select_for_update(skip_locked=True).values_list('pk', flat=True)[:limit])
+            Job.objects.using(using).filter(pk__in=pks).update(**claimed)
+        else:
+            Job.objects.using(using).filter(pk__in=Subquery(due.values('pk')[:limit])).update(**claimed)
+    return list(Job.objects.using(using).filter(locked_by=token, status=Job.RUNNING).order_by('run_after', 'pk'))
+
+
+def complete(jobs, using='default'):
+    Job.objects.using(using).filter(pk__in=[job.pk for job in jobs]).update(
+        status=Job.DONE, locked_by='', locked_at=None, last_error=''
+    )
+
+
+def mark_done(jobs):
+    """
+    Complete jobs of the running batch right away, from its handler, so that
+    they are not run again if the handler raises on a later job.
+    """
+    jobs = [job for job in jobs if job.status != Job.DONE]
+    if jobs:
+        complete(jobs, jobs[0]._state.db)
+        for job in jobs:
+            job.status = Job.DONE
+
+
+def save_payload(job):
+    """
+    Store the payload of a running job, e.g. a cursor its handler resumes from when the job is retried.
+    """
+    Job.objects.using(job._state.db).filter(pk=job.pk).update(payload=job.payload)
+
+
+def retry_or_fail(jobs, error, using='default'):
+    """
+    Put the jobs back in the queue after a backoff, or fail those out of attempts.
+    """
+    now = timezone.now()
+    for job in jobs:
+        failed = job.attempts >= job.max_attempts
+        Job.objects.using(using).filter(pk=job.pk).update(
+            status=Job.FAILED if failed else Job.PENDING,
+            run_after=now if failed else now + timedelta(seconds=backoff(job.attempts)),
+            locked_by='',
+            locked_at=None,
+            last_error=error,
+        )
+
+
+def release_stale(timeout, using='default'):
+    """
+    Requeue the jobs claimed by workers that died over timeout seconds ago.
+    """
+    return Job.objects.using(using).filter(
+        status=Job.RUNNING, locked_at__lt=timezone.now() - timedelta(seconds=timeout)
+    ).update(status=Job.PENDING, locked_by='', locked_at=None)
+
+
+def purge(keep, using='default', batch_size=1000):
+    """
+    Delete the done jobs due over keep seconds ago, batch_size per statement to
+    keep the write transactions short, returning their number.
+
+    Their idempotency keys go with them: those deduplicate the enqueues of one
+    change, which do not come that late.
+    """
+    done = Job.objects.using(using).filter(
+        status=Job.DONE, run_after__lt=timezone.now() - timedelta(seconds=keep)
+    ).order_by('pk')
+    deleted = 0
+    while True:
+        count, _ = Job.objects.using(using).filter(pk__in=Subquery(done.values('pk')[:batch_size])).delete()
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+
+def run_batch(kind, using='default'):
+    """
+    Claim and run a batch of jobs of kind, returning the numbers of jobs done and failed.
+    """
+    handler = handlers[kind]
+    jobs = claim(kind, handler.batch_size, using)
+    if not jobs:
+        return 0, 0
+    try:
+        handler(jobs)
+    except Exception:
+        pending = [job for job in jobs if job.status != Job.DONE]
+        retry_or_fail(pending, traceback.format_exc(), using)
+        return len(jobs) - len(pending), len(pending)
+    complete([job for job in jobs if job.status != Job.DONE], using)
+    return len(jobs), 0
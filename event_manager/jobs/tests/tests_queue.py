@@ -0,0 +1,138 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from .. import queue
+from ..models import Job
+
+handled = []
+
+
+@queue.register('tests.record', batch_size=2, max_attempts=2)
+def record(jobs):
+    handled.append([job.payload['n'] for job in jobs])
+
+
+@queue.register('tests.broken', max_attempts=2)
+def broken(jobs):
+    raise RuntimeError('boom')
+
+
+@queue.register('tests.partial')
+def partial(jobs):
+    for job in jobs:
+        if job.payload['n'] == 1:
+            raise RuntimeError('boom')
+        handled.append(job.payload['n'])
+        queue.mark_done([job])
+
+
+class TestQueue(TestCase):
+    def setUp(self):
+        handled.clear()
+
+    def test_enqueue_is_idempotent(self):
+        queue.enqueue('tests.record', {'n': 1}, key='one')
+        queue.enqueue('tests.record', {'n': 2}, key='one')
+        queue.enqueue('tests.record', {'n': 3})
+        self.assertEqual(sorted(job.payload['n'] for job in Job.objects.all()), [1, 3])
+        self.assertEqual(Job.objects.get(idempotency_key='one').max_attempts, 2)
+
+    def test_claim_in_order_and_exclusive(self):
+        queue.enqueue_many('tests.record', [({'n': n}, None) for n in range(3)])
+        queue.enqueue('tests.broken', {})
+        first = queue.claim('tests.record', 2)
+        second = queue.claim('tests.record', 2)
+        self.assertEqual([job.payload['n'] for job in first], [0, 1])
+        self.assertEqual([job.payload['n'] for job in second], [2])
+        self.assertEqual(queue.claim('tests.record', 2), [])
+        self.assertTrue(all(job.status == Job.RUNNING and job.attempts == 1 for job in first + second))
+
+    def test_delayed_jobs_wait(self):
+        queue.enqueue('tests.record', {'n': 1}, delay=timedelta(minutes=1))
+        self.assertEqual(queue.claim('tests.record', 10), [])
+
+    def test_run_batches(self):
+        queue.enqueue_many('tests.record', [({'n': n}, None) for n in range(3)])
+        self.assertEqual(queue.run_batch('tests.record'), (2, 0))
+        self.assertEqual(queue.run_batch('tests.record'), (1, 0))
+        self.assertEqual(handled, [[0, 1], [2]])
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 3)
+
+    def test_retry_with_backoff_then_fail(self):
+        queue.enqueue('tests.broken', {})
+        self.assertEqual(queue.run_batch('tests.broken'), (0, 1))
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIn('RuntimeError: boom', job.last_error)
+
+        Job.objects.update(run_after=timezone.now())
+        queue.run_batch('tests.broken')
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    def test_retry_only_unfinished_jobs(self):
+        queue.enqueue_many('tests.partial', [({'n': n}, None) for n in range(3)])
+        self.assertEqual(queue.run_batch('tests.partial'), (1, 2))
+        self.assertEqual(handled, [0])
+        self.assertEqual(
+            {job.payload['n']: job.status for job in Job.objects.all()}, {0: Job.DONE, 1: Job.PENDING, 2: Job.PENDING},
+        )
+
+        Job.objects.update(run_after=timezone.now())
+        queue.run_batch('tests.partial')
+        self.assertEqual(handled, [0])
+
+    def test_backoff_grows(self):
+        self.assertLessEqual(queue.backoff(1), 10)
+        self.assertGreaterEqual(queue.backoff(4), 40)
+        self.assertLessEqual(queue.backoff(50), 60 * 60)
+
+    def test_release_stale(self):
+        queue.enqueue('tests.record', {'n': 1})
+        queue.claim('tests.record', 1)
+        self.assertEqual(queue.release_stale(60), 0)
+        Job.objects.update(locked_at=timezone.now() - timedelta(minutes=2))
+        self.assertEqual(queue.release_stale(60), 1)
+        self.assertEqual(Job.objects.get().status, Job.PENDING)
+
+    def test_purge(self):
+        queue.enqueue_many('tests.record', [({'n': n}, f'key{n}') for n in range(3)])
+        queue.run_batch('tests.record')
+        self.assertEqual(queue.purge(60), 0)
+        Job.objects.update(run_after=timezone.now() - timedelta(minutes=2))
+        self.assertEqual(queue.purge(60, batch_size=1), 2)
+        self.assertEqual(list(Job.objects.values_list('status', flat=True)), [Job.PENDING])
+
+
+class TestRunJobsCommand(TransactionTestCase):
+    # the worker closes the connection when it finds it in a transaction
+
+    def setUp(self):
+        handled.clear()
+
+    def test_run_once(self):
+        queue.enqueue_many('tests.record', [({'n': n}, None) for n in range(3)])
+        queue.enqueue('tests.broken', {})
+        out = StringIO()
+        call_command('run_jobs', '--once', stdout=out)
+        self.assertIn('Ran 3 jobs, 1 failed', out.getvalue())
+        self.assertEqual(handled, [[0, 1], [2]])
+
+    def test_purge_done_jobs(self):
+        queue.enqueue('tests.record', {'n': 1})
+        call_command('run_jobs', '--once', stdout=StringIO())
+        Job.objects.update(run_after=timezone.now() - timedelta(days=8))
+        call_command('run_jobs', '--once', stdout=StringIO())
+        self.assertFalse(Job.objects.exists())
+
+    def test_only_kind(self):
+        queue.enqueue('tests.record', {'n': 1})
+        queue.enqueue('tests.broken', {})
+        call_command('run_jobs', '--once', '--kind', 'tests.record', stdout=StringIO())
+        self.assertEqual(Job.objects.get(kind='tests.broken').attempts, 0)
@@ -0,0 +1,19 @@
+from django.template.backends.django import DjangoTemplates as BaseDjangoTemplates, Template as BaseTemplate
+
+from .middleware import timed_render
+
+
+class Template(BaseTemplate):
+    def render(self, context=None, request=None):
+        return timed_render(super().render, context, request)
+
+
+class DjangoTemplates(BaseDjangoTemplates):
+    """
+    The Django template backend, timing the rendering of its templates into the metrics of the request.
+    """
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
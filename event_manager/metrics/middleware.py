@@ -0,0 +1,180 @@
+"""
+Per-view request metrics: latency, database queries and time, template
+rendering time and fragment cache hits, aggregated by metrics.registry.
+
+Enabled by ``METRICS_ENABLED``; when it is off the middleware removes itself
+from the stack and nothing is instrumented. Templates are timed by the
+metrics.backends template backend, the fragment cache through the signal
+events.cache sends. With ``METRICS_SLOW_QUERY_MS``,
+queries slower than that are logged to the ``metrics.slow_queries`` logger
+with the frames of the project code that ran them.
+
+The stats of the request being handled live in a context variable, which
+asgiref and the database pool of the async views carry over to the threads
+they run code in, so the queries and templates of async views count too.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import time
+import traceback
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from events.cache import fragments_looked_up
+
+from .registry import observe_request
+
+logger = logging.getLogger('metrics.slow_queries')
+
+# the stats of the request being handled, None outside of requests
+current = contextvars.ContextVar('metrics_current_request', default=None)
+
+HTTP_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+
+class RequestStats:
+    __slots__ = (
+        'request', 'slow_query_threshold', 'duration', 'queries', 'db_time', 'template_time', 'rendering',
+        'cache_hits', 'cache_misses',
+    )
+
+    def __init__(self, request, slow_query_threshold=None):
+        self.request = request
+        self.slow_query_threshold = slow_query_threshold
+        self.duration = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.rendering = False
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+def record_cache(sender, hits, misses, **kwargs):
+    """
+    Count fragment cache hits and misses toward the current request, if any.
+    """
+    stats = current.get()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+def project_frames(stack):
+    """
+    The frames of the stack in the project's own code, outermost first.
+    """
+    base_dir = str(settings.BASE_DIR) + os.sep
+    return [
+        frame for frame in stack
+        if frame.filename.startswith(base_dir) and 'site-packages' not in frame.filename
+        and frame.filename != __file__
+    ]
+
+
+def record_query(execute, sql, params, many, context):
+    stats = current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        stats.queries += 1
+        stats.db_time += elapsed
+        if stats.slow_query_threshold is not None and elapsed * 1000 >= stats.slow_query_threshold:
+            frames = project_frames(traceback.extract_stack())
+            logger.warning(
+                'Slow query (%.1f ms, %s) in %s: %s\n%s',
+                elapsed * 1000, context['connection'].alias, view_name(stats.request), sql,
+                ''.join(traceback.format_list(frames[-5:])).rstrip(),
+            )
+
+
+def add_query_recorder(sender=None, connection=None, **kwargs):
+    # connection_created is sent again when a connection wrapper reconnects
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def instrument_queries():
+    """
+    Time the queries of every connection, those of this thread opened already and all the later ones.
+    """
+    for connection in connections.all():
+        add_query_recorder(connection=connection)
+    connection_created.connect(add_query_recorder, dispatch_uid='metrics_add_query_recorder')
+
+
+def timed_render(render, *args):
+    """
+    Render into the time of the current request, once per outermost template.
+    """
+    stats = current.get()
+    # included and fragment templates are part of the outermost one
+    if stats is None or stats.rendering:
+        return render(*args)
+    stats.rendering = True
+    start = time.perf_counter()
+    try:
+        return render(*args)
+    finally:
+        stats.template_time += time.perf_counter() - start
+        stats.rendering = False
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    # a fixed label for unresolved paths, so that scanners cannot add labels at will
+    return match.view_name if match is not None else '<unresolved>'
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    # else Django 3.1 mis-adapts the rest of the stack under ASGI when this one is not used
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_query_threshold = getattr(settings, 'METRICS_SLOW_QUERY_MS', None)
+        if asyncio.iscoroutinefunction(self.get_response):
+            # seen as a coroutine function by the handler, like MiddlewareMixin
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        instrument_queries()
+        fragments_looked_up.connect(record_cache, dispatch_uid='metrics_record_cache')
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        stats = RequestStats(request, self.slow_query_threshold)
+        token = current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.observe(request, response, stats, start)
+
+    async def __acall__(self, request):
+        stats = RequestStats(request, self.slow_query_threshold)
+        token = current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.observe(request, response, stats, start)
+
+    def observe(self, request, response, stats, start):
+        stats.duration = time.perf_counter() - start
+        method = request.method if request.method in HTTP_METHODS else 'other'
+        observe_request(view_name(request), method, response.status_code, stats)
+        return response
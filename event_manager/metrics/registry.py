@@ -0,0 +1,153 @@
+"""
+In-process metrics, aggregated across the threads of this process and
+rendered in the Prometheus text exposition format.
+
+Each process has its own registry: scrape every process (or worker) of a
+deployment and let Prometheus sum them.
+"""
+import threading
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def inc(self, labels=(), amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in sorted(self.values.items()):
+            yield self.name, tuple(zip(self.labelnames, labels)), value
+
+
+class Histogram:
+    """
+    Counts of the observations falling into each bucket, by label values.
+
+    Only the bucket an observation falls into is incremented; the cumulative
+    counts Prometheus expects are computed when rendering.
+    """
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self.values = {}
+
+    def observe(self, labels, value):
+        counts = self.values.get(labels)
+        if counts is None:
+            # bucket counts, then the sum of the observations
+            counts = self.values[labels] = [0] * len(self.buckets) + [0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def samples(self):
+        for labels, counts in sorted(self.values.items()):
+            labels = tuple(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f'{self.name}_bucket', labels + (('le', format_value(float(bound))),), cumulative
+            yield f'{self.name}_sum', labels, counts[-1]
+            yield f'{self.name}_count', labels, cumulative
+
+
+class Registry:
+    """
+    The metrics of this process, updated under a single lock.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def reset(self):
+        with self.lock:
+            for metric in self.metrics.values():
+                metric.values.clear()
+
+    def render(self):
+        with self.lock:
+            samples = [(metric, list(metric.samples())) for metric in self.metrics.values()]
+        lines = []
+        for metric, metric_samples in samples:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric_samples:
+                lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+request_duration = registry.histogram(
+    'django_request_duration_seconds', 'Time spent handling the request.', ['view', 'method'],
+)
+request_queries = registry.histogram(
+    'django_request_db_queries', 'Database queries run by the request.', ['view'], COUNT_BUCKETS,
+)
+request_db_duration = registry.histogram(
+    'django_request_db_duration_seconds', 'Time spent in database queries by the request.', ['view'],
+)
+request_template_duration = registry.histogram(
+    'django_request_template_duration_seconds', 'Time spent rendering templates by the request.', ['view'],
+)
+request_cache_hits = registry.counter(
+    'django_request_cache_hits_total', 'Hits of the event fragment cache.', ['view'],
+)
+request_cache_misses = registry.counter(
+    'django_request_cache_misses_total', 'Misses of the event fragment cache.', ['view'],
+)
+requests_by_status = registry.counter(
+    'django_requests_total', 'Requests handled, by response status.', ['view', 'status'],
+)
+
+
+def observe_request(view, method, status, stats):
+    with registry.lock:
+        request_duration.observe((view, method), stats.duration)
+        request_queries.observe((view,), stats.queries)
+        request_db_duration.observe((view,), stats.db_time)
+        request_template_duration.observe((view,), stats.template_time)
+        if stats.cache_hits:
+            request_cache_hits.inc((view,), stats.cache_hits)
+        if stats.cache_misses:
+            request_cache_misses.inc((view,), stats.cache_misses)
+        requests_by_status.inc((view, str(status)))
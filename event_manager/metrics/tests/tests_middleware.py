@@ -0,0 +1,104 @@
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from events.models import Event
+from ..middleware import MetricsMiddleware
+from ..registry import registry, request_cache_hits, request_duration, request_queries, request_template_duration
+
+
+def observations(histogram, labels):
+    # the bucket counts, then the sum
+    return sum(histogram.values[labels][:-1])
+
+
+@override_settings(METRICS_ENABLED=True)
+class TestMetricsMiddleware(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.user = User.objects.create(username='testuser', password='supersecure')
+        self.event = Event.objects.create(
+            name='Test Event', venue='London', organizer=self.user, date=date.today() + timedelta(days=10), capacity=1
+        )
+
+    def test_records_per_view(self):
+        self.client.get(reverse('home'))
+        self.client.get(reverse('home'))
+        self.client.get(reverse('event-detail', args=[self.event.pk]))
+
+        self.assertEqual(observations(request_duration, ('home', 'GET')), 2)
+        self.assertEqual(observations(request_duration, ('event-detail', 'GET')), 1)
+        self.assertEqual(observations(request_queries, ('home',)), 2)
+        self.assertGreater(request_queries.values[('home',)][-1], 0)
+        self.assertGreater(request_template_duration.values[('home',)][-1], 0)
+        # the card rendered by the first request is reused by the second
+        self.assertEqual(request_cache_hits.values[('home',)], 1)
+
+    def test_django_left_unpatched(self):
+        from django.template.base import Template
+
+        render = Template.render
+        self.client.get(reverse('home'))
+        self.assertIs(Template.render, render)
+
+    def test_unresolved_paths_share_a_label(self):
+        self.client.get('/no/such/page/')
+        self.client.get('/nor/this/one/')
+        self.assertEqual(observations(request_duration, ('<unresolved>', 'GET')), 2)
+
+    def test_slow_queries_are_logged_with_project_frames(self):
+        with self.settings(METRICS_SLOW_QUERY_MS=0), self.assertLogs('metrics.slow_queries', 'WARNING') as logs:
+            self.client.get(reverse('event-detail', args=[self.event.pk]))
+        self.assertIn('in event-detail: SELECT', logs.output[0])
+        self.assertTrue(any('events/views.py' in output for output in logs.output))
+        self.assertFalse(any('site-packages' in output for output in logs.output))
+
+    def test_metrics_endpoint_is_staff_only(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 302)
+
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        self.client.get(reverse('home'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        body = response.content.decode()
+        self.assertIn('# TYPE django_request_duration_seconds histogram', body)
+        self.assertIn('django_request_duration_seconds_count{view="home",method="GET"} 1', body)
+        self.assertIn('django_requests_total{view="home",status="200"} 1', body)
+
+
+@override_settings(METRICS_ENABLED=True, ROOT_URLCONF='event_manager.urls_asgi')
+class TestAsyncMetrics(TransactionTestCase):
+    # the async views query from the threads of their pool
+
+    def setUp(self):
+        registry.reset()
+        user = User.objects.create(username='testuser', password='supersecure')
+        Event.objects.create(
+            name='Test Event', venue='London', organizer=user, date=date.today() + timedelta(days=10), capacity=1
+        )
+
+    async def test_records_async_views(self):
+        response = await AsyncClient().get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(observations(request_duration, ('home', 'GET')), 1)
+        self.assertGreater(request_queries.values[('home',)][-1], 0)
+        self.assertGreater(request_template_duration.values[('home',)][-1], 0)
+
+
+class TestMetricsDisabled(TestCase):
+    @override_settings(METRICS_ENABLED=False)
+    def test_removed_from_the_stack(self):
+        from django.core.exceptions import MiddlewareNotUsed
+
+        with self.assertRaises(MiddlewareNotUsed):
+            MetricsMiddleware(lambda request: None)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_nothing_recorded(self):
+        registry.reset()
+        self.client.get(reverse('home'))
+        self.assertEqual(request_duration.values, {})
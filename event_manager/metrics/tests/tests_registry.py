@@ -0,0 +1,38 @@
+from django.test import SimpleTestCase
+
+from ..registry import Registry
+
+
+class TestRegistry(SimpleTestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self.registry.histogram('latency_seconds', 'Latency.', ['view'], buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(('home',), value)
+        self.assertEqual(self.registry.render(), '\n'.join([
+            '# HELP latency_seconds Latency.',
+            '# TYPE latency_seconds histogram',
+            'latency_seconds_bucket{view="home",le="0.1"} 2',
+            'latency_seconds_bucket{view="home",le="1.0"} 3',
+            'latency_seconds_bucket{view="home",le="+Inf"} 4',
+            'latency_seconds_sum{view="home"} 3.65',
+            'latency_seconds_count{view="home"} 4',
+        ]) + '\n')
+
+    def test_counter(self):
+        counter = self.registry.counter('hits_total', 'Hits.', ['view'])
+        counter.inc(('home',))
+        counter.inc(('home',), 2)
+        counter.inc(('event-detail',))
+        self.assertIn('hits_total{view="event-detail"} 1\nhits_total{view="home"} 3\n', self.registry.render())
+
+    def test_label_values_are_escaped(self):
+        self.registry.counter('hits_total', 'Hits.', ['view']).inc(('a"b\\c\nd',))
+        self.assertIn(r'hits_total{view="a\"b\\c\nd"} 1', self.registry.render())
+
+    def test_reset(self):
+        self.registry.counter('hits_total', 'Hits.', ['view']).inc(('home',))
+        self.registry.reset()
+        self.assertEqual(self.registry.render(), '# HELP hits_total Hits.\n# TYPE hits_total counter\n')